@@ -3,9 +3,19 @@ Created on Mar 1, 2017
 
 @author: debanjan
 '''
-from spacy.parts_of_speech import DET
+from functools import lru_cache
+import re
+
+import numpy as np
+from spacy.attrs import POS
+from spacy.parts_of_speech import DET, IDS as POS_IDS
+from spacy.tokens import Span
+
+from infoextract.vectorized import ngram_starts, token_attrs
 from utils.constants import NUMERIC_NE_TYPES
 
+PHRASE_CHUNKS_MODES = ('copy', 'inplace', 'spans')
+
 
 def words(doc,
           filter_stops=True,
@@ -109,49 +119,16 @@ def ngrams(doc,
     .. note:: Filtering by part-of-speech tag uses the universal POS tag set,
         http://universaldependencies.org/u/pos/
     """
-    if n < 1:
-        raise ValueError('n must be greater than or equal to 1')
-
-    ngrams_ = (doc[i: i + n]
-               for i in range(len(doc) - n + 1))
-    ngrams_ = (ngram for ngram in ngrams_
-               if not any(w.is_space for w in ngram))
-    if filter_stops is True:
-        ngrams_ = (ngram for ngram in ngrams_
-                   if not ngram[0].is_stop and not ngram[-1].is_stop)
-    if filter_punct is True:
-        ngrams_ = (ngram for ngram in ngrams_
-                   if not any(w.is_punct for w in ngram))
-    if filter_nums is True:
-        ngrams_ = (ngram for ngram in ngrams_
-                   if not any(w.like_num for w in ngram))
-    if include_pos:
-        if isinstance(include_pos, str):
-            include_pos = include_pos.upper()
-            ngrams_ = (ngram for ngram in ngrams_
-                       if all(w.pos_ == include_pos for w in ngram))
-        elif isinstance(include_pos, (set, frozenset, list, tuple)):
-            include_pos = {pos.upper() for pos in include_pos}
-            ngrams_ = (ngram for ngram in ngrams_
-                       if all(w.pos_ in include_pos for w in ngram))
-        else:
-            msg = 'invalid `include_pos` type: "{}"'.format(type(include_pos))
-            raise TypeError(msg)
-    if exclude_pos:
-        if isinstance(exclude_pos, str):
-            exclude_pos = exclude_pos.upper()
-            ngrams_ = (ngram for ngram in ngrams_
-                       if all(w.pos_ != exclude_pos for w in ngram))
-        elif isinstance(exclude_pos, (set, frozenset, list, tuple)):
-            exclude_pos = {pos.upper() for pos in exclude_pos}
-            ngrams_ = (ngram for ngram in ngrams_
-                       if all(w.pos_ not in exclude_pos for w in ngram))
-        else:
-            msg = 'invalid `exclude_pos` type: "{}"'.format(type(exclude_pos))
-            raise TypeError(msg)
-
-    for ngram in ngrams_:
-        yield ngram
+    # filters are computed over token attribute arrays, so only the spans of
+    # n-grams that pass all of them are ever created
+    starts = ngram_starts(token_attrs(doc), n,
+                          filter_stops=filter_stops,
+                          filter_punct=filter_punct,
+                          filter_nums=filter_nums,
+                          include_pos=include_pos,
+                          exclude_pos=exclude_pos)
+    for i in starts.tolist():
+        yield doc[i: i + n]
 
 
 def named_entities(doc,
@@ -189,7 +166,7 @@ def named_entities(doc,
             if include_types == 'NUMERIC':
                 include_types = NUMERIC_NE_TYPES  # we now go to next if block
             else:
-                nes = (ne for ne in nes if ne.label_ == include_types)
+                include_types = {include_types}
         if isinstance(include_types, (set, frozenset, list, tuple)):
             include_types = {type_.upper() for type_ in include_types}
             nes = (ne for ne in nes if ne.label_ in include_types)
@@ -202,7 +179,7 @@ def named_entities(doc,
             if exclude_types == 'NUMERIC':
                 exclude_types = NUMERIC_NE_TYPES  # we now go to next if block
             else:
-                nes = (ne for ne in nes if ne.label_ != exclude_types)
+                exclude_types = {exclude_types}
         if isinstance(exclude_types, (set, frozenset, list, tuple)):
             exclude_types = {type_.upper() for type_ in exclude_types}
             nes = (ne for ne in nes if ne.label_ not in exclude_types)
@@ -249,42 +226,102 @@ def phrase_chunks(doc,
                   include_pos=None,
                   exclude_pos=None,
                   include_types=None,
-                  exclude_types=None):
-    for ent in doc.ents:
-        ent.merge(ent.root.tag_, ent.text, ent.label_)
-
-    for np in doc.noun_chunks:
-        if len(np) > 1:
-            if np[0].pos_ != "DET":
-                np = np
-            else:
-                np = np[1:]
-        np.merge(np.root.tag_, np.text, np.root.ent_type_)
+                  exclude_types=None,
+                  mode='copy'):
+    """
+    Extract an ordered sequence of words and phrases -- named entities and noun
+    chunks (without leading determiners), each as a unit -- from a spacy-parsed
+    doc, optionally filtering them by type, part-of-speech and entity type.
+
+    All phrases are found up front, and where they overlap, the leftmost one is
+    kept, and of those starting at the same token, the longest (i.e.
+    leftmost-longest matching), e.g. a noun chunk over any entities within it;
+    they are then merged into single tokens all at once, or not at all.
+
+    A noun chunk's entity type is that of its root token, and entities absorbed
+    into a noun chunk lose their own: e.g. with the GPE entity "New York" within
+    the noun chunk "(The) New York Times", whose root "Times" isn't part of any
+    entity, the phrase "New York Times" has no entity type, and
+    ``include_types='GPE'`` yields nothing.
+
+    Args:
+        doc (``spacy.Doc``)
+        filter_stops (bool): if True, remove stop words
+        filter_punct (bool): if True, remove punctuation
+        filter_nums (bool): if True, remove number-like words (e.g. 10, 'ten')
+        include_pos (str or Set[str]): remove words and phrases whose
+            part-of-speech tag (a phrase's being that of its root) IS NOT
+            included in this param
+        exclude_pos (str or Set[str]): remove words and phrases whose
+            part-of-speech tag IS in the specified tags
+        include_types (str or Set[str]): remove words and phrases whose entity
+            type IS NOT in this param; if "NUMERIC", all numeric entity types
+            ("DATE", "MONEY", "ORDINAL", etc.) are included
+        exclude_types (str or Set[str]): remove words and phrases whose entity
+            type IS in this param; if "NUMERIC", all numeric entity types are
+            excluded
+        mode (str): how phrases are produced; one of
+            'copy': merge them into single tokens in a copy of ``doc``, in one
+                ``doc.retokenize()`` batch, leaving ``doc`` itself unchanged
+            'inplace': merge them into single tokens in ``doc`` itself, in one
+                ``doc.retokenize()`` batch
+            'spans': don't merge anything, and yield every word and phrase as
+                a ``spacy.Span`` of ``doc``, labeled with its entity type
 
-    phrases_ = (w for w in doc if not w.is_space)
+    Yields:
+        ``spacy.Token`` or ``spacy.Span``: the next word or phrase passing all
+            specified filters, in order of appearance in the document; tokens
+            unless ``mode`` is 'spans'
+
+    Raises:
+        ValueError: if ``mode`` is invalid
+        TypeError: if `include_pos`, `exclude_pos`, `include_types` or
+            `exclude_types` is not a str, a set of str, or a falsy value
+    """
+    if mode not in PHRASE_CHUNKS_MODES:
+        msg = 'invalid `mode` value: "{}"; valid values are {}'.format(mode, PHRASE_CHUNKS_MODES)
+        raise ValueError(msg)
+    phrase_spans = _phrase_spans(doc)
+    if mode == 'spans':
+        phrases_ = _phrase_chunk_spans(doc, phrase_spans)
+        get_attr = _span_phrase_attr
+    else:
+        if mode == 'copy':
+            doc = doc.copy()
+        with doc.retokenize() as retokenizer:
+            for start, end, label in phrase_spans:
+                span = doc[start: end]
+                attrs = {'TAG': span.root.tag_, 'LEMMA': span.text}
+                if label:
+                    attrs['ENT_TYPE'] = label
+                retokenizer.merge(span, attrs=attrs)
+        phrases_ = iter(doc)
+        get_attr = getattr
+
+    phrases_ = (p for p in phrases_ if not get_attr(p, 'is_space'))
     if filter_stops is True:
-        phrases_ = (w for w in phrases_ if not w.is_stop)
+        phrases_ = (p for p in phrases_ if not get_attr(p, 'is_stop'))
     if filter_punct is True:
-        phrases_ = (w for w in phrases_ if not w.is_punct)
+        phrases_ = (p for p in phrases_ if not get_attr(p, 'is_punct'))
     if filter_nums is True:
-        phrases_ = (w for w in phrases_ if not w.like_num)
+        phrases_ = (p for p in phrases_ if not get_attr(p, 'like_num'))
     if include_pos:
         if isinstance(include_pos, str):
             include_pos = include_pos.upper()
-            phrases_ = (w for w in phrases_ if w.pos_ == include_pos)
+            phrases_ = (p for p in phrases_ if get_attr(p, 'pos_') == include_pos)
         elif isinstance(include_pos, (set, frozenset, list, tuple)):
             include_pos = {pos.upper() for pos in include_pos}
-            phrases_ = (w for w in phrases_ if w.pos_ in include_pos)
+            phrases_ = (p for p in phrases_ if get_attr(p, 'pos_') in include_pos)
         else:
             msg = 'invalid `include_pos` type: "{}"'.format(type(include_pos))
             raise TypeError(msg)
     if exclude_pos:
         if isinstance(exclude_pos, str):
             exclude_pos = exclude_pos.upper()
-            phrases_ = (w for w in phrases_ if w.pos_ != exclude_pos)
+            phrases_ = (p for p in phrases_ if get_attr(p, 'pos_') != exclude_pos)
         elif isinstance(exclude_pos, (set, frozenset, list, tuple)):
             exclude_pos = {pos.upper() for pos in exclude_pos}
-            phrases_ = (w for w in phrases_ if w.pos_ not in exclude_pos)
+            phrases_ = (p for p in phrases_ if get_attr(p, 'pos_') not in exclude_pos)
         else:
             msg = 'invalid `exclude_pos` type: "{}"'.format(type(exclude_pos))
             raise TypeError(msg)
@@ -294,14 +331,10 @@ def phrase_chunks(doc,
             if include_types == 'NUMERIC':
                 include_types = NUMERIC_NE_TYPES  # we now go to next if block
             else:
-
-                phrases_ = (ne for ne in phrases_ if ne.ent_type and ne.label_ == include_types)
-
+                include_types = {include_types}
         if isinstance(include_types, (set, frozenset, list, tuple)):
             include_types = {type_.upper() for type_ in include_types}
-
-            phrases_ = (ne for ne in phrases_ if ne.ent_type and ne.label_ in include_types)
-
+            phrases_ = (p for p in phrases_ if get_attr(p, 'ent_type_') in include_types)
         else:
             msg = 'invalid `include_types` type: "{}"'.format(type(include_types))
             raise TypeError(msg)
@@ -311,17 +344,145 @@ def phrase_chunks(doc,
             if exclude_types == 'NUMERIC':
                 exclude_types = NUMERIC_NE_TYPES  # we now go to next if block
             else:
-
-                phrases_ = (ne for ne in phrases_ if ne.ent_type and ne.label_ != exclude_types)
-
+                exclude_types = {exclude_types}
         if isinstance(exclude_types, (set, frozenset, list, tuple)):
             exclude_types = {type_.upper() for type_ in exclude_types}
-
-            phrases_ = (ne for ne in phrases_ if ne.ent_type and ne.label_ not in exclude_types)
-
+            phrases_ = (p for p in phrases_ if get_attr(p, 'ent_type_') not in exclude_types)
         else:
             msg = 'invalid `exclude_types` type: "{}"'.format(type(exclude_types))
             raise TypeError(msg)
 
     for phrase in phrases_:
         yield phrase
+
+
+def _phrase_spans(doc):
+    """
+    Get the (start, end, entity type) of the non-overlapping multiword named
+    entities and noun chunks in ``doc``, in order, by leftmost-longest matching;
+    a noun chunk's entity type is its root's.
+    """
+    candidates = [(ent.start, ent.end, ent.label_) for ent in doc.ents]
+    for nc in doc.noun_chunks:
+        if len(nc) > 1 and nc[0].pos == DET:
+            nc = nc[1:]
+        candidates.append((nc.start, nc.end, nc.root.ent_type_))
+    candidates.sort(key=lambda candidate: (candidate[0], -candidate[1]))
+    spans = []
+    last_end = 0
+    for start, end, label in candidates:
+        if start >= last_end:
+            if end - start > 1:
+                spans.append((start, end, label))
+            last_end = end
+    return spans
+
+
+def _phrase_chunk_spans(doc, phrase_spans):
+    """Yield all of ``doc`` as spans, one per phrase or other token."""
+    i = 0
+    for start, end, label in phrase_spans:
+        for token in doc[i: start]:
+            yield Span(doc, token.i, token.i + 1, label=token.ent_type_)
+        yield Span(doc, start, end, label=label)
+        i = end
+    for token in doc[i:]:
+        yield Span(doc, token.i, token.i + 1, label=token.ent_type_)
+
+
+def _span_phrase_attr(span, attr):
+    # a phrase span has the attributes its merged token would have: its own
+    # entity type, its root's part-of-speech, and not space, stop word, etc.
+    if attr == 'ent_type_':
+        return span.label_
+    if len(span) == 1:
+        return getattr(span[0], attr)
+    if attr == 'pos_':
+        return span.root.pos_
+    return False
+
+
+def pos_regex_matches(doc, pattern):
+    """
+    Extract sequences of consecutive tokens from a spacy-parsed doc whose
+    part-of-speech tags match the specified regex pattern.
+
+    Args:
+        doc (``spacy.Doc``)
+        pattern (str): pattern of universal POS tags to match, with each tag
+            written as ``<TAG>`` and any whitespace ignored, e.g.
+            ``'<DET>? (<ADJ>)* (<NOUN>|<PROPN>)+'``; see
+            :data:`POS_REGEX_PATTERNS <utils.constants.POS_REGEX_PATTERNS>`
+            for common noun, prepositional, and verb phrase patterns
+
+    Yields:
+        ``spacy.Span``: the next span of consecutive tokens from ``doc`` whose
+            parts-of-speech match ``pattern``, in order of appearance
+
+    Raises:
+        ValueError: if ``pattern`` includes an unknown POS tag
+
+    .. note:: ``<CONJ>`` matches both CONJ and CCONJ tags, since spaCy tags
+        coordinating conjunctions as the latter.
+    """
+    for start, end in _pos_regex_offsets(_pos_string(doc), pattern):
+        yield doc[start: end]
+
+
+def pos_regex_matches_batch(docs, pattern):
+    """
+    Extract sequences of tokens matching ``pattern`` from each of many docs,
+    as with :func:`pos_regex_matches()`, with a single regex scan over the
+    POS tags of all of them.
+
+    Args:
+        docs (Sequence[``spacy.Doc``])
+        pattern (str): see :func:`pos_regex_matches()`
+
+    Returns:
+        List[List[``spacy.Span``]]: matching spans of each doc, in order
+    """
+    pos_strings = [_pos_string(doc) for doc in docs]
+    # docs' tag strings are joined with a separator no tag pattern can match,
+    # and match offsets mapped back to each doc by its starting offset
+    doc_starts = np.cumsum([0] + [len(pos) + 1 for pos in pos_strings[:-1]])
+    matches = [[] for _ in docs]
+    for start, end in _pos_regex_offsets('\n'.join(pos_strings), pattern):
+        i = int(np.searchsorted(doc_starts, start, side='right')) - 1
+        offset = int(doc_starts[i])
+        matches[i].append(docs[i][start - offset: end - offset])
+    return matches
+
+
+# POS tags are encoded as one (non-special, non-ASCII) character per tag, so
+# that regex match offsets in the string of a doc's tags are token indices
+_POS_CHAR_OFFSET = 0x100
+_POS_TAG_RE = re.compile(r'<([A-Z]+)>')
+_POS_TAG_ALIASES = {'CONJ': ('CONJ', 'CCONJ')}
+
+
+def _pos_string(doc):
+    pos = doc.to_array(POS).astype(np.uint32) + _POS_CHAR_OFFSET
+    return pos.astype('<u4').tobytes().decode('utf-32-le')
+
+
+def _pos_regex_offsets(pos_string, pattern):
+    for match in _compile_pos_regex(pattern).finditer(pos_string):
+        start, end = match.span()
+        if end > start:
+            yield start, end
+
+
+@lru_cache(maxsize=128)
+def _compile_pos_regex(pattern):
+    def tag_chars(match):
+        tag = match.group(1)
+        tags = _POS_TAG_ALIASES.get(tag, (tag,))
+        try:
+            chars = ''.join(chr(POS_IDS[tag] + _POS_CHAR_OFFSET) for tag in tags)
+        except KeyError:
+            msg = 'invalid POS tag "{}" in pattern "{}"'.format(match.group(1), pattern)
+            raise ValueError(msg)
+        return chars if len(chars) == 1 else '[{}]'.format(chars)
+
+    return re.compile(_POS_TAG_RE.sub(tag_chars, re.sub(r'\s+', '', pattern)))
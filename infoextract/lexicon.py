@@ -0,0 +1,292 @@
+"""
+Module for matching lexicons of (possibly multiword) phrases -- e.g. the
+:data:`FUNCTIONAL_WORDS <utils.constants.FUNCTIONAL_WORDS>` or
+:data:`REPORTING_VERBS <utils.constants.REPORTING_VERBS>`, or gazetteers of
+millions of entity names -- against spacy-parsed docs.
+
+Phrases are compiled into a token-level trie over the 64-bit hashes of tokens'
+lower-cased text (or lemmas, or verbatim text), whose edges are stored in an
+open-addressing hash table backed by parallel arrays. A doc is matched by
+walking the trie from every token at once, one token deeper per step, so that
+each step is a few vectorized array reads regardless of the number of phrases,
+and a compiled lexicon saved by :meth:`LexiconMatcher.to_disk()` can be
+memory-mapped and shared across processes.
+"""
+import json
+import os
+
+import numpy as np
+from spacy.attrs import LEMMA, LOWER, ORTH
+from spacy.tokens import Doc, Span
+
+from utils.hashtable import n_table_slots
+
+ATTRS = {'lower': LOWER, 'lemma': LEMMA, 'orth': ORTH}
+# 64-bit FNV prime, used to mix trie states into token hashes for edge slots
+_EDGE_HASH_PRIME = np.uint64(1099511628211)
+
+
+class LexiconMatcher(object):
+    """
+    Matcher of a lexicon of phrases, each optionally labeled (e.g. with an
+    entity type), compiled into a token-level trie.
+
+    Args:
+        edge_states (``np.ndarray``): int64 source state of the trie edge in
+            each hash table slot; the number of slots must be a power of 2
+        edge_keys (``np.ndarray``): uint64 token hash of the edge in each slot
+        edge_targets (``np.ndarray``): int64 target state of the edge in each
+            slot, with 0 (the root, which is never a target) marking empty slots
+        state_labels (``np.ndarray``): int32 index into ``labels`` of the phrase
+            ending at each state, or -1 if none does
+        labels (List[str]): distinct phrase labels, '' for unlabeled phrases
+        attr (str): token attribute that phrases are matched on; one of
+            'lower', 'lemma', or 'orth'
+
+    Example::
+
+        >>> nlp = spacy.load('en_core_web_sm')
+        >>> matcher = LexiconMatcher.from_phrases(FUNCTIONAL_WORDS, nlp)
+        >>> matcher.find(nlp('You ought to be able to do that.'))
+        [ought to, be able to]
+        >>> matcher.to_disk('functional_words')
+        >>> matcher = LexiconMatcher.from_disk('functional_words', mmap_mode='r')
+    """
+
+    def __init__(self, edge_states, edge_keys, edge_targets, state_labels, labels, attr='lower'):
+        if attr not in ATTRS:
+            msg = 'invalid `attr` value: "{}"; valid values are {}'.format(attr, sorted(ATTRS))
+            raise ValueError(msg)
+        self.edge_states = edge_states
+        self.edge_keys = edge_keys
+        self.edge_targets = edge_targets
+        self.state_labels = state_labels
+        self.labels = labels
+        self.attr = attr
+        self._mask = np.uint64(edge_keys.shape[0] - 1)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.state_labels >= 0))
+
+    @classmethod
+    def from_phrases(cls, phrases, nlp, attr='lower', load_factor=0.5, batch_size=1000):
+        """
+        Compile a lexicon of phrases.
+
+        Args:
+            phrases (Iterable[str or ``spacy.Doc``] or Dict[str, Iterable[str or ``spacy.Doc``]]):
+                phrases to match, or a mapping of labels to the phrases given
+                that label; where a phrase is given more than once, its last
+                label is kept
+            nlp (``spacy.Language``): pipeline used to tokenize phrases given
+                as strings, the same as docs are parsed with; only its tokenizer
+                is used, unless ``attr`` is 'lemma'
+            attr (str): token attribute that phrases are matched on; one of
+                'lower', 'lemma', or 'orth'
+            load_factor (float): maximum fraction of hash table slots in use,
+                greater than 0.0 and less than 1.0; lower values mean shorter
+                probe sequences but more memory
+            batch_size (int): number of phrases tokenized at a time
+
+        Returns:
+            :class:`LexiconMatcher`
+
+        Raises:
+            ValueError: if ``attr`` is invalid, or ``load_factor`` is not
+                between 0.0 and 1.0, exclusive
+        """
+        if attr not in ATTRS:
+            msg = 'invalid `attr` value: "{}"; valid values are {}'.format(attr, sorted(ATTRS))
+            raise ValueError(msg)
+        if not 0.0 < load_factor < 1.0:
+            msg = 'load_factor={} is invalid; must be greater than 0.0 and less than 1.0'.format(
+                load_factor)
+            raise ValueError(msg)
+        if not isinstance(phrases, dict):
+            phrases = {'': phrases}
+        labels = []
+        # the trie is first built in Python, then compiled into arrays
+        edges = {}
+        state_labels = [-1]
+        for label, label_phrases in phrases.items():
+            labels.append(label)
+            for doc in _phrase_docs(label_phrases, nlp, attr, batch_size):
+                state = 0
+                for key in doc.to_array(ATTRS[attr]).tolist():
+                    target = edges.get((state, key))
+                    if target is None:
+                        target = edges[(state, key)] = len(state_labels)
+                        state_labels.append(-1)
+                    state = target
+                if state:
+                    state_labels[state] = len(labels) - 1
+        n_edges = len(edges)
+        edge_states = np.fromiter((state for state, _ in edges), dtype=np.int64, count=n_edges)
+        edge_keys = np.fromiter((key for _, key in edges), dtype=np.uint64, count=n_edges)
+        edge_targets = np.fromiter(edges.values(), dtype=np.int64, count=n_edges)
+        return cls(*_edge_table(edge_states, edge_keys, edge_targets, load_factor),
+                   np.array(state_labels, dtype=np.int32), labels, attr=attr)
+
+    def _step(self, states, keys):
+        """Follow the edges from ``states`` on ``keys``, with 0 where there are none."""
+        targets = np.zeros(states.shape[0], dtype=np.int64)
+        slots = ((keys ^ (states.astype(np.uint64) * _EDGE_HASH_PRIME)) & self._mask).astype(np.int64)
+        pending = np.arange(states.shape[0])
+        while pending.shape[0]:
+            slot_targets = self.edge_targets[slots[pending]]
+            is_found = ((slot_targets != 0) &
+                        (self.edge_keys[slots[pending]] == keys[pending]) &
+                        (self.edge_states[slots[pending]] == states[pending]))
+            targets[pending[is_found]] = slot_targets[is_found]
+            # probing stops at the edge's slot or at the first empty slot
+            pending = pending[~is_found & (slot_targets != 0)]
+            slots[pending] = (slots[pending] + 1) & (self.edge_keys.shape[0] - 1)
+        return targets
+
+    def find(self, doc, longest=True, as_='spans'):
+        """
+        Find the lexicon's phrases in a spacy-parsed doc.
+
+        Args:
+            doc (``spacy.Doc``)
+            longest (bool): if True, only keep non-overlapping matches, by
+                leftmost-longest matching: where phrases overlap, the leftmost
+                one is kept, and of those starting at the same token, the
+                longest (so a longer phrase starting later loses to a shorter
+                one starting earlier); otherwise, keep all matches, including
+                those nested in others
+            as_ (str): form of the output; one of
+                'spans': a list of ``spacy.Span`` s, labeled with their phrases' labels
+                'offsets': an integer array of (start, end, label index) rows,
+                    with labels' indexes into :attr:`labels`
+
+        Returns:
+            List[``spacy.Span``] or ``np.ndarray``: matches in order of
+                appearance in the document, by start and then end
+        """
+        if as_ not in ('spans', 'offsets'):
+            msg = 'invalid `as_` value: "{}"; valid values are {}'.format(
+                as_, {'spans', 'offsets'})
+            raise ValueError(msg)
+        keys = doc.to_array(ATTRS[self.attr]).astype(np.uint64)
+        n_tokens = keys.shape[0]
+        # walk the trie from all tokens at once, dropping those that fall off it
+        starts = np.arange(n_tokens)
+        states = np.zeros(n_tokens, dtype=np.int64)
+        matches = []
+        depth = 0
+        while starts.shape[0]:
+            in_doc = starts + depth < n_tokens
+            starts = starts[in_doc]
+            states = self._step(states[in_doc], keys[starts + depth])
+            on_trie = states != 0
+            starts, states = starts[on_trie], states[on_trie]
+            depth += 1
+            match_labels = self.state_labels[states]
+            is_match = match_labels >= 0
+            if is_match.any():
+                match_starts = starts[is_match]
+                matches.append(np.column_stack([match_starts, match_starts + depth,
+                                                match_labels[is_match]]))
+        if matches:
+            matches = np.concatenate(matches)
+            matches = matches[np.lexsort((-matches[:, 1], matches[:, 0]))]
+        else:
+            matches = np.zeros((0, 3), dtype=np.int64)
+        if longest is True and matches.shape[0]:
+            # matches are few, so resolving overlaps in Python is cheap
+            keep = []
+            last_end = 0
+            for i, (start, end) in enumerate(matches[:, :2].tolist()):
+                if start >= last_end:
+                    keep.append(i)
+                    last_end = end
+            matches = matches[keep]
+        else:
+            # nested matches are ordered by start and then *end*
+            matches = matches[np.lexsort((matches[:, 1], matches[:, 0]))]
+        if as_ == 'spans':
+            return [Span(doc, start, end, label=self.labels[label])
+                    for start, end, label in matches.tolist()]
+        return matches
+
+    def to_disk(self, dirpath):
+        """
+        Save the compiled lexicon's arrays as ``.npy`` files in directory
+        ``dirpath``, which can later be memory-mapped by :meth:`from_disk()`.
+
+        Args:
+            dirpath (str): /path/to/dir on disk, created if needed
+        """
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        np.save(os.path.join(dirpath, 'edge_states.npy'), self.edge_states)
+        np.save(os.path.join(dirpath, 'edge_keys.npy'), self.edge_keys)
+        np.save(os.path.join(dirpath, 'edge_targets.npy'), self.edge_targets)
+        np.save(os.path.join(dirpath, 'state_labels.npy'), self.state_labels)
+        with open(os.path.join(dirpath, 'meta.json'), mode='wt') as f:
+            json.dump({'attr': self.attr, 'labels': self.labels}, f)
+
+    @classmethod
+    def from_disk(cls, dirpath, mmap_mode='r'):
+        """
+        Load a compiled lexicon saved by :meth:`to_disk()`.
+
+        Args:
+            dirpath (str): /path/to/dir on disk
+            mmap_mode (str): if not None, memory-map the arrays with this mode
+                (see ``numpy.load``); with 'r', only the slots actually probed
+                are ever read from disk
+
+        Returns:
+            :class:`LexiconMatcher`
+        """
+        with open(os.path.join(dirpath, 'meta.json'), mode='rt') as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(dirpath, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in ('edge_states', 'edge_keys', 'edge_targets', 'state_labels')]
+        return cls(*arrays, labels=meta['labels'], attr=meta['attr'])
+
+
+def _phrase_docs(phrases, nlp, attr, batch_size):
+    texts = []
+    for phrase in phrases:
+        if isinstance(phrase, Doc):
+            yield phrase
+        else:
+            texts.append(phrase)
+    if texts:
+        if attr == 'lemma':
+            docs = nlp.pipe(texts, batch_size=batch_size)
+        else:
+            docs = nlp.tokenizer.pipe(texts, batch_size=batch_size)
+        for doc in docs:
+            yield doc
+
+
+def _edge_table(edge_states, edge_keys, edge_targets, load_factor):
+    """
+    Insert trie edges into an open-addressing hash table on (state, key),
+    returning its slot arrays.
+    """
+    n_slots = n_table_slots(edge_keys.shape[0], load_factor)
+    table_states = np.zeros(n_slots, dtype=np.int64)
+    table_keys = np.zeros(n_slots, dtype=np.uint64)
+    table_targets = np.zeros(n_slots, dtype=np.int64)
+    slots = ((edge_keys ^ (edge_states.astype(np.uint64) * _EDGE_HASH_PRIME))
+             & np.uint64(n_slots - 1)).astype(np.int64)
+    # insert all edges at once, one probe step per iteration: among edges
+    # wanting the same empty slot, the first one gets it, the rest move on
+    pending = np.arange(edge_keys.shape[0])
+    while pending.shape[0]:
+        is_free = table_targets[slots[pending]] == 0
+        free_slots, first = np.unique(slots[pending[is_free]], return_index=True)
+        winners = pending[is_free][first]
+        table_states[free_slots] = edge_states[winners]
+        table_keys[free_slots] = edge_keys[winners]
+        table_targets[free_slots] = edge_targets[winners]
+        is_winner = np.zeros(edge_keys.shape[0], dtype=bool)
+        is_winner[winners] = True
+        pending = pending[~is_winner[pending]]
+        slots[pending] = (slots[pending] + 1) & (n_slots - 1)
+    return table_states, table_keys, table_targets
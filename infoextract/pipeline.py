@@ -0,0 +1,208 @@
+"""
+Corpus-level driver for the functions in :mod:`infoextract.extract`: parse a
+stream of texts in batches with spaCy in a pool of worker processes, run a
+configurable set of extractors on each doc *inside the workers*, and stream
+back plain-Python (picklable) results in input order.
+"""
+from collections import deque
+from functools import partial
+
+from cytoolz.itertoolz import partition_all
+import spacy
+from spacy.strings import hash_string
+
+from infoextract import extract
+from utils import compat
+from utils.parallel import bounded_imap
+
+EXTRACTORS = {
+    'words': extract.words,
+    'ngrams': extract.ngrams,
+    'named_entities': extract.named_entities,
+    'noun_chunks': extract.noun_chunks,
+    'phrase_chunks': extract.phrase_chunks,
+}
+
+
+def _token_or_span_offsets(obj):
+    if hasattr(obj, 'start'):
+        return obj.start, obj.end
+    return obj.i, obj.i + 1
+
+
+def _token_or_span_hash(obj):
+    if hasattr(obj, 'start'):
+        return hash_string(obj.text)
+    return obj.orth
+
+
+def _token_or_span_lower_hash(obj):
+    if hasattr(obj, 'start'):
+        return hash_string(obj.text.lower())
+    return obj.lower
+
+
+FEATURE_FORMATS = {
+    'text': lambda obj: obj.text,
+    'lower': lambda obj: obj.text.lower(),
+    'lemma': lambda obj: obj.lemma_,
+    'offsets': _token_or_span_offsets,
+    'hash': _token_or_span_hash,
+    'lower_hash': _token_or_span_lower_hash,
+}
+
+# spacy pipeline loaded once per worker process by `_init_worker()`
+_NLP = None
+
+
+def _init_worker(lang, disable):
+    global _NLP
+    _NLP = spacy.load(lang, disable=disable)
+
+
+def _parse_extractors(extractors):
+    if isinstance(extractors, compat.string_types):
+        extractors = {extractors: {}}
+    elif isinstance(extractors, (set, frozenset, list, tuple)):
+        extractors = {name: {} for name in extractors}
+    elif not isinstance(extractors, dict):
+        msg = 'invalid `extractors` type: "{}"'.format(type(extractors))
+        raise TypeError(msg)
+    for name, kwargs in extractors.items():
+        if name not in EXTRACTORS:
+            msg = 'invalid extractor "{}"; valid extractors are {}'.format(
+                name, sorted(EXTRACTORS.keys()))
+            raise ValueError(msg)
+        if kwargs is not None and not isinstance(kwargs, dict):
+            msg = 'invalid kwargs for extractor "{}": "{}"'.format(name, type(kwargs))
+            raise TypeError(msg)
+    return {name: kwargs or {} for name, kwargs in extractors.items()}
+
+
+def extract_doc(doc, extractors, as_='text'):
+    """
+    Run each of ``extractors`` on a single spacy-parsed ``doc``, and convert
+    their outputs into plain-Python values.
+
+    Args:
+        doc (``spacy.Doc``)
+        extractors (Dict[str, dict]): mapping of extractor name (a key in
+            :data:`EXTRACTORS`) to the keyword arguments it's called with
+        as_ (str): how each extracted token or span is converted; one of
+            {'text', 'lower', 'lemma', 'offsets', 'hash', 'lower_hash'}, where
+            'offsets' gives (start, end) token indexes into ``doc``, and
+            'hash' and 'lower_hash' give the 64-bit ``StringStore`` hash of
+            its (lower-cased) text
+
+    Returns:
+        Dict[str, list]: extracted features per extractor name
+
+    .. note:: ``phrase_chunks`` merges phrases in a copy of ``doc`` by default,
+        so its 'offsets' index into the merged copy; pass it ``mode='spans'``
+        for offsets into ``doc`` itself. With ``mode='inplace'``, it modifies
+        ``doc``, so it's always run after all other extractors.
+    """
+    to_feature = FEATURE_FORMATS[as_]
+    # make sure phrase_chunks' in-place merging can't affect any other extractor
+    names = sorted(extractors, key=lambda name: name == 'phrase_chunks')
+    return {name: [to_feature(obj) for obj in EXTRACTORS[name](doc, **extractors[name])]
+            for name in names}
+
+
+def _extract_batch(texts, extractors, as_, nlp=None):
+    nlp = nlp or _NLP
+    return [extract_doc(doc, extractors, as_=as_)
+            for doc in nlp.pipe(texts, batch_size=len(texts))]
+
+
+def extract_corpus(items,
+                   lang,
+                   extractors=('words',),
+                   as_='text',
+                   batch_size=1000,
+                   n_process=None,
+                   max_in_flight=None,
+                   disable=()):
+    """
+    Parse a stream of texts (or records) with spaCy and extract features from
+    each, using multiple worker processes that each load the spaCy pipeline
+    once and then parse and extract ``batch_size`` texts at a time.
+
+    Args:
+        items (Iterable[str] or Iterable[Tuple[str, obj]]): stream of texts or
+            of (text, metadata) pairs, e.g. as produced by
+            ``split_record_fields(read_json_lines(filepath), 'text', itemwise=True)``;
+            it's consumed lazily, and metadata never leaves the main process
+        lang (str or ``spacy.Language``): name of or path to a spaCy pipeline
+            loadable with ``spacy.load()``; an already-loaded pipeline may only
+            be given if ``n_process`` is 1
+        extractors (str or Set[str] or Dict[str, dict]): names of functions in
+            :mod:`infoextract.extract` to run on each doc (see :data:`EXTRACTORS`),
+            optionally mapped to the keyword arguments they're called with;
+            for example, ``{'words': {'filter_nums': True}, 'ngrams': {'n': 2}}``
+        as_ (str): how each extracted token or span is converted into a
+            picklable value; see :func:`extract_doc()`
+        batch_size (int): number of texts sent to a worker at a time
+        n_process (int): number of worker processes; if None, use all available
+            CPUs; if 1, everything runs in the current process
+        max_in_flight (int): maximum number of batches being processed or
+            waiting to be yielded at any given time, which bounds peak memory
+            at about ``max_in_flight * batch_size`` docs' worth of results;
+            if None, defaults to twice the number of processes
+        disable (Iterable[str]): names of pipeline components to disable when
+            loading ``lang``, e.g. the parser if noun chunks aren't needed
+
+    Yields:
+        Dict[str, list]: extracted features per extractor name, if ``items``
+            are texts, in the same order as ``items``
+        Tuple[Dict[str, list], obj]: extracted features and the corresponding
+            metadata, if ``items`` are (text, metadata) pairs
+
+    Raises:
+        ValueError: if an extractor name or ``as_`` is invalid
+        TypeError: if ``extractors`` is not a str, a set of str, or a dict
+    """
+    extractors = _parse_extractors(extractors)
+    if as_ not in FEATURE_FORMATS:
+        msg = 'invalid `as_` value: "{}"; valid values are {}'.format(
+            as_, sorted(FEATURE_FORMATS.keys()))
+        raise ValueError(msg)
+    if batch_size < 1:
+        raise ValueError('batch_size must be greater than or equal to 1')
+
+    # split off metadata (if any) so that only texts are sent to workers;
+    # results come back in submission order, so metadata can be queued up here
+    metadatas = deque()
+
+    def text_batches():
+        for batch in partition_all(batch_size, items):
+            if batch and not isinstance(batch[0], compat.string_types):
+                texts, metas = zip(*batch)
+                metadatas.append(metas)
+            else:
+                texts = batch
+                metadatas.append(None)
+            yield list(texts)
+
+    if n_process == 1:
+        nlp = spacy.load(lang, disable=disable) if isinstance(lang, compat.string_types) else lang
+        results = (_extract_batch(texts, extractors, as_, nlp=nlp)
+                   for texts in text_batches())
+    else:
+        if not isinstance(lang, compat.string_types):
+            raise TypeError('`lang` must be a str if `n_process` is not 1')
+        futures = bounded_imap(partial(_extract_batch, extractors=extractors, as_=as_),
+                               text_batches(),
+                               n_workers=n_process, use_processes=True, ordered=True,
+                               max_in_flight=max_in_flight,
+                               initializer=_init_worker, initargs=(lang, list(disable)))
+        results = (future.result() for _, future in futures)
+
+    for batch_results in results:
+        metas = metadatas.popleft()
+        if metas is None:
+            for doc_results in batch_results:
+                yield doc_results
+        else:
+            for doc_results, meta in zip(batch_results, metas):
+                yield doc_results, meta
@@ -0,0 +1,144 @@
+"""
+Module for finding typed entities -- URLs, emails, phone numbers, numbers,
+acronyms, currency symbols -- in raw text with the regexes in
+:mod:`utils.constants`, in a single scan: all selected patterns are combined
+into one alternation of named groups, and patterns that can't possibly match a
+given text (e.g. emails in a text without '@') are left out of it beforehand
+by cheap prefilters.
+"""
+from functools import lru_cache, partial
+import re
+
+from cytoolz.itertoolz import partition_all
+
+from utils import constants
+from utils.parallel import bounded_imap
+
+# patterns in order of priority: where matches of several kinds would start at
+# the same position, the first kind wins, and matches never overlap
+PATTERNS = (
+    ('url', constants.URL_REGEX),
+    ('short_url', constants.SHORT_URL_REGEX),
+    ('email', constants.EMAIL_REGEX),
+    ('phone', constants.PHONE_REGEX),
+    ('currency', constants.CURRENCY_REGEX),
+    ('acronym', constants.ACRONYM_REGEX),
+    ('number', constants.NUMBERS_REGEX),
+)
+KINDS = tuple(kind for kind, _ in PATTERNS)
+
+_has_digit = re.compile(r'\d').search
+_has_upper_or_digit = re.compile(r'[A-Z0-9]').search
+_has_url_prefix = re.compile(r'https?:|ftp:|www', flags=re.IGNORECASE).search
+
+# cheap tests of whether each kind of pattern could match a text at all
+PREFILTERS = {
+    'url': _has_url_prefix,
+    'short_url': lambda text: '/' in text,
+    'email': lambda text: '@' in text,
+    'phone': _has_digit,
+    'currency': constants.CURRENCY_REGEX.search,
+    'acronym': _has_upper_or_digit,
+    'number': _has_digit,
+}
+
+
+def combine_patterns(patterns):
+    """
+    Compile several regexes into one alternation of named groups, tried in
+    order at each position, so that a match's kind is given by its ``lastgroup``;
+    each regex's case-insensitivity is kept by scoping it to its group.
+
+    Args:
+        patterns (Sequence[Tuple[str, ``re.Pattern``]]): (name, regex) pairs;
+            names must be valid group names
+
+    Returns:
+        ``re.Pattern``
+    """
+    groups = []
+    for name, regex in patterns:
+        pattern = '(?i:{})'.format(regex.pattern) if regex.flags & re.IGNORECASE else regex.pattern
+        groups.append('(?P<{}>{})'.format(name, pattern))
+    return re.compile('|'.join(groups), flags=re.UNICODE)
+
+
+@lru_cache(maxsize=None)
+def _combined_regex(kinds):
+    patterns = dict(PATTERNS)
+    return combine_patterns([(kind, patterns[kind]) for kind in kinds])
+
+
+def _check_kinds(kinds):
+    if kinds is None:
+        return KINDS
+    if isinstance(kinds, str):
+        kinds = {kinds}
+    invalid = set(kinds).difference(KINDS)
+    if invalid:
+        msg = 'invalid kinds {}; valid kinds are {}'.format(sorted(invalid), KINDS)
+        raise ValueError(msg)
+    # keep the order of priority, whatever the order given
+    return tuple(kind for kind in KINDS if kind in kinds)
+
+
+def scan(text, kinds=None):
+    """
+    Find all (non-overlapping) entities of ``kinds`` in ``text``, in one scan.
+
+    Args:
+        text (str)
+        kinds (str or Set[str]): kinds of entities to find, any of
+            {'url', 'short_url', 'email', 'phone', 'currency', 'acronym', 'number'};
+            if None, all of them
+
+    Returns:
+        List[Tuple[int, int, str]]: (start, end, kind) of each entity, in order
+            of appearance in ``text``; where entities of several kinds would
+            overlap, the one starting first, or else the one of the kind
+            earliest in :data:`KINDS`, is kept
+
+    Raises:
+        ValueError: if any of ``kinds`` is invalid
+    """
+    kinds = tuple(kind for kind in _check_kinds(kinds) if PREFILTERS[kind](text))
+    if not kinds:
+        return []
+    return [(match.start(), match.end(), match.lastgroup)
+            for match in _combined_regex(kinds).finditer(text)]
+
+
+def _scan_texts(texts, kinds):
+    return [scan(text, kinds=kinds) for text in texts]
+
+
+def scan_batch(texts, kinds=None, batch_size=1000, n_workers=1, max_in_flight=None):
+    """
+    Find entities in each of a stream of texts, as with :func:`scan()`, in
+    batches of ``batch_size`` texts, optionally in parallel worker processes.
+
+    Args:
+        texts (Iterable[str]): stream of texts, consumed lazily
+        kinds (str or Set[str]): see :func:`scan()`
+        batch_size (int): number of texts sent to a worker at a time
+        n_workers (int): number of worker processes; if None, use all available
+            CPUs; if 1, everything runs in the current process
+        max_in_flight (int): maximum number of batches being scanned or
+            waiting to be yielded at any given time
+
+    Yields:
+        List[Tuple[int, int, str]]: entities found in the next text, in the
+            same order as ``texts``
+    """
+    kinds = _check_kinds(kinds)
+    batches = partition_all(batch_size, texts)
+    if n_workers == 1:
+        results = (_scan_texts(batch, kinds) for batch in batches)
+    else:
+        futures = bounded_imap(partial(_scan_texts, kinds=kinds), batches,
+                               n_workers=n_workers, use_processes=True,
+                               max_in_flight=max_in_flight)
+        results = (future.result() for _, future in futures)
+    for batch_results in results:
+        for text_results in batch_results:
+            yield text_results
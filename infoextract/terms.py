@@ -0,0 +1,152 @@
+"""
+Module for cleaning up the text of extracted terms -- e.g. named entities and
+noun chunks from :mod:`infoextract.extract` -- with the ``*_TERM_RE`` regexes
+in :mod:`utils.constants`: stripping leading/trailing cruft, fixing dangling
+parentheses and oddly spaced hyphens and apostrophes.
+
+Since the same terms recur over and over across a corpus, :class:`TermCleaner`
+memoizes cleaned terms in a bounded LRU cache, keyed by their tokens' orth ids
+in a ``spacy.StringStore`` (and the whitespace between them), so that the
+regexes run only once per distinct term and a cache hit doesn't even need to
+build the term's text.
+"""
+from collections import OrderedDict, namedtuple
+import re
+
+from spacy.strings import hash_string
+from spacy.tokens import Token
+
+from utils.constants import (DANGLING_PARENS_TERM_RE, LEAD_HYPHEN_TERM_RE,
+                             LEAD_TAIL_CRUFT_TERM_RE, NEG_DIGIT_TERM_RE,
+                             NONBREAKING_SPACE_REGEX, WEIRD_APOSTR_SPACE_TERM_RE,
+                             WEIRD_HYPHEN_SPACE_TERM_RE)
+
+_has_word_char = re.compile(r'\w', flags=re.UNICODE).search
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'max_size', 'size'])
+
+
+def clean_term(term):
+    """
+    Clean up the text of a single term.
+
+    Args:
+        term (str)
+
+    Returns:
+        str: cleaned term, or '' if nothing worth keeping is left, e.g. if
+            its parentheses don't match or it has no word characters
+    """
+    # get rid of leading/trailing junk characters
+    term = LEAD_TAIL_CRUFT_TERM_RE.sub('', term)
+    term = LEAD_HYPHEN_TERM_RE.sub(r'\1', term)
+    # don't allow '(' or ')' to appear without the other, or backwards
+    if '(' in term or ')' in term:
+        if term.count(')') != term.count('(') or term.find(')') < term.find('('):
+            return ''
+        term = DANGLING_PARENS_TERM_RE.sub(r'\1\2\3', term)
+    # oddly separated hyphenated words and negative numbers
+    if '-' in term:
+        term = NEG_DIGIT_TERM_RE.sub(r'\1\2', WEIRD_HYPHEN_SPACE_TERM_RE.sub(r'\1', term))
+    # oddly separated apostrophe'd words
+    if "'" in term:
+        term = WEIRD_APOSTR_SPACE_TERM_RE.sub(r'\1\2', term)
+    term = NONBREAKING_SPACE_REGEX.sub(' ', term).strip()
+    return term if _has_word_char(term) else ''
+
+
+class TermCleaner(object):
+    """
+    Clean up terms as with :func:`clean_term()`, memoizing results in a
+    bounded LRU cache.
+
+    Args:
+        max_size (int): maximum number of cleaned terms to keep in the cache;
+            if None, the cache is unbounded
+
+    Attributes:
+        hits (int): number of terms whose cleaned text was found in the cache
+        misses (int): number of terms that had to be cleaned
+
+    Example::
+
+        >>> cleaner = TermCleaner(max_size=100000)
+        >>> terms = [term for doc in docs
+        ...          for term in cleaner.clean_terms(extract.named_entities(doc))]
+        >>> cleaner.cache_info()
+    """
+
+    def __init__(self, max_size=2 ** 20):
+        if max_size is not None and max_size < 1:
+            raise ValueError('`max_size` must be None or an int >= 1')
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clean(self, term):
+        """
+        Args:
+            term (``spacy.Span`` or ``spacy.Token`` or str)
+
+        Returns:
+            str: cleaned text of ``term``, or '' if nothing worth keeping is left
+        """
+        if isinstance(term, str):
+            key = hash_string(term)
+        elif isinstance(term, Token):
+            key = term.orth  # the same as hash_string(term.text)
+        else:
+            # a span's text is its tokens' texts and the whitespace between them
+            key = (tuple([tok.orth for tok in term]),
+                   tuple([tok.whitespace_ for tok in term[:-1]]))
+        cache = self._cache
+        try:
+            cleaned = cache[key]
+        except KeyError:
+            self.misses += 1
+            cleaned = cache[key] = clean_term(term if isinstance(term, str) else term.text)
+            if self.max_size is not None and len(cache) > self.max_size:
+                cache.popitem(last=False)
+        else:
+            self.hits += 1
+            cache.move_to_end(key)
+        return cleaned
+
+    def clean_terms(self, terms):
+        """
+        Args:
+            terms (Iterable[``spacy.Span`` or ``spacy.Token`` or str]): e.g. as
+                yielded by :func:`extract.named_entities() <infoextract.extract.named_entities>`
+                or :func:`extract.noun_chunks() <infoextract.extract.noun_chunks>`
+
+        Yields:
+            str: the next non-empty cleaned term, in order
+        """
+        clean = self.clean
+        for term in terms:
+            cleaned = clean(term)
+            if cleaned:
+                yield cleaned
+
+    @property
+    def hit_rate(self):
+        """float: fraction of terms whose cleaned text was found in the cache"""
+        n_lookups = self.hits + self.misses
+        return self.hits / n_lookups if n_lookups else 0.0
+
+    def cache_info(self):
+        """
+        Returns:
+            :class:`CacheInfo`: cache hits, misses, maximum size, and current size
+        """
+        return CacheInfo(self.hits, self.misses, self.max_size, len(self._cache))
+
+    def clear(self):
+        """Empty the cache and reset its statistics."""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
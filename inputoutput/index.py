@@ -0,0 +1,268 @@
+"""
+Module with functions for indexing the byte offsets of records (lines) in
+line-delimited files, like JSON-lines and CSV, and for using such an index to
+read any record or range of records without scanning the file from the start.
+
+An index is a 1-d ``int64`` array of length (number of records + 1), where
+record ``k`` spans bytes ``[index[k], index[k + 1])`` of the file; it's
+persisted next to the file it indexes as a ``.npy`` sidecar.
+"""
+from itertools import islice
+import os
+
+import numpy as np
+
+from inputoutput.json_backends import get_json_backend
+from inputoutput.util import open_sesame
+from utils.compat import csv
+
+INDEX_EXT = '.idx.npy'
+
+
+def get_index_filepath(filepath):
+    """Get the /path/to/file on disk of the sidecar index for ``filepath``."""
+    return filepath + INDEX_EXT
+
+
+def _check_uncompressed(filepath):
+    if os.path.splitext(filepath)[1].lower() in ('.gz', '.bz2', '.xz'):
+        msg = 'compressed file "{}" can\'t be randomly accessed by byte offset'.format(filepath)
+        raise ValueError(msg)
+
+
+def _scan_line_offsets(f, start, blocksize):
+    """
+    Find the byte offsets of the starts of all lines that follow a newline in
+    file ``f``, from byte ``start`` to the end of the file.
+    """
+    f.seek(start)
+    offsets = []
+    pos = start
+    while True:
+        block = f.read(blocksize)
+        if not block:
+            break
+        newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+        offsets.append(newlines.astype(np.int64) + (pos + 1))
+        pos += len(block)
+    return offsets, pos
+
+
+def build_line_index(filepath, save=True, blocksize=2 ** 24):
+    """
+    Build an index of the byte offsets of all records (lines) in ``filepath``
+    in a single, fast scan of the file.
+
+    Args:
+        filepath (str): /path/to/file on disk; must not be compressed
+        save (bool): if True, save the index to disk alongside ``filepath``
+            (see :func:`get_index_filepath()`)
+        blocksize (int): number of bytes read per block while scanning
+
+    Returns:
+        ``np.ndarray``: int64 array of record start offsets, plus the end
+            offset of the last record
+
+    Raises:
+        ValueError: if ``filepath`` is compressed
+    """
+    return update_line_index(filepath, index=np.zeros(1, dtype=np.int64),
+                             save=save, blocksize=blocksize)
+
+
+def update_line_index(filepath, index=None, save=True, blocksize=2 ** 24):
+    """
+    Extend an existing index of ``filepath`` with records appended to the file
+    since the index was built, only scanning the new bytes. If the last indexed
+    record wasn't terminated by a newline, it's extended by the appended data.
+
+    Args:
+        filepath (str): /path/to/file on disk; must not be compressed
+        index (``np.ndarray``): existing index of ``filepath``; if None, it's
+            loaded from disk (or built from scratch if it doesn't exist yet)
+        save (bool): if True, save the updated index to disk alongside ``filepath``
+        blocksize (int): number of bytes read per block while scanning
+
+    Returns:
+        ``np.ndarray``: updated int64 index
+
+    Raises:
+        ValueError: if ``filepath`` is compressed, or is smaller than the index
+            says it should be (i.e. it's been modified rather than appended to)
+    """
+    _check_uncompressed(filepath)
+    if index is None:
+        index_filepath = get_index_filepath(filepath)
+        if os.path.exists(index_filepath):
+            index = np.load(index_filepath)
+        else:
+            index = np.zeros(1, dtype=np.int64)
+    end = int(index[-1])
+    with open_sesame(filepath, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size < end:
+            msg = 'file "{}" is smaller than its index; rebuild the index'.format(filepath)
+            raise ValueError(msg)
+        # an unterminated last record is extended by whatever comes next
+        if end > 0:
+            f.seek(end - 1)
+            if f.read(1) != b'\n':
+                index = index[:-1]
+        offsets, size = _scan_line_offsets(f, end, blocksize)
+    new_offsets = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.int64)
+    index = np.concatenate((index, new_offsets))
+    if size > index[-1]:
+        index = np.append(index, size)
+    index = index.astype(np.int64)
+    if save is True:
+        np.save(get_index_filepath(filepath), index)
+    return index
+
+
+def load_line_index(filepath, mmap_mode='r', update=True):
+    """
+    Load the index of ``filepath`` from disk, building it if it doesn't exist yet
+    and extending it if records have been appended to the file since.
+
+    Args:
+        filepath (str): /path/to/file on disk; must not be compressed
+        mmap_mode (str): if not None, memory-map the index with this mode
+            (see ``numpy.load``) rather than reading it into memory
+        update (bool): if True, build or extend the index as needed
+
+    Returns:
+        ``np.ndarray``: int64 index
+    """
+    index_filepath = get_index_filepath(filepath)
+    if not os.path.exists(index_filepath):
+        return build_line_index(filepath)
+    index = np.load(index_filepath, mmap_mode=mmap_mode)
+    if update is True and os.path.getsize(filepath) != index[-1]:
+        index = update_line_index(filepath, index=np.asarray(index))
+    return index
+
+
+def shard_line_index(index, n_shards):
+    """
+    Split the records of an indexed file into ``n_shards`` contiguous ranges
+    that each span (about) the same number of bytes, e.g. to be read in
+    parallel by separate workers or machines.
+
+    Args:
+        index (``np.ndarray``): index of the file, as returned by
+            :func:`load_line_index()`
+        n_shards (int): number of shards
+
+    Returns:
+        List[Tuple[int, int]]: (start, stop) record indexes of each shard;
+            shards may be empty if there are fewer records than shards
+
+    Raises:
+        ValueError: if ``n_shards`` < 1
+    """
+    if n_shards < 1:
+        raise ValueError('n_shards must be greater than or equal to 1')
+    n_records = len(index) - 1
+    targets = np.linspace(index[0], index[-1], n_shards + 1)
+    bounds = np.searchsorted(index, targets, side='left').clip(0, n_records)
+    bounds[0], bounds[-1] = 0, n_records
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def read_lines_range(filepath, start=0, stop=None, index=None):
+    """
+    Iterate over the raw lines of records ``[start, stop)`` of ``filepath``,
+    seeking straight to the first one by its byte offset.
+
+    Args:
+        filepath (str): /path/to/file on disk; must not be compressed
+        start (int): index of the first record to read
+        stop (int): index of the record after the last one to read; if None,
+            read through the last record
+        index (``np.ndarray``): index of ``filepath``; if None, it's loaded
+            with :func:`load_line_index()`
+
+    Yields:
+        bytes: next record's line, including its trailing newline (if any)
+    """
+    _check_uncompressed(filepath)
+    if index is None:
+        index = load_line_index(filepath)
+    n_records = len(index) - 1
+    stop = n_records if stop is None else min(stop, n_records)
+    if start >= stop:
+        return
+    with open_sesame(filepath, mode='rb') as f:
+        f.seek(int(index[start]))
+        for line in islice(f, stop - start):
+            yield line
+
+
+def read_line(filepath, k, index=None):
+    """
+    Read the raw line of record ``k`` of ``filepath`` in O(1) time.
+
+    Raises:
+        IndexError: if there's no record ``k``
+    """
+    _check_uncompressed(filepath)
+    if index is None:
+        index = load_line_index(filepath)
+    n_records = len(index) - 1
+    if k < 0:
+        k += n_records
+    if not 0 <= k < n_records:
+        raise IndexError('record index {} out of range'.format(k))
+    with open_sesame(filepath, mode='rb') as f:
+        f.seek(int(index[k]))
+        return f.read(int(index[k + 1] - index[k]))
+
+
+def read_json_line(filepath, k, index=None, backend=None):
+    """
+    Read JSON object ``k`` from a JSON-lines file in O(1) time.
+
+    Args:
+        filepath (str): /path/to/file on disk; must not be compressed
+        k (int): index of the record to read; may be negative
+        index (``np.ndarray``): index of ``filepath``; if None, it's loaded
+            with :func:`load_line_index()`
+        backend (str): name of the JSON backend used to decode the record
+
+    Returns:
+        dict: JSON object, converted to native Python equivalent
+    """
+    return get_json_backend(backend).loads(read_line(filepath, k, index=index))
+
+
+def read_json_lines_range(filepath, start=0, stop=None, index=None, backend=None):
+    """
+    Iterate over JSON objects ``[start, stop)`` of a JSON-lines file, as in
+    :func:`read_json_lines() <inputoutput.read.read_json_lines>` but without
+    reading any of the file before record ``start``.
+
+    Yields:
+        dict: next JSON object, converted to native Python equivalent
+    """
+    loads = get_json_backend(backend).loads
+    for line in read_lines_range(filepath, start=start, stop=stop, index=index):
+        yield loads(line)
+
+
+def read_csv_range(filepath, start=0, stop=None, index=None,
+                   encoding=None, dialect='excel', delimiter=','):
+    """
+    Iterate over rows ``[start, stop)`` of a CSV file, as in
+    :func:`read_csv() <inputoutput.read.read_csv>` but without reading any of
+    the file before row ``start``.
+
+    .. note:: Records are assumed to be one per line, so this doesn't work
+        for CSV files with quoted fields that contain newlines.
+
+    Yields:
+        List[obj]: next row, whose elements are strings and/or numbers
+    """
+    encoding = encoding or 'utf-8'
+    lines = (line.decode(encoding)
+             for line in read_lines_range(filepath, start=start, stop=stop, index=index))
+    for row in csv.reader(lines, dialect=dialect, delimiter=delimiter):
+        yield row
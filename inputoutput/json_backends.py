@@ -0,0 +1,177 @@
+"""
+Registry of JSON (de)serialization backends used by the readers and writers in
+:mod:`inputoutput.read` and :mod:`inputoutput.write`. The standard library's
+``json`` module is used by default; faster backends (``orjson``, ``ujson``, or
+``simdjson``) are opt-in, by name or as 'fastest', i.e. the first installed one
+in :data:`JSON_BACKEND_PREFERENCE`.
+
+The faster backends are stricter than ``json``: e.g. ``orjson`` rejects dict
+keys that aren't str and integers beyond 64 bits, and can't read ``NaN``. Each
+object they fail on is (de)serialized by ``json`` instead, so such input still
+round-trips; however, ``orjson`` *writes* NaN and infinite floats as ``null``
+without any error, so don't opt into it for data that may include them.
+"""
+from collections import namedtuple
+import json
+
+JsonBackend = namedtuple('JsonBackend', ['name', 'loads', 'dumps', 'dumpb'])
+JsonBackend.__doc__ = """
+A JSON backend: ``loads`` takes a str *or* bytes and returns a Python object;
+``dumps`` and ``dumpb`` serialize an object into compact, non-ASCII-escaped
+JSON as a str or as UTF-8 bytes, respectively.
+"""
+
+
+def _with_fallback(func, fallback):
+    """
+    Wrap a fast backend's ``func`` so that objects it fails on are handled by
+    the standard library's ``fallback`` instead.
+    """
+    def wrapper(obj):
+        try:
+            return func(obj)
+        except (TypeError, ValueError, OverflowError):
+            return fallback(obj)
+
+    return wrapper
+
+
+def _load_orjson():
+    import orjson
+    stdlib = _load_json()
+    return JsonBackend('orjson',
+                       loads=_with_fallback(orjson.loads, stdlib.loads),
+                       dumps=_with_fallback(lambda obj: orjson.dumps(obj).decode('utf-8'),
+                                            stdlib.dumps),
+                       dumpb=_with_fallback(orjson.dumps, stdlib.dumpb))
+
+
+def _load_ujson():
+    import ujson
+
+    stdlib = _load_json()
+
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+
+    return JsonBackend('ujson',
+                       loads=_with_fallback(ujson.loads, stdlib.loads),
+                       dumps=_with_fallback(dumps, stdlib.dumps),
+                       dumpb=_with_fallback(lambda obj: dumps(obj).encode('utf-8'),
+                                            stdlib.dumpb))
+
+
+def _load_simdjson():
+    import simdjson
+    # simdjson only parses; serialization is the same as the stdlib's
+    stdlib = _load_json()
+    return JsonBackend('simdjson',
+                       loads=_with_fallback(simdjson.loads, stdlib.loads),
+                       dumps=stdlib.dumps,
+                       dumpb=stdlib.dumpb)
+
+
+def _load_json():
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    return JsonBackend('json',
+                       loads=json.loads,
+                       dumps=dumps,
+                       dumpb=lambda obj: dumps(obj).encode('utf-8'))
+
+
+# backend name => function that imports and returns it; 'fastest' picks the
+# first installed backend in order of preference
+JSON_BACKEND_LOADERS = {
+    'orjson': _load_orjson,
+    'ujson': _load_ujson,
+    'simdjson': _load_simdjson,
+    'json': _load_json,
+}
+JSON_BACKEND_PREFERENCE = ['orjson', 'ujson', 'simdjson', 'json']
+
+_BACKENDS = {}
+
+
+def register_json_backend(name, loader, preferred=False):
+    """
+    Register a custom JSON backend.
+
+    Args:
+        name (str): name by which the backend can be requested
+        loader (callable): function of no arguments that imports the backend
+            and returns a :class:`JsonBackend`; it should raise ``ImportError``
+            if the backend isn't installed
+        preferred (bool): if True, the backend is picked as 'fastest' (when
+            installed) ahead of all previously registered backends
+    """
+    JSON_BACKEND_LOADERS[name] = loader
+    _BACKENDS.pop(name, None)
+    if name in JSON_BACKEND_PREFERENCE:
+        JSON_BACKEND_PREFERENCE.remove(name)
+    if preferred is True:
+        JSON_BACKEND_PREFERENCE.insert(0, name)
+    else:
+        JSON_BACKEND_PREFERENCE.insert(JSON_BACKEND_PREFERENCE.index('json'), name)
+
+
+def get_json_backend(backend=None):
+    """
+    Get a JSON backend by name, or the fastest one installed.
+
+    Args:
+        backend (str or :class:`JsonBackend`): name of a registered backend,
+            e.g. 'orjson' or 'json'; if 'fastest', the first installed backend
+            in :data:`JSON_BACKEND_PREFERENCE` is used; if None, the standard
+            library's 'json' is used; if already a :class:`JsonBackend`, it's
+            returned as-is
+
+    Returns:
+        :class:`JsonBackend`
+
+    Raises:
+        ValueError: if ``backend`` is not a registered backend name
+        ImportError: if ``backend`` is registered but not installed
+    """
+    if isinstance(backend, JsonBackend):
+        return backend
+    if backend is None:
+        backend = 'json'
+    elif backend == 'fastest':
+        for name in JSON_BACKEND_PREFERENCE:
+            try:
+                return get_json_backend(name)
+            except ImportError:
+                continue
+    if backend not in JSON_BACKEND_LOADERS:
+        msg = 'invalid JSON backend "{}"; valid backends are {}'.format(
+            backend, JSON_BACKEND_PREFERENCE)
+        raise ValueError(msg)
+    if backend not in _BACKENDS:
+        _BACKENDS[backend] = JSON_BACKEND_LOADERS[backend]()
+    return _BACKENDS[backend]
+
+
+def get_json_dumps(backend=None, binary=False, ensure_ascii=False,
+                   indent=None, separators=(',', ':'), sort_keys=False):
+    """
+    Get a function that serializes an object into JSON with the given options,
+    as a str or (if ``binary`` is True) as UTF-8 bytes. The selected backend's
+    serializer is used when the options match its compact, non-ASCII-escaped
+    output; otherwise, the standard library's ``json.dumps`` is used.
+
+    .. seealso:: https://docs.python.org/3/library/json.html#json.dumps
+    """
+    backend = get_json_backend(backend)
+    if (ensure_ascii is False and indent is None and sort_keys is False and
+            tuple(separators or (', ', ': ')) == (',', ':')):
+        return backend.dumpb if binary is True else backend.dumps
+
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=ensure_ascii, indent=indent,
+                          separators=separators, sort_keys=sort_keys)
+
+    if binary is True:
+        return lambda obj: dumps(obj).encode('utf-8')
+    return dumps
@@ -10,18 +10,27 @@ Module with functions for reading content from disk in common formats.
 Borrowed from textacy (https://github.com/chartbeat-labs/textacy)
 """
 
+import codecs
 from functools import partial
+from itertools import islice
 import json
+import mmap
 import os
+import re
+import warnings
 import ijson
 from numpy import load as np_load
 from scipy.sparse import csc_matrix, csr_matrix
 from spacy.tokens.doc import Doc as SpacyDoc
 
 from utils.compat import csv
+from inputoutput.json_backends import get_json_backend
 from inputoutput.util import open_sesame
+from utils.parallel import bounded_imap
 
+# only the stdlib decoder supports incremental decoding via `raw_decode()`
 JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
 
 
 def read_file(filepath, mode='rt', encoding=None):
@@ -79,7 +88,7 @@ def read_json(filepath, mode='rt', encoding=None, prefix=''):
                 yield item
 
 
-def read_json_lines(filepath, mode='rt', encoding=None):
+def read_json_lines(filepath, mode='rt', encoding=None, backend=None):
     """
     Iterate over a stream of JSON objects, where each line of file ``filepath``
     is a valid JSON object but no JSON object (e.g. array) exists at the top level.
@@ -91,18 +100,78 @@ def read_json_lines(filepath, mode='rt', encoding=None):
                 {"title": "Harrison Bergeron", "text": "The year was 2081, and everybody was finally equal."}\n
                 {"title": "2BR02B", "text": "Everything was perfectly swell."}
 
-        mode (str, optional)
+        mode (str, optional): if 'rb', lines are passed to the JSON backend as
+            raw bytes, skipping text decoding
         encoding (str, optional)
+        backend (str, optional): name of the JSON backend used to decode lines,
+            e.g. 'orjson' or 'fastest'; if None, the standard library's ``json``
+            is used (see :func:`get_json_backend() <inputoutput.json_backends.get_json_backend>`)
 
     Yields:
         dict: next valid JSON object, converted to native Python equivalent
     """
+    loads = get_json_backend(backend).loads
     with open_sesame(filepath, mode=mode, encoding=encoding) as f:
         for line in f:
-            yield json.loads(line)
+            yield loads(line)
+
+
+def read_json_lines_batched(filepath, batch_size=1000, backend=None):
+    """
+    Iterate over batches of JSON objects from a file in which each line is a
+    valid JSON object, as in :func:`read_json_lines()`. Lines are read in binary
+    mode, and each batch of lines is decoded by the JSON backend in a single
+    call, which avoids per-line text decoding and function call overhead.
+
+    Args:
+        filepath (str): /path/to/file on disk from which json objects will be streamed
+        batch_size (int, optional): maximum number of lines per batch
+        backend (str, optional): name of the JSON backend used to decode lines;
+            if None, the standard library's ``json`` is used; see :func:`read_json_lines()`
 
+    Yields:
+        List[dict]: next batch of (up to) ``batch_size`` JSON objects, converted
+            to native Python equivalents; empty lines are skipped, but count
+            towards ``batch_size``
 
-def read_json_mash(filepath, mode='rt', encoding=None, buffersize=2048):
+    Raises:
+        ValueError: if ``batch_size`` < 1, or a line isn't exactly one valid
+            JSON value, with the number of the (first) offending line
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be greater than or equal to 1')
+    loads = get_json_backend(backend).loads
+    lineno = 0
+    with open_sesame(filepath, mode='rb') as f:
+        while True:
+            lines = list(islice(f, batch_size))
+            if not lines:
+                break
+            linenos = [lineno + i for i, line in enumerate(lines, 1) if line.strip()]
+            lineno += len(lines)
+            lines = [line for line in lines if line.strip()]
+            # decode the whole batch at once, with each line wrapped in its own
+            # array so that it must hold exactly one value, e.g. not '1,2';
+            # if that fails, decode line by line to find the offending one
+            try:
+                batch = [value for (value,) in loads(b'[[' + b'],['.join(lines) + b']]')]
+                if len(batch) != len(lines):
+                    raise ValueError('lines and values don\'t match up')
+            except ValueError:
+                batch = [_loads_line(loads, line, n, filepath) for line, n in zip(lines, linenos)]
+            yield batch
+
+
+def _loads_line(loads, line, lineno, filepath):
+    try:
+        return loads(line)
+    except ValueError as e:
+        msg = 'invalid JSON on line {} of "{}": {}'.format(lineno, filepath, e)
+        raise ValueError(msg)
+
+
+def read_json_mash(filepath, mode='rt', encoding=None, buffersize=65536,
+                   use_mmap=False):
     """
     Iterate over a stream of JSON objects, all of them mashed together, end-to-end,
     on a single line of a file. Bad form, but still manageable.
@@ -114,25 +183,87 @@ def read_json_mash(filepath, mode='rt', encoding=None, buffersize=2048):
 
                 {"title": "Harrison Bergeron", "text": "The year was 2081, and everybody was finally equal."}{"title": "2BR02B", "text": "Everything was perfectly swell."}
 
-        mode (str, optional)
+        mode (str, optional): if 'rb', the file is read as raw bytes and decoded
+            incrementally, which skips the overhead of a text-mode file wrapper
         encoding (str, optional)
-        buffersize (int, optional): number of bytes to read in as a chunk
+        buffersize (int, optional): number of bytes (characters, in text mode)
+            to read in as the first chunk; subsequent chunks grow as needed
+            to fit objects that span many chunks
+        use_mmap (bool, optional): if True, memory-map the file rather than
+            reading it through a file object; only applicable to uncompressed files
 
     Yields:
         dict: next valid JSON object, converted to native Python equivalent
+
+    Raises:
+        ValueError: if the file contains invalid JSON, or if ``use_mmap`` is True
+            for a compressed file
     """
-    with open_sesame(filepath, mode=mode, encoding=encoding) as f:
-        buffer = ''
-        for chunk in iter(partial(f.read, buffersize), ''):
-            buffer += chunk
-            while buffer:
-                try:
-                    result, index = JSON_DECODER.raw_decode(buffer)
-                    yield result
-                    buffer = buffer[index:]
-                # not enough data to decode => read another chunk
-                except ValueError:
-                    break
+    if use_mmap is True:
+        if os.path.splitext(filepath)[1].lower() in ('.gz', '.bz2', '.xz'):
+            raise ValueError('`use_mmap` is only applicable to uncompressed files')
+        with open_sesame(filepath, mode='rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for obj in _decode_json_mash(mm.read, buffersize, encoding=encoding or 'utf-8'):
+                    yield obj
+    elif 'b' in mode:
+        with open_sesame(filepath, mode=mode) as f:
+            for obj in _decode_json_mash(f.read, buffersize, encoding=encoding or 'utf-8'):
+                yield obj
+    else:
+        with open_sesame(filepath, mode=mode, encoding=encoding) as f:
+            for obj in _decode_json_mash(f.read, buffersize):
+                yield obj
+
+
+def _decode_json_mash(read, buffersize, encoding=None, max_buffersize=2 ** 26):
+    """
+    Decode mashed-together JSON objects from successive ``read(size)`` calls,
+    in time linear in the total size of the data: objects are decoded in place
+    at an offset into the buffer, which is only compacted once per chunk;
+    and when an object spans chunks, the chunk size is doubled (up to
+    ``max_buffersize``) so that re-decoding its beginning stays amortized O(1).
+    If ``encoding`` is not None, chunks are bytes and are decoded incrementally.
+    """
+    decode = codecs.getincrementaldecoder(encoding)().decode if encoding else None
+    buffer = ''
+    pos = 0
+    eof = False
+    while True:
+        n_decoded = 0
+        while True:
+            pos = _JSON_WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            try:
+                result, end = JSON_DECODER.raw_decode(buffer, pos)
+            # not enough data to decode => read another chunk
+            except ValueError:
+                if eof is True:
+                    raise
+                break
+            # a number at the very end of the buffer may continue in the next chunk
+            if end == len(buffer) and eof is False and isinstance(result, (int, float)):
+                break
+            pos = end
+            n_decoded += 1
+            yield result
+        if eof is True:
+            return
+
+        chunk = read(buffersize)
+        if not chunk:
+            eof = True
+            chunk = decode(b'', True) if decode else ''
+        else:
+            if decode:
+                chunk = decode(chunk)
+            if n_decoded == 0 and pos < len(buffer):
+                buffersize = min(2 * buffersize, max_buffersize)
+        buffer = buffer[pos:] + chunk
+        pos = 0
 
 
 def read_csv(filepath, encoding=None, dialect='excel', delimiter=','):
@@ -180,38 +311,198 @@ def read_spacy_docs(spacy_vocab, filepath):
             yield SpacyDoc(spacy_vocab).from_bytes(bytes_string)
 
 
-def read_sparse_csr_matrix(filepath):
+def read_sparse_csr_matrix(filepath, mmap_mode=None):
     """
     Read the data, indices, indptr, and shape arrays from a ``.npz`` file on disk
     at ``filepath``, and return an instantiated ``scipy.sparse.csr_matrix``.
+
+    If ``filepath`` is instead a directory written by
+    :func:`write_sparse_matrix(mmappable=True) <inputoutput.write.write_sparse_matrix>`,
+    its arrays may be memory-mapped with ``mmap_mode`` (e.g. 'r'), so that
+    loading is near-instant and the matrix's memory is shared by all processes
+    that map it.
     """
-    npz_file = np_load(filepath)
-    return csr_matrix((npz_file['data'], npz_file['indices'], npz_file['indptr']),
-                      shape=npz_file['shape'])
+    return _read_sparse_matrix(filepath, 'csr', mmap_mode)
 
 
-def read_sparse_csc_matrix(filepath):
+def read_sparse_csc_matrix(filepath, mmap_mode=None):
     """
     Read the data, indices, indptr, and shape arrays from a ``.npz`` file on disk
     at ``filepath``, and return an instantiated ``scipy.sparse.csc_matrix``.
+
+    If ``filepath`` is instead a directory written by
+    :func:`write_sparse_matrix(mmappable=True) <inputoutput.write.write_sparse_matrix>`,
+    its arrays may be memory-mapped with ``mmap_mode`` (e.g. 'r').
+    """
+    return _read_sparse_matrix(filepath, 'csc', mmap_mode)
+
+
+def read_sparse_csr_rows(filepath, start, stop, mmap_mode='r'):
+    """
+    Read only rows ``[start, stop)`` of a CSR matrix saved on disk at ``filepath``,
+    by slicing its ``indptr`` first and then just the corresponding ranges of
+    its ``data`` and ``indices``; with a memory-mapped matrix directory, the
+    latter are zero-copy views.
+
+    Args:
+        filepath (str): /path/to/file or directory on disk, as written by
+            :func:`write_sparse_matrix() <inputoutput.write.write_sparse_matrix>`
+        start (int): index of the first row to read
+        stop (int): index of the row after the last one to read
+        mmap_mode (str): memory-map mode for a matrix directory; ignored
+            for ``.npz`` files, which are read into memory
+
+    Returns:
+        ``scipy.sparse.csr_matrix``: of shape (``stop - start``, number of columns)
     """
-    npz_file = np_load(filepath)
-    return csc_matrix((npz_file['data'], npz_file['indices'], npz_file['indptr']),
-                      shape=npz_file['shape'])
+    return _read_sparse_matrix(filepath, 'csr', mmap_mode, start=start, stop=stop)
 
 
-def read_dir(dirpath, filemode="rt", fileencoding=None):
+def read_sparse_csc_cols(filepath, start, stop, mmap_mode='r'):
+    """
+    Read only columns ``[start, stop)`` of a CSC matrix saved on disk at
+    ``filepath``; see :func:`read_sparse_csr_rows()`.
+
+    Returns:
+        ``scipy.sparse.csc_matrix``: of shape (number of rows, ``stop - start``)
+    """
+    return _read_sparse_matrix(filepath, 'csc', mmap_mode, start=start, stop=stop)
+
+
+def _read_sparse_matrix(filepath, matrix_format, mmap_mode, start=None, stop=None):
+    matrix_cls = csr_matrix if matrix_format == 'csr' else csc_matrix
+    if os.path.isdir(filepath):
+        arrays = {name: np_load(os.path.join(filepath, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in ('data', 'indices', 'indptr', 'shape', 'format')}
+        saved_format = str(arrays['format'])
+        if saved_format != matrix_format:
+            msg = 'matrix at "{}" is in {} format, not {}'.format(
+                filepath, saved_format, matrix_format)
+            raise ValueError(msg)
+    else:
+        arrays = np_load(filepath)
+    data, indices, indptr = arrays['data'], arrays['indices'], arrays['indptr']
+    shape = tuple(int(dim) for dim in arrays['shape'])
+    if start is None:
+        return _sparse_matrix(matrix_cls, data, indices, indptr, shape)
+
+    # csr matrices are sliced along rows (axis 0), csc along columns (axis 1)
+    axis = 0 if matrix_format == 'csr' else 1
+    start, stop, _ = slice(start, stop).indices(shape[axis])
+    stop = max(start, stop)
+    lo, hi = int(indptr[start]), int(indptr[stop])
+    indptr = indptr[start: stop + 1] - lo
+    shape = (stop - start, shape[1]) if axis == 0 else (shape[0], stop - start)
+    return _sparse_matrix(matrix_cls, data[lo: hi], indices[lo: hi], indptr, shape)
+
+
+def _sparse_matrix(matrix_cls, data, indices, indptr, shape):
+    """
+    Build a sparse matrix from its arrays as-is: scipy's constructors downcast
+    int64 ``indices`` and ``indptr`` to int32 where the values fit, which would
+    silently copy memory-mapped arrays into memory.
+    """
+    matrix = matrix_cls(shape, dtype=data.dtype)
+    matrix.data, matrix.indices, matrix.indptr = data, indices, indptr
+    return matrix
+
+
+def read_files_parallel(filepaths, read_func=read_file,
+                        n_workers=None, use_processes=False, ordered=True,
+                        max_in_flight=None, errors='raise'):
+    """
+    Read many files concurrently in a bounded pool of threads or processes,
+    streaming back each file's contents as soon as it (or, if ``ordered`` is
+    True, every file before it) has been read.
+
+    Args:
+        filepaths (Iterable[str]): /path/to/files on disk to read, consumed lazily;
+            for example, as yielded by :func:`get_filenames() <inputoutput.util.get_filenames>`
+        read_func (callable): function that takes a filepath and returns its
+            *fully materialized* contents, e.g. ``read_file`` or a
+            ``functools.partial`` thereof; must be defined at module level
+            if ``use_processes`` is True
+        n_workers (int): number of worker threads or processes; if None,
+            all available CPUs are used
+        use_processes (bool): if True, read files in a pool of processes, which
+            helps when decompression or parsing dominates; otherwise, use a pool
+            of threads, which is best when waiting on (network) storage dominates
+        ordered (bool): if True, yield files in the same order as ``filepaths``;
+            otherwise, yield them as soon as they've been read
+        max_in_flight (int): maximum number of files being read or waiting to
+            be yielded at any given time, which caps memory use; if None,
+            defaults to twice the number of workers
+        errors (str): how to handle a file that can't be read: 'raise' re-raises
+            the exception and stops the stream; 'warn' issues a warning naming
+            the file and moves on; 'ignore' silently moves on
+
+    Yields:
+        Tuple[str, obj]: next file's path and its contents, as returned by ``read_func``
+
+    Raises:
+        ValueError: if ``errors`` is not one of {'raise', 'warn', 'ignore'}
+    """
+    if errors not in ('raise', 'warn', 'ignore'):
+        msg = 'invalid `errors` value: "{}"; valid values are {}'.format(
+            errors, {'raise', 'warn', 'ignore'})
+        raise ValueError(msg)
+    results = bounded_imap(read_func, filepaths,
+                           n_workers=n_workers, use_processes=use_processes,
+                           ordered=ordered, max_in_flight=max_in_flight)
+    for filepath, future in results:
+        try:
+            content = future.result()
+        except Exception as e:
+            if errors == 'raise':
+                raise
+            elif errors == 'warn':
+                warnings.warn('unable to read file "{}": {}'.format(filepath, e))
+            continue
+        yield filepath, content
+
+
+def _read_json_items(filepath, mode='rt', encoding=None, prefix=''):
+    return list(read_json(filepath, mode=mode, encoding=encoding, prefix=prefix))
+
+
+def _read_csv_rows(filepath, encoding=None, dialect='excel', delimiter=','):
+    return list(read_csv(filepath, encoding=encoding, dialect=dialect, delimiter=delimiter))
+
+
+def _dir_filepaths(dirpath):
+    for file in os.listdir(dirpath):
+        yield os.path.join(dirpath, file)
+
+
+def read_dir(dirpath, filemode="rt", fileencoding=None,
+             n_workers=1, use_processes=False, ordered=True,
+             max_in_flight=None, errors='raise'):
     """
     Reads a directory containing files other than csv and json.
     Read the full contents of a file. Files compressed with gzip, bz2, or lzma
     are handled automatically.
+
+    Every entry directly under ``dirpath`` is read, as listed by ``os.listdir``.
+    If ``n_workers`` is not 1, files are read concurrently; see
+    :func:`read_files_parallel()` for the meaning of ``use_processes``,
+    ``ordered``, ``max_in_flight``, and ``errors``.
     """
-    for file in os.listdir(dirpath):
-        fname = os.path.join(dirpath, file)
+    if n_workers != 1:
+        read_func = partial(read_file, mode=filemode, encoding=fileencoding)
+        for _, content in read_files_parallel(
+                _dir_filepaths(dirpath), read_func=read_func,
+                n_workers=n_workers, use_processes=use_processes, ordered=ordered,
+                max_in_flight=max_in_flight, errors=errors):
+            yield content
+        return
+
+    for fname in _dir_filepaths(dirpath):
         yield read_file(fname, mode=filemode, encoding=fileencoding)
 
 
-def read_json_dir(dirpath, filemode="rt", fileencoding=None):
+def read_json_dir(dirpath, filemode="rt", fileencoding=None,
+                  n_workers=1, use_processes=False, ordered=True,
+                  max_in_flight=None, errors='raise'):
     """
     Reads a directory containing json files
     Args:
@@ -225,19 +516,34 @@ def read_json_dir(dirpath, filemode="rt", fileencoding=None):
 
     filemode (str, optional)
     fileencoding (str, optional)
+    n_workers (int, optional): if not 1, files are read concurrently by this
+        many workers, each file's JSON objects being read in full before they
+        are yielded
+    use_processes, ordered, max_in_flight, errors (optional): see
+        :func:`read_files_parallel()`
 
     Yields:
-        JSON Objects
+        Iterator[obj]: next file's JSON objects
 
     Notes:
         Refer to ``ijson`` at https://pypi.python.org/pypi/ijson/ for usage details.
     """
-    for file in os.listdir(dirpath):
-        fname = os.path.join(dirpath, file)
+    if n_workers != 1:
+        read_func = partial(_read_json_items, mode=filemode, encoding=fileencoding)
+        for _, items in read_files_parallel(
+                _dir_filepaths(dirpath), read_func=read_func,
+                n_workers=n_workers, use_processes=use_processes, ordered=ordered,
+                max_in_flight=max_in_flight, errors=errors):
+            yield (item for item in items)
+        return
+
+    for fname in _dir_filepaths(dirpath):
         yield read_json(fname, mode=filemode, encoding=fileencoding)
 
 
-def read_csv_dir(dirpath, fileencoding=None, dialect="excel", delimiter=','):
+def read_csv_dir(dirpath, fileencoding=None, dialect="excel", delimiter=',',
+                 n_workers=1, use_processes=False, ordered=True,
+                 max_in_flight=None, errors='raise'):
     """
     Reads a directory containing CSV files.
     Args:
@@ -248,14 +554,28 @@ def read_csv_dir(dirpath, fileencoding=None, dialect="excel", delimiter=','):
             first 1024 bytes of the file is analyzed, producing a best guess for
             the correct dialect
         delimiter (str): 1-character string used to separate fields in a row of a csv file
+        n_workers (int): if not 1, files are read concurrently by this many
+            workers, each file's rows being read in full before they are yielded
+        use_processes, ordered, max_in_flight, errors: see
+            :func:`read_files_parallel()`
 
     Yields:
-        List[obj]: next row, whose elements are strings and/or numbers
+        Iterator[List[obj]]: next file's rows, whose elements are strings
+            and/or numbers
 
     .. seealso:: https://docs.python.org/3/library/csv.html#csv.reader
     """
-    for file in os.listdir(dirpath):
-        fname = os.path.join(dirpath, file)
+    if n_workers != 1:
+        read_func = partial(_read_csv_rows, encoding=fileencoding,
+                            dialect=dialect, delimiter=delimiter)
+        for _, rows in read_files_parallel(
+                _dir_filepaths(dirpath), read_func=read_func,
+                n_workers=n_workers, use_processes=use_processes, ordered=ordered,
+                max_in_flight=max_in_flight, errors=errors):
+            yield (row for row in rows)
+        return
+
+    for fname in _dir_filepaths(dirpath):
         yield read_csv(fname, encoding=fileencoding, dialect=dialect, delimiter=delimiter)
 
 
@@ -9,13 +9,18 @@ Module with functions for writing content to disk in common formats.
 """
 Borrowed from textacy (https://github.com/chartbeat-labs/textacy)
 """
-import json
+import os
+import shutil
+import tempfile
 
+from cytoolz.itertoolz import partition_all
+import numpy as np
 from numpy import savez, savez_compressed
-from scipy.sparse import csc_matrix, csr_matrix
+from scipy.sparse import coo_matrix, csc_matrix, csr_matrix, issparse
 from spacy.tokens.doc import Doc as SpacyDoc
 
 from utils.compat import csv, unicode_to_bytes
+from inputoutput.json_backends import get_json_dumps
 from inputoutput.util import open_sesame, make_dirs
 
 
@@ -47,7 +52,8 @@ def write_file_lines(lines, filepath, mode='wt', encoding=None,
 
 def write_json(json_object, filepath, mode='wt', encoding=None,
                auto_make_dirs=False, ensure_ascii=False,
-               indent=None, separators=(',', ':'), sort_keys=False):
+               indent=None, separators=(',', ':'), sort_keys=False,
+               backend=None):
     """
     Write JSON object all at once to disk at ``filepath``.
 
@@ -68,18 +74,23 @@ def write_json(json_object, filepath, mode='wt', encoding=None,
         ensure_ascii (bool)
         separators (tuple[str])
         sort_keys (bool)
+        backend (str): name of the JSON backend used to serialize ``json_object``,
+            e.g. 'orjson' or 'fastest', used as long as the options above are
+            left at their defaults; if None, the standard library's ``json`` is
+            used (see :func:`get_json_dumps() <inputoutput.json_backends.get_json_dumps>`)
 
     .. seealso:: https://docs.python.org/3/library/json.html#json.dump
     """
+    dumps = get_json_dumps(backend, binary='b' in mode, ensure_ascii=ensure_ascii,
+                           indent=indent, separators=separators, sort_keys=sort_keys)
     with open_sesame(filepath, mode=mode, encoding=encoding,
                      auto_make_dirs=auto_make_dirs) as f:
-        f.write(json.dumps(json_object, indent=indent, ensure_ascii=ensure_ascii,
-                           separators=separators, sort_keys=sort_keys))
+        f.write(dumps(json_object))
 
 
 def write_json_lines(json_objects, filepath, mode='wt', encoding=None,
                      auto_make_dirs=False, ensure_ascii=False,
-                     separators=(',', ':'), sort_keys=False):
+                     separators=(',', ':'), sort_keys=False, backend=None):
     """
     Iterate over a stream of JSON objects, writing each to a separate line in
     file ``filepath`` but without a top-level JSON object (e.g. array).
@@ -98,17 +109,20 @@ def write_json_lines(json_objects, filepath, mode='wt', encoding=None,
         ensure_ascii (bool)
         separators (tuple[str])
         sort_keys (bool)
+        backend (str): name of the JSON backend used to serialize objects, e.g.
+            'orjson' or 'fastest', used as long as the options above are left at
+            their defaults; if None, the standard library's ``json`` is used;
+            in 'wb' mode, objects are serialized straight to bytes
 
     .. seealso:: https://docs.python.org/3/library/json.html#json.dump
     """
     newline = '\n' if 't' in mode else unicode_to_bytes('\n')
+    dumps = get_json_dumps(backend, binary='b' in mode, ensure_ascii=ensure_ascii,
+                           separators=separators, sort_keys=sort_keys)
     with open_sesame(filepath, mode=mode, encoding=encoding,
                      auto_make_dirs=auto_make_dirs) as f:
         for json_object in json_objects:
-            f.write(json.dumps(json_object,
-                               ensure_ascii=ensure_ascii,
-                               separators=separators,
-                               sort_keys=sort_keys) + newline)
+            f.write(dumps(json_object) + newline)
 
 
 def write_csv(rows, filepath, encoding=None, auto_make_dirs=False,
@@ -163,7 +177,7 @@ def write_spacy_docs(spacy_docs, filepath, auto_make_dirs=False):
             f.write(doc.to_bytes())
 
 
-def write_sparse_matrix(matrix, filepath, compressed=True):
+def write_sparse_matrix(matrix, filepath, compressed=True, mmappable=False):
     """
     Write a ``scipy.sparse.csr_matrix`` or ``scipy.sparse.csc_matrix`` to disk
     at ``filepath``, optionally compressed.
@@ -175,12 +189,22 @@ def write_sparse_matrix(matrix, filepath, compressed=True):
             automatically appended to the name
         compressed (bool): if True, save arrays into a single file in compressed
             .npz format
+        mmappable (bool): if True, instead save arrays uncompressed as separate
+            ``.npy`` files in directory ``filepath``, which can then be
+            memory-mapped by :func:`read_sparse_csr_matrix() <inputoutput.read.read_sparse_csr_matrix>`
+            and friends, or partially loaded by :func:`read_sparse_csr_rows() <inputoutput.read.read_sparse_csr_rows>`
+            and :func:`read_sparse_csc_cols() <inputoutput.read.read_sparse_csc_cols>`;
+            ``compressed`` is ignored
 
     .. seealso: http://docs.scipy.org/doc/numpy-1.10.0/reference/generated/numpy.savez.html
     .. seealso: http://docs.scipy.org/doc/numpy-1.10.0/reference/generated/numpy.savez_compressed.html
     """
     if not isinstance(matrix, (csc_matrix, csr_matrix)):
         raise TypeError('input matrix must be a scipy sparse csr or csc matrix')
+    if mmappable is True:
+        write_sparse_matrix_dir(matrix.data, matrix.indices, matrix.indptr,
+                                matrix.shape, matrix.format, filepath)
+        return
     make_dirs(filepath, 'w')
     if compressed is False:
         savez(filepath,
@@ -191,3 +215,207 @@ def write_sparse_matrix(matrix, filepath, compressed=True):
                          data=matrix.data, indices=matrix.indices,
                          indptr=matrix.indptr, shape=matrix.shape)
 
+
+def write_sparse_matrix_dir(data, indices, indptr, shape, matrix_format, dirpath):
+    """
+    Save the component arrays of a sparse matrix in ``matrix_format`` ('csr' or 'csc')
+    as separate, uncompressed ``.npy`` files in directory ``dirpath``, which is
+    created if needed.
+    """
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+    arrays = {'data': data, 'indices': indices, 'indptr': indptr,
+              'shape': np.asarray(shape, dtype=np.int64), 'format': np.array(matrix_format)}
+    for name, array in arrays.items():
+        np.save(os.path.join(dirpath, name + '.npy'), array)
+
+
+class SparseMatrixWriter(object):
+    """
+    Build a ``scipy.sparse.csr_matrix`` incrementally, one batch of rows at a
+    time, and write it to disk at ``filepath`` in the same format as
+    :func:`write_sparse_matrix()`. Rows' data, indices, and indptr are spilled
+    to growable arrays in temporary files as they're appended, so peak memory
+    depends only on the size of a batch, not on the total number of rows.
+
+    Args:
+        filepath (str): /path/to/file on disk to which the matrix will be written
+        n_cols (int): number of columns in the matrix (e.g. vocabulary size);
+            if None, it's one more than the largest column index appended
+        dtype (``numpy.dtype``): type of the matrix's values
+        index_dtype (``numpy.dtype``): type of the matrix's indices and indptr;
+            ``np.int32`` is half the size of ``np.int64`` but limits the number
+            of non-zero values, and of columns, to 2**31 - 1
+        compressed (bool): if True, save arrays into a single file in compressed
+            .npz format
+        mmappable (bool): if True, save arrays as uncompressed ``.npy`` files in
+            directory ``filepath``; see :func:`write_sparse_matrix()`
+        tmpdir (str): /path/to/dir on disk in which temporary files are
+            spilled; if None, the system default is used
+
+    Example::
+
+        with SparseMatrixWriter('doc_term_matrix.npz', n_cols=len(vocab)) as writer:
+            for batch in batches:
+                writer.append([[(term_id, count), ...], ...])
+    """
+
+    def __init__(self, filepath, n_cols=None, dtype=np.float64,
+                 index_dtype=np.int32, compressed=True, mmappable=False,
+                 tmpdir=None):
+        if n_cols is not None and n_cols - 1 > np.iinfo(index_dtype).max:
+            msg = 'n_cols = {} overflows {}; use a larger `index_dtype`'.format(
+                n_cols, np.dtype(index_dtype))
+            raise ValueError(msg)
+        self.filepath = filepath
+        self.n_cols = n_cols
+        self.dtype = np.dtype(dtype)
+        self.index_dtype = np.dtype(index_dtype)
+        self.compressed = compressed
+        self.mmappable = mmappable
+        self.n_rows = 0
+        self.nnz = 0
+        self._max_col = -1
+        self._closed = False
+        self._tmpdir = tempfile.mkdtemp(dir=tmpdir)
+        self._files = {name: open(os.path.join(self._tmpdir, name + '.bin'), mode='wb')
+                       for name in ('data', 'indices', 'indptr')}
+        self._files['indptr'].write(np.zeros(1, dtype=self.index_dtype).tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._cleanup()
+
+    @property
+    def shape(self):
+        """Tuple[int, int]: shape of the matrix appended so far."""
+        n_cols = self.n_cols if self.n_cols is not None else self._max_col + 1
+        return self.n_rows, n_cols
+
+    def append(self, rows):
+        """
+        Append a batch of rows to the matrix.
+
+        Args:
+            rows (``scipy.sparse.spmatrix`` or Iterable[Iterable[Tuple[int, number]]]):
+                either a sparse matrix, or an iterable of rows, each of which
+                is an iterable of (column index, value) pairs (or a dict
+                mapping column index to value); values of repeated columns
+                in a row are summed
+
+        Raises:
+            ValueError: if a column index is out of bounds, or if it or the number
+                of non-zero values overflows ``index_dtype``
+        """
+        if not issparse(rows):
+            rows = self._rows_to_csr(rows)
+        rows = csr_matrix(rows)
+        if not rows.has_canonical_format:
+            rows = rows.copy()  # don't modify the caller's matrix in place
+            rows.sum_duplicates()
+        if rows.shape[0] == 0:
+            return
+        if rows.nnz:
+            max_col = int(rows.indices.max())
+            if self.n_cols is not None and max_col >= self.n_cols:
+                raise ValueError('column index {} out of bounds for {} columns'.format(
+                    max_col, self.n_cols))
+            if max_col > np.iinfo(self.index_dtype).max:
+                msg = 'column index {} overflows {}; use a larger `index_dtype`'.format(
+                    max_col, self.index_dtype)
+                raise ValueError(msg)
+            self._max_col = max(self._max_col, max_col)
+        if self.nnz + rows.nnz > np.iinfo(self.index_dtype).max:
+            msg = 'number of non-zero values overflows {}; use a larger `index_dtype`'.format(
+                self.index_dtype)
+            raise ValueError(msg)
+        self._files['data'].write(rows.data.astype(self.dtype).tobytes())
+        self._files['indices'].write(rows.indices.astype(self.index_dtype).tobytes())
+        self._files['indptr'].write((rows.indptr[1:] + self.nnz).astype(self.index_dtype).tobytes())
+        self.n_rows += rows.shape[0]
+        self.nnz += rows.nnz
+
+    def _rows_to_csr(self, rows):
+        row_ids = []
+        col_ids = []
+        values = []
+        n_rows = 0
+        for row in rows:
+            if isinstance(row, dict):
+                row = row.items()
+            for col_id, value in row:
+                row_ids.append(n_rows)
+                col_ids.append(col_id)
+                values.append(value)
+            n_rows += 1
+        n_cols = max(col_ids) + 1 if col_ids else 0
+        if self.n_cols is not None:
+            n_cols = max(n_cols, self.n_cols)
+        return coo_matrix((np.asarray(values, dtype=self.dtype),
+                           (np.asarray(row_ids, dtype=np.int64), np.asarray(col_ids, dtype=np.int64))),
+                          shape=(n_rows, n_cols))
+
+    def close(self):
+        """
+        Finish the matrix and write it to disk at ``filepath``; temporary files
+        are removed afterwards. Closing an already closed writer does nothing.
+        """
+        if self._closed is True:
+            return
+        self._closed = True
+        try:
+            for f in self._files.values():
+                f.close()
+            data = self._load_spilled('data', self.dtype, self.nnz)
+            indices = self._load_spilled('indices', self.index_dtype, self.nnz)
+            indptr = self._load_spilled('indptr', self.index_dtype, self.n_rows + 1)
+            shape = self.shape
+            if self.mmappable is True:
+                write_sparse_matrix_dir(data, indices, indptr, shape, 'csr', self.filepath)
+            else:
+                make_dirs(self.filepath, 'w')
+                save = savez_compressed if self.compressed is True else savez
+                save(self.filepath, data=data, indices=indices, indptr=indptr, shape=shape)
+            del data, indices, indptr
+        finally:
+            self._cleanup()
+
+    def _load_spilled(self, name, dtype, length):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self._tmpdir, name + '.bin'),
+                         dtype=dtype, mode='r', shape=(length,))
+
+    def _cleanup(self):
+        self._closed = True
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+def write_sparse_matrix_rows(rows, filepath, batch_size=10000, **kwargs):
+    """
+    Write a (possibly huge) stream of rows to disk at ``filepath`` as a
+    ``scipy.sparse.csr_matrix``, without ever holding more than ``batch_size``
+    rows in memory.
+
+    Args:
+        rows (Iterable[Iterable[Tuple[int, number]]]): iterable of rows, each of
+            which is an iterable of (column index, value) pairs, e.g. (term id,
+            count) pairs for each document in a corpus
+        filepath (str): /path/to/file on disk to which the matrix will be written
+        batch_size (int): number of rows appended at a time
+        **kwargs: passed to :class:`SparseMatrixWriter`
+
+    Returns:
+        Tuple[int, int]: shape of the matrix written
+    """
+    with SparseMatrixWriter(filepath, **kwargs) as writer:
+        for batch in partition_all(batch_size, rows):
+            writer.append(batch)
+    return writer.shape
@@ -0,0 +1,583 @@
+"""
+Module for learning multiword expressions ("phrases") from n-gram counts over a
+streamed corpus, and for detecting them in new docs. N-grams are identified by
+64-bit hashes (see :func:`ngram_hashes() <infoextract.vectorized.ngram_hashes>`)
+and counted in bounded memory, either exactly but with periodic pruning of
+infrequent n-grams, or approximately with a count-min sketch.
+"""
+from functools import partial
+import os
+
+from cytoolz.itertoolz import partition_all
+import numpy as np
+import spacy
+from spacy.attrs import LOWER
+
+from infoextract import pipeline
+from infoextract.vectorized import _NGRAM_HASH_PRIME, ngram_hashes, ngram_starts, token_attrs, word_mask
+from utils import compat
+from utils.parallel import bounded_imap
+
+SCORINGS = ('pmi', 'npmi', 'llr')
+# default minimum scores for n-grams to count as phrases: 20x more frequent
+# than chance for PMI, and the chi-squared critical value at p = 0.001 for LLR
+DEFAULT_THRESHOLDS = {'pmi': 3.0, 'npmi': 0.5, 'llr': 10.83}
+
+
+class CountMinSketch(object):
+    """
+    Approximate counter of 64-bit hashes in fixed memory: ``depth`` rows of
+    ``width`` counters, each hash incrementing one counter per row. Estimated
+    counts are never too low, and are too high by at most ``e * total / width``
+    with probability ``1 - exp(-depth)``.
+
+    Args:
+        width (int): number of counters per row; rounded up to a power of 2
+        depth (int): number of rows
+        seed (int): seed for the rows' hash functions; sketches may only be
+            merged if created with the same width, depth, and seed
+    """
+
+    def __init__(self, width=2 ** 22, depth=4, seed=0):
+        self.n_bits = max(1, int(np.ceil(np.log2(width))))
+        self.width = 1 << self.n_bits
+        self.depth = depth
+        self.seed = seed
+        # odd multipliers for multiply-shift hashing, one per row
+        rng = np.random.RandomState(seed)
+        self._multipliers = (rng.randint(0, 2 ** 62, size=depth, dtype=np.int64).astype(np.uint64)
+                             * np.uint64(2) + np.uint64(1))
+        self.table = np.zeros((depth, self.width), dtype=np.uint32)
+        self.total = 0
+
+    def _columns(self, hashes, row):
+        return ((hashes * self._multipliers[row]) >> np.uint64(64 - self.n_bits)).astype(np.int64)
+
+    def add(self, hashes):
+        """Count one occurrence of each of ``hashes`` (a uint64 array)."""
+        hashes, counts = np.unique(hashes, return_counts=True)
+        for row in range(self.depth):
+            # distinct hashes may share a column, so sum their counts first
+            cols, idxs = np.unique(self._columns(hashes, row), return_inverse=True)
+            self.table[row, cols] += np.bincount(idxs.ravel(), weights=counts).astype(np.uint32)
+        self.total += int(counts.sum())
+
+    def query(self, hashes):
+        """
+        Get the estimated count of each of ``hashes`` (a uint64 array).
+
+        Returns:
+            ``np.ndarray``: int64 counts
+        """
+        counts = self.table[0, self._columns(hashes, 0)].astype(np.int64)
+        for row in range(1, self.depth):
+            np.minimum(counts, self.table[row, self._columns(hashes, row)], out=counts)
+        return counts
+
+    def merge(self, other):
+        """Add the counts of another, compatible sketch to this one, in place."""
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError('sketches must have the same width, depth, and seed to be merged')
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class PrunedCounter(object):
+    """
+    Exact counter of 64-bit hashes that, whenever it holds more than
+    ``max_size`` distinct hashes, drops those with the lowest counts until
+    it doesn't, with ties at the cutoff broken arbitrarily. Counts of hashes
+    that have been dropped restart from 0, so any count less than or equal to
+    :attr:`pruned_count` is unreliable.
+
+    Args:
+        max_size (int): maximum number of distinct hashes; if None, no limit
+        n_cols (int): number of uint64 values (e.g. an n-gram's token hashes)
+            stored along with each hash, if any
+
+    Attributes:
+        keys (``np.ndarray``): sorted uint64 hashes
+        counts (``np.ndarray``): int64 count of each hash
+        components (``np.ndarray``): uint64 values stored with each hash, with
+            shape (number of hashes, ``n_cols``), or None
+        pruned_count (int): highest count of any dropped hash
+    """
+
+    def __init__(self, max_size=None, n_cols=None):
+        self.max_size = max_size
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.components = np.zeros((0, n_cols), dtype=np.uint64) if n_cols else None
+        self.pruned_count = 0
+
+    def __len__(self):
+        return self.keys.shape[0]
+
+    def add(self, hashes, components=None):
+        """
+        Count one occurrence of each of ``hashes`` (a uint64 array), along
+        with the values stored with them, if any (a 2D uint64 array).
+        """
+        keys = np.concatenate((self.keys, hashes))
+        keys, first_idxs, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        weights = np.concatenate((self.counts, np.ones(hashes.shape[0], dtype=np.int64)))
+        self.counts = np.bincount(inverse.ravel(), weights=weights,
+                                  minlength=keys.shape[0]).astype(np.int64)
+        self.keys = keys
+        if self.components is not None:
+            self.components = np.concatenate((self.components, components))[first_idxs]
+        if self.max_size is not None and self.keys.shape[0] > self.max_size:
+            self.prune()
+
+    def prune(self):
+        """Drop the least frequent hashes, leaving at most ``max_size`` of them."""
+        n_drop = self.keys.shape[0] - self.max_size
+        # keep exactly max_size hashes, even where many are tied at the cutoff
+        # (e.g. the 1s after counting a batch), so as not to empty the counter
+        idxs = np.argpartition(self.counts, n_drop - 1)
+        threshold = int(self.counts[idxs[:n_drop]].max())
+        keep = np.sort(idxs[n_drop:])  # keys stay sorted
+        self.keys = self.keys[keep]
+        self.counts = self.counts[keep]
+        if self.components is not None:
+            self.components = self.components[keep]
+        self.pruned_count = max(self.pruned_count, threshold)
+
+    def query(self, hashes):
+        """
+        Get the count of each of ``hashes`` (a uint64 array), 0 if not counted.
+
+        Returns:
+            ``np.ndarray``: int64 counts
+        """
+        if self.keys.shape[0] == 0:
+            return np.zeros(hashes.shape[0], dtype=np.int64)
+        idxs = np.searchsorted(self.keys, hashes).clip(max=self.keys.shape[0] - 1)
+        return np.where(self.keys[idxs] == hashes, self.counts[idxs], 0)
+
+
+def doc_ngrams(doc, max_n=3, filter_nums=False, prefixes=False):
+    """
+    Get the lower-cased hashes of a doc's words and n-grams, with the same
+    filters as :func:`extract.ngrams() <infoextract.extract.ngrams>`: n-grams
+    may not contain punctuation, nor start or end with a stop word.
+
+    Args:
+        doc (``spacy.Doc``)
+        max_n (int): maximum number of tokens per n-gram
+        filter_nums (bool): if True, leave out words and n-grams containing
+            number-like tokens
+        prefixes (bool): if True, also get the hashes of the n-grams left out
+            only for ending with a stop word (e.g. "bank of"), which may be
+            the first n words of a longer n-gram
+
+    Returns:
+        Tuple[``np.ndarray``, List[Tuple[``np.ndarray``, ``np.ndarray``]]]:
+            uint64 hashes of all (non-punctuation) words, and for each n from 2
+            to ``max_n``, uint64 n-gram hashes and their tokens' hashes, with
+            shape (number of n-grams, n); if ``prefixes`` is True, followed by
+            a list of uint64 hashes of the stop-ended n-grams for each n from
+            2 to ``max_n - 1``
+    """
+    attrs = token_attrs(doc)
+    keys = doc.to_array(LOWER).astype(np.uint64)
+    words = keys[word_mask(attrs, filter_stops=False, filter_nums=filter_nums)]
+    ngrams = []
+    for n in range(2, max_n + 1):
+        starts = ngram_starts(attrs, n, filter_nums=filter_nums)
+        ngrams.append((ngram_hashes(keys, starts, n),
+                       keys[starts[:, None] + np.arange(n)]))
+    if prefixes is False:
+        return words, ngrams
+    stop_ended = []
+    for n in range(2, max_n):
+        starts = ngram_starts(attrs, n, filter_stops=False, filter_nums=filter_nums)
+        starts = starts[~attrs.is_stop[starts] & attrs.is_stop[starts + n - 1]]
+        stop_ended.append(ngram_hashes(keys, starts, n))
+    return words, ngrams, stop_ended
+
+
+class Phrases(object):
+    """
+    Learn phrases -- n-grams whose words occur together more often than
+    expected by chance -- from the word and n-gram counts of a stream of docs.
+
+    Args:
+        max_n (int): maximum number of words per phrase, at least 2
+        scoring (str): association measure between an n-gram's words; one of
+            'pmi': pointwise mutual information, ``log(p(abc) / (p(a) p(b) p(c)))``
+            'npmi': PMI normalized by ``-(n - 1) log(p(abc))`` into [-1, 1]
+            'llr': Dunning's log-likelihood ratio between an n-gram's first
+                n - 1 words and its last word; the first n - 1 words are
+                counted even where they end with a stop word
+        threshold (float): minimum score of a phrase; if None, a default for
+            ``scoring`` is used (see :data:`DEFAULT_THRESHOLDS`)
+        min_count (int): minimum number of occurrences of a phrase
+        counter (str): how n-grams are counted in bounded memory; one of
+            'pruned': exactly, but dropping the least frequent n-grams whenever
+                there are more than ``max_size`` of any length
+            'sketch': approximately, in a :class:`CountMinSketch` per length,
+                keeping only n-grams estimated to occur ``min_count`` times
+        max_size (int): maximum number of distinct words and of n-grams of each
+            length held at once; for 'sketch', of words and of candidate
+            n-grams of each length
+        sketch_width (int), sketch_depth (int): see :class:`CountMinSketch`
+        filter_nums (bool): see :func:`doc_ngrams()`
+        buffer_size (int): number of n-gram occurrences buffered before being counted
+
+    Example::
+
+        phrases = Phrases(scoring='npmi', counter='sketch')
+        phrases.add_docs(docs)
+        phrase_table = phrases.phrase_table()
+        phrase_table.find(new_doc)
+    """
+
+    def __init__(self, max_n=3, scoring='npmi', threshold=None, min_count=5,
+                 counter='pruned', max_size=10 ** 7,
+                 sketch_width=2 ** 22, sketch_depth=4,
+                 filter_nums=False, buffer_size=2 ** 20):
+        if max_n < 2:
+            raise ValueError('max_n must be greater than or equal to 2')
+        if scoring not in SCORINGS:
+            msg = 'invalid `scoring` value: "{}"; valid values are {}'.format(scoring, SCORINGS)
+            raise ValueError(msg)
+        if counter not in ('pruned', 'sketch'):
+            msg = 'invalid `counter` value: "{}"; valid values are {}'.format(
+                counter, {'pruned', 'sketch'})
+            raise ValueError(msg)
+        self.max_n = max_n
+        self.scoring = scoring
+        self.threshold = DEFAULT_THRESHOLDS[scoring] if threshold is None else threshold
+        self.min_count = min_count
+        self.counter = counter
+        self.filter_nums = filter_nums
+        self.buffer_size = buffer_size
+        self.n_words = 0
+        self.word_counts = PrunedCounter(max_size=max_size)
+        if counter == 'pruned':
+            self.ngram_counts = {n: PrunedCounter(max_size=max_size, n_cols=n)
+                                 for n in range(2, max_n + 1)}
+        else:
+            self.ngram_counts = {n: CountMinSketch(width=sketch_width, depth=sketch_depth)
+                                 for n in range(2, max_n + 1)}
+            # n-grams whose estimated count has reached min_count, counted
+            # from then on, so that the most frequent survive pruning
+            self.candidates = {n: PrunedCounter(max_size=max_size, n_cols=n)
+                               for n in range(2, max_n + 1)}
+        # LLR needs the counts of all n-grams' first n - 1 words, including
+        # those that end with a stop word and so aren't counted as n-grams
+        self.prefix_counts = {}
+        if scoring == 'llr':
+            self.prefix_counts = {n: (PrunedCounter(max_size=max_size) if counter == 'pruned'
+                                      else CountMinSketch(width=sketch_width, depth=sketch_depth))
+                                  for n in range(2, max_n)}
+        self._buffer = []
+        self._buffer_len = 0
+
+    def add_doc(self, doc):
+        """Count the words and n-grams of a spacy-parsed ``doc``."""
+        self.add_ngrams(*doc_ngrams(doc, max_n=self.max_n, filter_nums=self.filter_nums,
+                                    prefixes=bool(self.prefix_counts)))
+
+    def add_docs(self, docs):
+        """
+        Count the words and n-grams of each of a stream of spacy-parsed docs.
+
+        Returns:
+            :class:`Phrases`: self
+        """
+        for doc in docs:
+            self.add_doc(doc)
+        self._flush()
+        return self
+
+    def add_ngrams(self, words, ngrams, prefixes=None):
+        """
+        Count words and n-grams as returned by :func:`doc_ngrams()`, e.g.
+        by worker processes (see :func:`learn_phrases()`); for 'llr' scoring,
+        ``prefixes`` should be given as well.
+        """
+        self._buffer.append((words, ngrams, prefixes))
+        self._buffer_len += words.shape[0]
+        if self._buffer_len >= self.buffer_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        words = np.concatenate([words for words, _, _ in self._buffer])
+        self.word_counts.add(words)
+        self.n_words += words.shape[0]
+        for i, n in enumerate(range(2, self.max_n + 1)):
+            hashes = np.concatenate([ngrams[i][0] for _, ngrams, _ in self._buffer])
+            components = np.concatenate([ngrams[i][1] for _, ngrams, _ in self._buffer])
+            if self.counter == 'pruned':
+                self.ngram_counts[n].add(hashes, components)
+            else:
+                self.ngram_counts[n].add(hashes)
+                keys, inverse = np.unique(hashes, return_inverse=True)
+                is_frequent = (self.ngram_counts[n].query(keys) >= self.min_count)[inverse.ravel()]
+                self.candidates[n].add(hashes[is_frequent], components[is_frequent])
+        for i, (n, counter) in enumerate(sorted(self.prefix_counts.items())):
+            counter.add(np.concatenate([prefixes[i] for _, _, prefixes in self._buffer
+                                        if prefixes is not None] or [np.zeros(0, dtype=np.uint64)]))
+        self._buffer = []
+        self._buffer_len = 0
+
+    def _counts(self, n, hashes):
+        if n == 1:
+            return self.word_counts.query(hashes)
+        return self.ngram_counts[n].query(hashes)
+
+    def score(self, n, components, counts):
+        """
+        Score n-grams of length ``n`` by the association between their words.
+
+        Args:
+            n (int)
+            components (``np.ndarray``): uint64 hashes of the n-grams' words,
+                with shape (number of n-grams, n)
+            counts (``np.ndarray``): number of occurrences of each n-gram
+
+        Returns:
+            ``np.ndarray``: float64 scores, NaN where a word's count is unknown
+        """
+        total = float(max(self.n_words, 1))
+        counts = counts.astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.scoring in ('pmi', 'npmi'):
+                word_counts = self._counts(1, components.ravel()).reshape(components.shape)
+                log_word_counts = np.where(word_counts > 0, np.log(word_counts), np.nan)
+                scores = np.log(counts) + (n - 1) * np.log(total) - log_word_counts.sum(axis=1)
+                if self.scoring == 'npmi':
+                    # PMI is at most this when the words only ever occur together
+                    scores /= -(n - 1) * np.log(counts / total)
+            else:
+                prefix_hashes = components[:, 0].copy()
+                for k in range(1, n - 1):
+                    prefix_hashes *= _NGRAM_HASH_PRIME
+                    prefix_hashes ^= components[:, k]
+                prefix_counts = self._counts(n - 1, prefix_hashes).astype(np.float64)
+                if n - 1 in self.prefix_counts:
+                    prefix_counts += self.prefix_counts[n - 1].query(prefix_hashes)
+                last_counts = self._counts(1, components[:, -1]).astype(np.float64)
+                scores = _log_likelihood_ratio(counts, prefix_counts, last_counts, total)
+                scores[(prefix_counts == 0) | (last_counts == 0)] = np.nan
+        return scores
+
+    def phrase_table(self):
+        """
+        Score all sufficiently frequent n-grams counted so far, and keep
+        those scoring at least ``threshold`` as phrases.
+
+        Returns:
+            :class:`PhraseTable`
+        """
+        self._flush()
+        keys, ns, scores, components = [], [], [], []
+        for n in range(2, self.max_n + 1):
+            counted = self.ngram_counts[n] if self.counter == 'pruned' else self.candidates[n]
+            counts = self._counts(n, counted.keys)
+            is_frequent = counts >= self.min_count
+            n_scores = self.score(n, counted.components[is_frequent], counts[is_frequent])
+            is_phrase = n_scores >= self.threshold  # NaN scores never are
+            keys.append(counted.keys[is_frequent][is_phrase])
+            ns.append(np.full(int(is_phrase.sum()), n, dtype=np.int64))
+            scores.append(n_scores[is_phrase])
+            padded = np.zeros((keys[-1].shape[0], self.max_n), dtype=np.uint64)
+            padded[:, :n] = counted.components[is_frequent][is_phrase]
+            components.append(padded)
+        return PhraseTable(np.concatenate(keys), np.concatenate(ns),
+                           np.concatenate(scores), np.concatenate(components))
+
+
+def _log_likelihood_ratio(counts_ab, counts_a, counts_b, total):
+    """
+    Dunning's log-likelihood ratio (G-squared) of the 2x2 contingency table
+    of co-occurrences of a and b, vectorized over (a, b) pairs.
+    """
+    observed = [counts_ab,
+                counts_a - counts_ab,
+                counts_b - counts_ab,
+                total - counts_a - counts_b + counts_ab]
+    expected = [counts_a * counts_b / total,
+                counts_a * (total - counts_b) / total,
+                (total - counts_a) * counts_b / total,
+                (total - counts_a) * (total - counts_b) / total]
+    g2 = np.zeros(counts_ab.shape[0], dtype=np.float64)
+    for obs, exp in zip(observed, expected):
+        g2 += np.where(obs > 0, obs * np.log(np.maximum(obs, 1e-300) / exp), 0.0)
+    return 2.0 * g2
+
+
+class PhraseTable(object):
+    """
+    Table of learned phrases, as lower-cased n-gram hashes, which can be found
+    in new docs in a single vectorized pass over their tokens.
+
+    Args:
+        keys (``np.ndarray``): uint64 n-gram hashes of the phrases
+        ns (``np.ndarray``): number of words in each phrase
+        scores (``np.ndarray``): float score of each phrase
+        components (``np.ndarray``): uint64 hashes of each phrase's words, with
+            shape (number of phrases, maximum number of words), padded with 0s
+    """
+
+    def __init__(self, keys, ns, scores, components):
+        self.keys = keys
+        self.ns = ns
+        self.scores = scores
+        self.components = components
+        self._keys_by_n = {int(n): np.sort(keys[ns == n]) for n in np.unique(ns)}
+
+    def __len__(self):
+        return self.keys.shape[0]
+
+    def find(self, doc, as_='spans'):
+        """
+        Find the phrases in a spacy-parsed doc; where phrases overlap, the
+        leftmost one is kept, and of those starting at the same token, the
+        longest (i.e. leftmost-longest matching, so a longer phrase starting
+        later loses to a shorter one starting earlier).
+
+        Args:
+            doc (``spacy.Doc``)
+            as_ (str): form of the output; one of
+                'spans': a list of ``spacy.Span`` s
+                'offsets': an integer array of (start, end) token indexes, with
+                    shape (number of phrases, 2)
+
+        Returns:
+            List[``spacy.Span``] or ``np.ndarray``: phrases in order of
+                appearance in the document
+        """
+        if as_ not in ('spans', 'offsets'):
+            msg = 'invalid `as_` value: "{}"; valid values are {}'.format(
+                as_, {'spans', 'offsets'})
+            raise ValueError(msg)
+        keys = doc.to_array(LOWER).astype(np.uint64)
+        starts, ends = [], []
+        for n, phrase_keys in self._keys_by_n.items():
+            n_starts = np.arange(max(keys.shape[0] - n + 1, 0))
+            hashes = ngram_hashes(keys, n_starts, n)
+            idxs = np.searchsorted(phrase_keys, hashes).clip(max=phrase_keys.shape[0] - 1)
+            n_starts = n_starts[phrase_keys[idxs] == hashes]
+            starts.append(n_starts)
+            ends.append(n_starts + n)
+        starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+        ends = np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)
+        # matches are few, so resolving overlaps in Python is cheap
+        offsets = []
+        last_end = 0
+        for start, end in zip(*[arr.tolist() for arr in _sort_matches(starts, ends)]):
+            if start >= last_end:
+                offsets.append((start, end))
+                last_end = end
+        if as_ == 'spans':
+            return [doc[start: end] for start, end in offsets]
+        return np.array(offsets, dtype=np.int64).reshape(-1, 2)
+
+    def get_strings(self, strings):
+        """
+        Get the (lower-cased) text of each phrase, in order.
+
+        Args:
+            strings (``spacy.strings.StringStore``): e.g. ``nlp.vocab.strings``
+
+        Returns:
+            List[str]
+        """
+        return [' '.join(strings[key] for key in row[:n])
+                for row, n in zip(self.components.tolist(), self.ns.tolist())]
+
+    def to_disk(self, dirpath):
+        """
+        Save the table's arrays as ``.npy`` files in directory ``dirpath``.
+
+        Args:
+            dirpath (str): /path/to/dir on disk, created if needed
+        """
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        np.save(os.path.join(dirpath, 'keys.npy'), self.keys)
+        np.save(os.path.join(dirpath, 'ns.npy'), self.ns)
+        np.save(os.path.join(dirpath, 'scores.npy'), self.scores)
+        np.save(os.path.join(dirpath, 'components.npy'), self.components)
+
+    @classmethod
+    def from_disk(cls, dirpath, mmap_mode=None):
+        """
+        Load a table saved by :meth:`to_disk()`.
+
+        Returns:
+            :class:`PhraseTable`
+        """
+        return cls(*[np.load(os.path.join(dirpath, name + '.npy'), mmap_mode=mmap_mode)
+                     for name in ('keys', 'ns', 'scores', 'components')])
+
+
+def _sort_matches(starts, ends):
+    # by start, then longest first, for greedy leftmost-longest selection
+    order = np.lexsort((-ends, starts))
+    return starts[order], ends[order]
+
+
+def _doc_ngrams_batch(texts, max_n, filter_nums, prefixes, nlp=None):
+    nlp = nlp or pipeline._NLP
+    return [doc_ngrams(doc, max_n=max_n, filter_nums=filter_nums, prefixes=prefixes)
+            for doc in nlp.pipe(texts, batch_size=len(texts))]
+
+
+def learn_phrases(texts,
+                  lang,
+                  phrases=None,
+                  batch_size=1000,
+                  n_process=None,
+                  max_in_flight=None,
+                  disable=()):
+    """
+    Count words and n-grams in a stream of texts, in a single pass with
+    multiple worker processes that send back only arrays of hashes, and
+    learn phrases from them.
+
+    Args:
+        texts (Iterable[str]): stream of texts, consumed lazily
+        lang (str or ``spacy.Language``): name of or path to a spaCy pipeline;
+            see :func:`extract_corpus() <infoextract.pipeline.extract_corpus>`
+        phrases (:class:`Phrases`): phrase learner to which counts are added;
+            if None, one with default settings is created
+        batch_size (int): number of texts sent to a worker at a time
+        n_process (int): number of worker processes; if None, use all available
+            CPUs; if 1, everything runs in the current process
+        max_in_flight (int): maximum number of batches being processed or
+            waiting to be counted at any given time
+        disable (Iterable[str]): names of pipeline components to disable;
+            phrases need only a tokenizer (and attribute ruler for stop words)
+
+    Returns:
+        :class:`Phrases`: with all counts added; call its
+            :meth:`phrase_table() <Phrases.phrase_table>` for the phrases
+    """
+    phrases = phrases if phrases is not None else Phrases()
+    batches = (list(batch) for batch in partition_all(batch_size, texts))
+    func = partial(_doc_ngrams_batch, max_n=phrases.max_n, filter_nums=phrases.filter_nums,
+                   prefixes=bool(phrases.prefix_counts))
+    if n_process == 1:
+        nlp = spacy.load(lang, disable=disable) if isinstance(lang, compat.string_types) else lang
+        results = (func(batch, nlp=nlp) for batch in batches)
+    else:
+        if not isinstance(lang, compat.string_types):
+            raise TypeError('`lang` must be a str if `n_process` is not 1')
+        futures = bounded_imap(func, batches,
+                               n_workers=n_process, use_processes=True,
+                               max_in_flight=max_in_flight,
+                               initializer=pipeline._init_worker,
+                               initargs=(lang, list(disable)))
+        results = (future.result() for _, future in futures)
+    for batch_results in results:
+        for result in batch_results:
+            phrases.add_ngrams(*result)
+    phrases._flush()
+    return phrases
@@ -0,0 +1,198 @@
+"""
+Module for extracting key terms from spacy-parsed docs with graph-based ranking
+algorithms (TextRank and SingleRank): candidate words are the nodes of a word
+co-occurrence graph, built as a ``scipy.sparse`` matrix and ranked by
+vectorized PageRank; top-ranked words that are adjacent in the text are then
+merged into keyphrases.
+"""
+import numpy as np
+from scipy.sparse import coo_matrix
+from spacy.attrs import LEMMA, LOWER, ORTH
+
+from infoextract.vectorized import token_attrs, word_mask
+from summarize.graph import pagerank
+
+NORMALIZE_ATTRS = {'lemma': LEMMA, 'lower': LOWER, None: ORTH}
+
+
+def textrank(doc, normalize='lemma', n_keyterms=10, **kwargs):
+    """
+    Convenience function for extracting key terms from a doc using the
+    TextRank algorithm: binary edges between words co-occurring in a window of 2.
+
+    .. seealso:: :func:`key_terms_from_semantic_network()`
+    """
+    return key_terms_from_semantic_network(
+        doc, normalize=normalize, window_width=2, edge_weighting='binary',
+        n_keyterms=n_keyterms, **kwargs)
+
+
+def singlerank(doc, normalize='lemma', n_keyterms=10, **kwargs):
+    """
+    Convenience function for extracting key terms from a doc using the
+    SingleRank algorithm: edges between words co-occurring in a window of 10,
+    weighted by their number of co-occurrences.
+
+    .. seealso:: :func:`key_terms_from_semantic_network()`
+    """
+    return key_terms_from_semantic_network(
+        doc, normalize=normalize, window_width=10, edge_weighting='count',
+        n_keyterms=n_keyterms, **kwargs)
+
+
+def key_terms_from_semantic_network(doc,
+                                    normalize='lemma',
+                                    window_width=2,
+                                    edge_weighting='binary',
+                                    n_keyterms=10,
+                                    join_key_words=True,
+                                    include_pos=('NOUN', 'PROPN', 'ADJ'),
+                                    damping=0.85,
+                                    max_iter=100,
+                                    tol=1e-6):
+    """
+    Extract key terms from a spacy-parsed doc by ranking the nodes of a word
+    co-occurrence network.
+
+    Args:
+        doc (``spacy.Doc``)
+        normalize (str): how words are normalized into graph nodes; one of
+            {'lemma', 'lower', None}, the latter meaning as-is
+        window_width (int): words co-occur if they're within this many positions
+            of each other in the sequence of candidate words
+        edge_weighting (str): 'binary' (all edges have weight 1) or 'count'
+            (edges are weighted by number of co-occurrences)
+        n_keyterms (int or float): number of key terms to return; if a float
+            between 0 and 1, the fraction of the number of candidate words
+        join_key_words (bool): if True, top-ranked words that are adjacent in
+            ``doc`` are merged into keyphrases, scored by the sum of their
+            words' scores
+        include_pos (str or Set[str]): candidate words must have one of these
+            part-of-speech tags; stop words, punctuation, and numbers are
+            never candidates (see :func:`extract.words() <infoextract.extract.words>`)
+        damping, max_iter, tol: see :func:`pagerank() <summarize.graph.pagerank>`
+
+    Returns:
+        List[Tuple[str, float]]: top ``n_keyterms`` terms and their scores,
+            sorted by score in descending order
+    """
+    return key_terms_batch([doc], normalize=normalize, window_width=window_width,
+                           edge_weighting=edge_weighting, n_keyterms=n_keyterms,
+                           join_key_words=join_key_words, include_pos=include_pos,
+                           damping=damping, max_iter=max_iter, tol=tol)[0]
+
+
+def key_terms_batch(docs,
+                    normalize='lemma',
+                    window_width=2,
+                    edge_weighting='binary',
+                    n_keyterms=10,
+                    join_key_words=True,
+                    include_pos=('NOUN', 'PROPN', 'ADJ'),
+                    damping=0.85,
+                    max_iter=100,
+                    tol=1e-6):
+    """
+    Extract key terms from many spacy-parsed docs at once, as in
+    :func:`key_terms_from_semantic_network()`, but with all docs' networks
+    stacked into one block-diagonal sparse matrix and ranked together by a
+    single power iteration.
+
+    Args:
+        docs (Sequence[``spacy.Doc``])
+        (all others): see :func:`key_terms_from_semantic_network()`
+
+    Returns:
+        List[List[Tuple[str, float]]]: top key terms of each doc, in the same
+            order as ``docs``
+    """
+    if normalize not in NORMALIZE_ATTRS:
+        msg = 'invalid `normalize` value: "{}"; valid values are {}'.format(
+            normalize, set(NORMALIZE_ATTRS.keys()))
+        raise ValueError(msg)
+    if edge_weighting not in ('binary', 'count'):
+        msg = 'invalid `edge_weighting` value: "{}"; valid values are {}'.format(
+            edge_weighting, {'binary', 'count'})
+        raise ValueError(msg)
+    if window_width < 2:
+        raise ValueError('window_width must be greater than or equal to 2')
+
+    graphs = [_word_graph(doc, NORMALIZE_ATTRS[normalize], window_width, include_pos)
+              for doc in docs]
+    # stack all docs' graphs into one block-diagonal adjacency matrix
+    block_sizes = [graph['n_nodes'] for graph in graphs]
+    node_offsets = np.concatenate(([0], np.cumsum(block_sizes)))
+    n_nodes = int(node_offsets[-1])
+    rows = np.concatenate([graph['rows'] + offset
+                           for graph, offset in zip(graphs, node_offsets)] or [np.zeros(0, dtype=np.int64)])
+    cols = np.concatenate([graph['cols'] + offset
+                           for graph, offset in zip(graphs, node_offsets)] or [np.zeros(0, dtype=np.int64)])
+    adjacency = coo_matrix((np.ones(rows.shape[0], dtype=np.float64), (rows, cols)),
+                           shape=(n_nodes, n_nodes)).tocsr()  # sums duplicate edges
+    if edge_weighting == 'binary':
+        adjacency.data[:] = 1.0
+    scores = pagerank(adjacency, damping=damping, max_iter=max_iter, tol=tol,
+                      block_sizes=block_sizes)
+
+    return [_top_key_terms(doc, graph, scores[start: stop], n_keyterms, join_key_words)
+            for doc, graph, start, stop in zip(docs, graphs, node_offsets[:-1], node_offsets[1:])]
+
+
+def _word_graph(doc, attr, window_width, include_pos):
+    """
+    Get the candidate words of ``doc``, their node ids (one per distinct
+    normalized word), and the (symmetric) co-occurrence edges between nodes.
+    """
+    positions = np.flatnonzero(word_mask(token_attrs(doc), filter_stops=True, filter_punct=True,
+                                         filter_nums=True, include_pos=include_pos))
+    keys = doc.to_array(attr)[positions] if positions.shape[0] else np.zeros(0, dtype=np.uint64)
+    unique_keys, nodes = np.unique(keys, return_inverse=True)
+    nodes = nodes.ravel()
+    rows = [nodes[:-k] for k in range(1, window_width) if k < nodes.shape[0]]
+    cols = [nodes[k:] for k in range(1, window_width) if k < nodes.shape[0]]
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    no_self_loops = rows != cols
+    rows, cols = rows[no_self_loops], cols[no_self_loops]
+    return {'positions': positions,
+            'nodes': nodes,
+            'keys': unique_keys,
+            'n_nodes': unique_keys.shape[0],
+            'rows': np.concatenate((rows, cols)),
+            'cols': np.concatenate((cols, rows))}
+
+
+def _top_key_terms(doc, graph, scores, n_keyterms, join_key_words):
+    n_nodes = graph['n_nodes']
+    if n_nodes == 0:
+        return []
+    if isinstance(n_keyterms, float):
+        if not 0.0 < n_keyterms <= 1.0:
+            msg = 'n_keyterms={} is invalid; must be an int or a float between 0.0 and 1.0'.format(
+                n_keyterms)
+            raise ValueError(msg)
+        n_keyterms = int(round(n_nodes * n_keyterms))
+    top_nodes = np.argsort(-scores, kind='mergesort')[:min(n_keyterms, n_nodes)]
+    # node keys are (lemma, lower, or orth) hashes of words, so resolve them
+    # through the doc's string store rather than going through its tokens
+    strings = doc.vocab.strings
+    if join_key_words is False:
+        return [(strings[int(key)], float(score))
+                for key, score in zip(graph['keys'][top_nodes].tolist(),
+                                      scores[top_nodes].tolist())]
+
+    # merge runs of top-ranked words that are adjacent in the doc into keyphrases
+    positions, nodes = graph['positions'], graph['nodes']
+    is_top = np.zeros(n_nodes, dtype=bool)
+    is_top[top_nodes] = True
+    top_positions = positions[is_top[nodes]]
+    top_position_nodes = nodes[is_top[nodes]]
+    run_starts = np.flatnonzero(np.diff(top_positions, prepend=-2) != 1)
+    run_scores = np.add.reduceat(scores[top_position_nodes], run_starts)
+    node_texts = {node: strings[int(key)]
+                  for node, key in zip(top_nodes.tolist(), graph['keys'][top_nodes].tolist())}
+    keyterms = {}
+    for run_nodes, score in zip(np.split(top_position_nodes, run_starts[1:]), run_scores.tolist()):
+        term = ' '.join(node_texts[node] for node in run_nodes.tolist())
+        keyterms[term] = max(score, keyterms.get(term, 0.0))
+    return sorted(keyterms.items(), key=lambda x: x[1], reverse=True)[:n_keyterms]
@@ -0,0 +1,318 @@
+"""
+Module for extracting key terms from spacy-parsed docs by TF-IDF, with
+document frequencies counted once over a corpus and persisted as an IDF table:
+an open-addressing hash table of 64-bit spaCy ``StringStore`` hashes stored in
+NumPy arrays, which can be memory-mapped and queried in O(1) per term.
+"""
+from functools import partial
+import json
+import os
+
+from cytoolz.itertoolz import partition_all
+import numpy as np
+import spacy
+
+from infoextract import extract, pipeline
+from utils import compat
+from utils.hashtable import n_table_slots
+from utils.parallel import bounded_imap
+from vsm.vectorizer import term_hashes
+from vsm.vocabulary import Vocabulary
+
+
+class IdfTable(object):
+    """
+    Table of the (smoothed) inverse document frequencies of terms, each
+    identified by the 64-bit ``StringStore`` hash of its lower-cased text,
+    i.e. ``log((1 + n_docs) / (1 + df)) + 1``. Terms not in the table get the
+    IDF of a term that occurs in no docs.
+
+    Hashes are stored in an open-addressing (linear probing) hash table backed
+    by two parallel arrays, so a lookup is a few array reads regardless of the
+    number of terms, and a table saved by :meth:`to_disk()` can be memory-mapped
+    and shared across processes without being loaded into memory.
+
+    Args:
+        keys (``np.ndarray``): uint64 hash table slots, with 0 marking empty slots;
+            the number of slots must be a power of 2
+        idf (``np.ndarray``): float32 IDF of the term in each slot
+        n_docs (int): number of docs from which document frequencies were counted
+
+    Example::
+
+        texts = (record['text'] for record in read_json_lines('corpus.jsonl'))
+        build_idf_table(texts, 'en_core_web_sm').to_disk('idf')
+        ...
+        idf_table = IdfTable.from_disk('idf', mmap_mode='r')
+        key_terms_tfidf(doc, idf_table)
+    """
+
+    def __init__(self, keys, idf, n_docs):
+        self.keys = keys
+        self.idf = idf
+        self.n_docs = n_docs
+        self.default_idf = float(np.log(1.0 + n_docs) + 1.0)
+        self._mask = np.uint64(keys.shape[0] - 1)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.keys))
+
+    @classmethod
+    def from_doc_freqs(cls, keys, doc_freqs, n_docs, load_factor=0.5):
+        """
+        Build an IDF table from terms' document frequencies.
+
+        Args:
+            keys (``np.ndarray``): unique uint64 term hashes
+            doc_freqs (``np.ndarray``): number of docs in which each term occurs
+            n_docs (int): total number of docs
+            load_factor (float): maximum fraction of hash table slots in use,
+                greater than 0.0 and less than 1.0; lower values mean shorter
+                probe sequences but more memory
+
+        Returns:
+            :class:`IdfTable`
+
+        Raises:
+            ValueError: if ``load_factor`` is not between 0.0 and 1.0, exclusive
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        idf = (np.log((1.0 + n_docs) / (1.0 + np.asarray(doc_freqs))) + 1.0).astype(np.float32)
+        n_slots = n_table_slots(keys.shape[0], load_factor)
+        table_keys = np.zeros(n_slots, dtype=np.uint64)
+        table_idf = np.zeros(n_slots, dtype=np.float32)
+        mask = np.uint64(n_slots - 1)
+        slots = (keys & mask).astype(np.int64)
+        # insert all keys at once, one probe step per iteration: among keys
+        # wanting the same empty slot, the first one gets it, the rest move on
+        pending = np.flatnonzero(keys != 0)  # 0 marks empty slots, so can't be stored
+        while pending.shape[0]:
+            is_free = table_keys[slots[pending]] == 0
+            free_slots, first = np.unique(slots[pending[is_free]], return_index=True)
+            winners = pending[is_free][first]
+            table_keys[free_slots] = keys[winners]
+            table_idf[free_slots] = idf[winners]
+            is_winner = np.zeros(keys.shape[0], dtype=bool)
+            is_winner[winners] = True
+            pending = pending[~is_winner[pending]]
+            slots[pending] = (slots[pending] + 1) & (n_slots - 1)
+        return cls(table_keys, table_idf, n_docs)
+
+    @classmethod
+    def from_vocabulary(cls, vocab, load_factor=0.5):
+        """
+        Build an IDF table from a :class:`Vocabulary <vsm.vocabulary.Vocabulary>`'s
+        document frequencies; its terms should have been lower-cased.
+
+        Returns:
+            :class:`IdfTable`
+        """
+        vocab._flush()
+        return cls.from_doc_freqs(vocab.keys, vocab.doc_freqs, vocab.n_docs,
+                                  load_factor=load_factor)
+
+    def lookup(self, terms):
+        """
+        Get the IDF of each of ``terms``, vectorized over terms.
+
+        Args:
+            terms (Iterable[``spacy.Token`` or ``spacy.Span`` or str or int]):
+                see :func:`term_hashes() <vsm.vectorizer.term_hashes>`; ints
+                must be hashes of lower-cased text
+
+        Returns:
+            ``np.ndarray``: float64 IDF per term
+        """
+        hashes = term_hashes(terms, lowercase=True)
+        idf = np.full(hashes.shape[0], self.default_idf, dtype=np.float64)
+        slots = (hashes & self._mask).astype(np.int64)
+        pending = np.arange(hashes.shape[0])
+        while pending.shape[0]:
+            slot_keys = self.keys[slots[pending]]
+            is_found = (slot_keys == hashes[pending]) & (slot_keys != 0)
+            idf[pending[is_found]] = self.idf[slots[pending[is_found]]]
+            # probing stops at the term's slot or at the first empty slot
+            pending = pending[~is_found & (slot_keys != 0)]
+            slots[pending] = (slots[pending] + 1) & (self.keys.shape[0] - 1)
+        return idf
+
+    def to_disk(self, dirpath):
+        """
+        Save the table's arrays as ``.npy`` files in directory ``dirpath``,
+        which can later be memory-mapped by :meth:`from_disk()`.
+
+        Args:
+            dirpath (str): /path/to/dir on disk, created if needed
+        """
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        np.save(os.path.join(dirpath, 'keys.npy'), self.keys)
+        np.save(os.path.join(dirpath, 'idf.npy'), self.idf)
+        with open(os.path.join(dirpath, 'meta.json'), mode='wt') as f:
+            json.dump({'n_docs': self.n_docs}, f)
+
+    @classmethod
+    def from_disk(cls, dirpath, mmap_mode='r'):
+        """
+        Load a table saved by :meth:`to_disk()`.
+
+        Args:
+            dirpath (str): /path/to/dir on disk
+            mmap_mode (str): if not None, memory-map the arrays with this mode
+                (see ``numpy.load``); with 'r', only the slots actually probed
+                are ever read from disk
+
+        Returns:
+            :class:`IdfTable`
+        """
+        with open(os.path.join(dirpath, 'meta.json'), mode='rt') as f:
+            meta = json.load(f)
+        return cls(np.load(os.path.join(dirpath, 'keys.npy'), mmap_mode=mmap_mode),
+                   np.load(os.path.join(dirpath, 'idf.npy'), mmap_mode=mmap_mode),
+                   meta['n_docs'])
+
+
+def candidate_terms(doc, ngrams=(1, 2, 3), noun_chunks=True, named_entities=True):
+    """
+    Get the candidate key terms of a spacy-parsed doc: n-grams, noun chunks,
+    and named entities, with their functions' default filters (see
+    :mod:`infoextract.extract`). A span found by more than one of these
+    (e.g. "New York" as both a bigram and an entity) is only included once,
+    so that its term frequency isn't inflated.
+
+    Args:
+        doc (``spacy.Doc``)
+        ngrams (Iterable[int]): numbers of tokens per n-gram
+        noun_chunks (bool): if True, include noun chunks
+        named_entities (bool): if True, include named entities
+
+    Returns:
+        List[``spacy.Span``]: candidates, with each span of tokens included
+            once, though the same term may occur at several places in ``doc``
+    """
+    candidates = [span for n in ngrams for span in extract.ngrams(doc, n)]
+    if noun_chunks is True:
+        candidates.extend(extract.noun_chunks(doc))
+    if named_entities is True:
+        candidates.extend(extract.named_entities(doc))
+    seen = set()
+    unique = []
+    for span in candidates:
+        if (span.start, span.end) not in seen:
+            seen.add((span.start, span.end))
+            unique.append(span)
+    return unique
+
+
+def _candidate_hashes_batch(texts, candidates, nlp=None):
+    nlp = nlp or pipeline._NLP
+    return [term_hashes(candidate_terms(doc, **candidates), lowercase=True)
+            for doc in nlp.pipe(texts, batch_size=len(texts))]
+
+
+def build_idf_table(texts,
+                    lang,
+                    ngrams=(1, 2, 3),
+                    noun_chunks=True,
+                    named_entities=True,
+                    min_df=1,
+                    max_df=1.0,
+                    load_factor=0.5,
+                    batch_size=1000,
+                    n_process=None,
+                    max_in_flight=None,
+                    disable=()):
+    """
+    Count the document frequencies of candidate terms in a single streaming
+    pass over a corpus, and turn them into an :class:`IdfTable`. Worker
+    processes parse and extract candidates from batches of texts, sending back
+    only arrays of term hashes.
+
+    Args:
+        texts (Iterable[str]): stream of texts, e.g. the 'text' field of each
+            record of a JSONL file read by
+            :func:`read_json_lines() <inputoutput.read.read_json_lines>`
+        lang (str or ``spacy.Language``): name of or path to a spaCy pipeline;
+            see :func:`extract_corpus() <infoextract.pipeline.extract_corpus>`
+        ngrams, noun_chunks, named_entities: candidate terms to count;
+            see :func:`candidate_terms()`
+        min_df (int or float): leave out terms occurring in fewer than this
+            many docs, or fraction of docs if a float
+        max_df (int or float): leave out terms occurring in more than this
+            many docs, or fraction of docs if a float
+        load_factor (float): see :meth:`IdfTable.from_doc_freqs()`
+        batch_size (int): number of texts sent to a worker at a time
+        n_process (int): number of worker processes; if None, use all available
+            CPUs; if 1, everything runs in the current process
+        max_in_flight (int): maximum number of batches being processed or
+            waiting to be counted at any given time
+        disable (Iterable[str]): names of pipeline components to disable
+
+    Returns:
+        :class:`IdfTable`
+    """
+    candidates = {'ngrams': tuple(ngrams), 'noun_chunks': noun_chunks,
+                  'named_entities': named_entities}
+    batches = (list(batch) for batch in partition_all(batch_size, texts))
+    if n_process == 1:
+        nlp = spacy.load(lang, disable=disable) if isinstance(lang, compat.string_types) else lang
+        results = (_candidate_hashes_batch(batch, candidates, nlp=nlp) for batch in batches)
+    else:
+        if not isinstance(lang, compat.string_types):
+            raise TypeError('`lang` must be a str if `n_process` is not 1')
+        futures = bounded_imap(partial(_candidate_hashes_batch, candidates=candidates),
+                               batches,
+                               n_workers=n_process, use_processes=True,
+                               max_in_flight=max_in_flight,
+                               initializer=pipeline._init_worker,
+                               initargs=(lang, list(disable)))
+        results = (future.result() for _, future in futures)
+
+    vocab = Vocabulary(lowercase=True)
+    for batch_hashes in results:
+        for hashes in batch_hashes:
+            vocab.add_doc(hashes)
+    vocab.prune(min_df=min_df, max_df=max_df)
+    return IdfTable.from_vocabulary(vocab, load_factor=load_factor)
+
+
+def key_terms_tfidf(doc,
+                    idf_table,
+                    n_keyterms=10,
+                    ngrams=(1, 2, 3),
+                    noun_chunks=True,
+                    named_entities=True):
+    """
+    Extract key terms from a spacy-parsed doc by scoring its candidate terms
+    by their frequency in ``doc`` times their IDF in ``idf_table``.
+
+    Args:
+        doc (``spacy.Doc``)
+        idf_table (:class:`IdfTable`): e.g. as built by :func:`build_idf_table()`
+            with the same candidate terms
+        n_keyterms (int or float): number of key terms to return; if a float
+            between 0 and 1, the fraction of the number of distinct candidates
+        ngrams, noun_chunks, named_entities: see :func:`candidate_terms()`
+
+    Returns:
+        List[Tuple[str, float]]: top ``n_keyterms`` lower-cased terms and their
+            scores, sorted by score in descending order
+    """
+    candidates = candidate_terms(doc, ngrams=ngrams, noun_chunks=noun_chunks,
+                                 named_entities=named_entities)
+    if not candidates:
+        return []
+    texts = [span.text.lower() for span in candidates]
+    hashes = term_hashes(texts)
+    keys, first_idxs, counts = np.unique(hashes, return_index=True, return_counts=True)
+    if isinstance(n_keyterms, float):
+        if not 0.0 < n_keyterms <= 1.0:
+            msg = 'n_keyterms={} is invalid; must be an int or a float between 0.0 and 1.0'.format(
+                n_keyterms)
+            raise ValueError(msg)
+        n_keyterms = int(round(keys.shape[0] * n_keyterms))
+    scores = counts * idf_table.lookup(keys)
+    # ties are broken by first appearance in the doc
+    order = np.lexsort((first_idxs, -scores))[:n_keyterms]
+    return [(texts[idx], score)
+            for idx, score in zip(first_idxs[order].tolist(), scores[order].tolist())]
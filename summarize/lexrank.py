@@ -0,0 +1,207 @@
+"""
+Module for extractive summarization of spacy-parsed docs: sentences are
+represented as rows of a sparse matrix, pairwise sentence similarities are
+computed in a single sparse matrix product, and sentences are ranked by
+vectorized PageRank over the resulting similarity graph (LexRank / TextRank).
+Many docs can be summarized at once, with all of their sentences in one matrix.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from spacy.attrs import LOWER, ORTH
+
+from infoextract.vectorized import token_attrs, word_mask
+from summarize.graph import pagerank
+from vsm.vectorizer import HashingVectorizer, normalize_rows
+
+METHODS = ('lexrank', 'continuous', 'textrank')
+
+
+def _sentence_words(doc, attr):
+    """
+    Get the sentences of ``doc``, and for each of them, the ``attr`` hashes
+    and token indexes of its words (as in :func:`extract.words() <infoextract.extract.words>`).
+    """
+    sents = list(doc.sents)
+    positions = np.flatnonzero(word_mask(token_attrs(doc)))
+    keys = doc.to_array(attr)[positions] if positions.shape[0] else np.zeros(0, dtype=np.uint64)
+    sent_starts = np.array([sent.start for sent in sents], dtype=np.int64)
+    sent_ids = np.searchsorted(sent_starts, positions, side='right') - 1
+    return sents, keys.astype(np.uint64), sent_ids
+
+
+def sentence_vectors(docs, vectorizer=None, use_vectors=False):
+    """
+    Represent each sentence of each of ``docs`` as a row of a sparse matrix,
+    normalized to unit length.
+
+    Args:
+        docs (Sequence[``spacy.Doc``])
+        vectorizer (:class:`HashingVectorizer <vsm.vectorizer.HashingVectorizer>`):
+            vectorizer of sentences' words; if None, one with 'tfidf' weighting
+            and lower-casing is fit on the sentences themselves; if given with
+            'tfidf' weighting, it must already be fit
+        use_vectors (bool): if True, sentences are instead represented by the
+            mean of their words' vectors in ``docs``' vocab
+
+    Returns:
+        Tuple[``scipy.sparse.csr_matrix``, List[``spacy.Span``], List[int]]:
+            sentence vectors, the sentences themselves, and number of
+            sentences in each doc
+
+    Raises:
+        ValueError: if ``use_vectors`` is True but there are no word vectors
+    """
+    if vectorizer is None:
+        vectorizer = HashingVectorizer(n_features=2 ** 18, weighting='tfidf', norm='l2', lowercase=True)
+        fit = True
+    else:
+        fit = False
+    attr = ORTH if use_vectors is True or vectorizer.lowercase is False else LOWER
+
+    all_sents, all_keys, all_sent_ids, block_sizes = [], [], [], []
+    for doc in docs:
+        sents, keys, sent_ids = _sentence_words(doc, attr)
+        all_keys.append(keys)
+        all_sent_ids.append(sent_ids + len(all_sents))
+        all_sents.extend(sents)
+        block_sizes.append(len(sents))
+    keys = np.concatenate(all_keys) if all_keys else np.zeros(0, dtype=np.uint64)
+    sent_ids = np.concatenate(all_sent_ids) if all_sent_ids else np.zeros(0, dtype=np.int64)
+    n_sents = len(all_sents)
+
+    if use_vectors is True:
+        vectors = docs[0].vocab.vectors if docs else None
+        if vectors is None or vectors.shape[0] == 0:
+            raise ValueError('use_vectors is True, but there are no word vectors')
+        rows = vectors.find(keys=keys)
+        found = rows >= 0
+        # sum of word vectors per sentence, as a (sparse) product of word counts
+        word_counts = csr_matrix((np.ones(int(found.sum())), (sent_ids[found], rows[found])),
+                                 shape=(n_sents, vectors.shape[0]))
+        matrix = csr_matrix(word_counts.dot(vectors.data))
+    elif n_sents == 0:
+        matrix = csr_matrix((0, vectorizer.n_features))
+    else:
+        sent_hashes = np.split(keys, np.searchsorted(sent_ids, np.arange(1, n_sents)))
+        if fit is True:
+            vectorizer.fit(sent_hashes)
+        matrix = vectorizer.transform_batch(sent_hashes)
+    return normalize_rows(matrix.astype(np.float64), norm='l2'), all_sents, block_sizes
+
+
+def similarity_matrix(vectors, block_sizes=None, method='lexrank', threshold=0.1):
+    """
+    Compute the similarity graph of sentences, in a single sparse matrix product;
+    if ``block_sizes`` is given, sentences are only compared to others in the
+    same block (doc), and the graph is block-diagonal.
+
+    Args:
+        vectors (``scipy.sparse.csr_matrix``): unit-length sentence vectors, e.g.
+            as returned by :func:`sentence_vectors()`
+        block_sizes (Sequence[int]): number of sentences in each doc
+        method (str): how sentences are linked; one of
+            'lexrank': by an unweighted edge if their cosine similarity is at
+                least ``threshold``
+            'continuous': by an edge weighted by their cosine similarity, if
+                it's at least ``threshold``
+            'textrank': by an edge weighted by their number of words in common
+                over the sum of the logs of their numbers of words, if at least
+                ``threshold``
+        threshold (float): minimum similarity of linked sentences
+
+    Returns:
+        ``scipy.sparse.csr_matrix``: square matrix of edge weights, with
+            an empty diagonal
+    """
+    if method not in METHODS:
+        msg = 'invalid `method` value: "{}"; valid values are {}'.format(method, METHODS)
+        raise ValueError(msg)
+    n_sents = vectors.shape[0]
+    if block_sizes is None:
+        block_sizes = [n_sents]
+    block_ids = np.repeat(np.arange(len(block_sizes)), block_sizes)
+    vectors = vectors.tocoo()
+    # give each doc its own copy of the columns, so sentences of different
+    # docs have nothing in common, and only the block diagonal gets computed
+    cols = block_ids[vectors.row].astype(np.int64) * vectors.shape[1] + vectors.col
+    cols, inverse = np.unique(cols, return_inverse=True)
+    vectors = csr_matrix((vectors.data, (vectors.row, inverse.ravel())),
+                         shape=(n_sents, cols.shape[0]))
+    if method == 'textrank':
+        vectors.data[:] = 1.0
+    similarities = vectors.dot(vectors.T).tocoo()
+    rows, cols, data = similarities.row, similarities.col, similarities.data
+    if method == 'textrank':
+        log_lengths = np.log(np.maximum(np.diff(vectors.indptr), 1))
+        norms = log_lengths[rows] + log_lengths[cols]
+        data = np.where(norms > 0, data / np.where(norms > 0, norms, 1.0), 0.0)
+    keep = (rows != cols) & (data >= threshold) & (data > 0)
+    data = np.ones(int(keep.sum())) if method == 'lexrank' else data[keep]
+    return csr_matrix((data, (rows[keep], cols[keep])), shape=(n_sents, n_sents))
+
+
+def summarize_batch(docs,
+                    n_sentences=3,
+                    method='lexrank',
+                    threshold=0.1,
+                    vectorizer=None,
+                    use_vectors=False,
+                    damping=0.85,
+                    max_iter=100,
+                    tol=1e-6):
+    """
+    Summarize many spacy-parsed docs at once by extracting each one's top-ranked
+    sentences, with all docs' sentence similarity graphs stacked into one
+    block-diagonal matrix and ranked together by a single power iteration.
+
+    Args:
+        docs (Sequence[``spacy.Doc``]): docs with sentence boundaries set
+        n_sentences (int or float): number of sentences per summary; if a float
+            between 0 and 1, the fraction of each doc's sentences
+        method (str): see :func:`similarity_matrix()`
+        threshold (float): see :func:`similarity_matrix()`
+        vectorizer (:class:`HashingVectorizer <vsm.vectorizer.HashingVectorizer>`):
+            see :func:`sentence_vectors()`; a vectorizer fit on a large corpus
+            gives better IDF weights than one fit on ``docs`` alone
+        use_vectors (bool): see :func:`sentence_vectors()`
+        damping, max_iter, tol: see :func:`pagerank() <summarize.graph.pagerank>`
+
+    Returns:
+        List[List[``spacy.Span``]]: each doc's top sentences, in order of
+            appearance in the doc
+    """
+    if isinstance(n_sentences, float) and not 0.0 < n_sentences <= 1.0:
+        msg = 'n_sentences={} is invalid; must be an int or a float between 0.0 and 1.0'.format(
+            n_sentences)
+        raise ValueError(msg)
+    vectors, sents, block_sizes = sentence_vectors(docs, vectorizer=vectorizer,
+                                                   use_vectors=use_vectors)
+    adjacency = similarity_matrix(vectors, block_sizes=block_sizes,
+                                  method=method, threshold=threshold)
+    scores = pagerank(adjacency, damping=damping, max_iter=max_iter, tol=tol,
+                      block_sizes=block_sizes)
+
+    summaries = []
+    offset = 0
+    for block_size in block_sizes:
+        if isinstance(n_sentences, float):
+            n = max(int(round(block_size * n_sentences)), 1)
+        else:
+            n = n_sentences
+        top = np.argsort(-scores[offset: offset + block_size], kind='mergesort')[:n]
+        summaries.append([sents[offset + idx] for idx in np.sort(top).tolist()])
+        offset += block_size
+    return summaries
+
+
+def summarize(doc, n_sentences=3, method='lexrank', threshold=0.1, **kwargs):
+    """
+    Summarize a spacy-parsed doc by extracting its top-ranked sentences.
+
+    .. seealso:: :func:`summarize_batch()`, for all args
+
+    Returns:
+        List[``spacy.Span``]: top sentences, in order of appearance in ``doc``
+    """
+    return summarize_batch([doc], n_sentences=n_sentences, method=method,
+                           threshold=threshold, **kwargs)[0]
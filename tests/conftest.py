@@ -0,0 +1,41 @@
+import pytest
+import spacy
+from spacy.tokens import Doc
+
+# a small hand-parsed doc, so that tests don't need a trained pipeline
+WORDS = ['The', 'big', 'New', 'York', 'Times', 'reported', 'the', 'news', 'about',
+         '2', 'new', 'banks', '.',
+         'Bank', 'of', 'America', 'said', 'it', 'could', 'be', 'able', 'to', 'help', '.']
+POS = ['DET', 'ADJ', 'PROPN', 'PROPN', 'PROPN', 'VERB', 'DET', 'NOUN', 'ADP',
+       'NUM', 'ADJ', 'NOUN', 'PUNCT',
+       'PROPN', 'ADP', 'PROPN', 'VERB', 'PRON', 'AUX', 'AUX', 'ADJ', 'PART', 'VERB', 'PUNCT']
+TAGS = ['DT', 'JJ', 'NNP', 'NNP', 'NNP', 'VBD', 'DT', 'NN', 'IN', 'CD', 'JJ', 'NNS', '.',
+        'NNP', 'IN', 'NNP', 'VBD', 'PRP', 'MD', 'VB', 'JJ', 'TO', 'VB', '.']
+HEADS = [4, 4, 3, 4, 5, 5, 7, 5, 7, 11, 11, 8, 5,
+         16, 13, 14, 16, 19, 19, 16, 19, 22, 20, 16]
+DEPS = ['det', 'amod', 'compound', 'compound', 'nsubj', 'ROOT', 'det', 'dobj', 'prep',
+        'nummod', 'amod', 'pobj', 'punct',
+        'nsubj', 'prep', 'pobj', 'ROOT', 'nsubj', 'aux', 'ccomp', 'acomp', 'aux', 'xcomp', 'punct']
+ENTS = ['O', 'O', 'B-ORG', 'I-ORG', 'I-ORG', 'O', 'O', 'O', 'O', 'B-CARDINAL', 'O', 'O', 'O',
+        'B-ORG', 'I-ORG', 'I-ORG', 'O', 'O', 'O', 'O', 'O', 'O', 'O', 'O']
+
+
+@pytest.fixture(scope='session')
+def nlp():
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+
+@pytest.fixture(scope='session')
+def nlp_path(nlp, tmp_path_factory):
+    """Path to ``nlp`` saved on disk, for workers to load with ``spacy.load()``."""
+    dirpath = str(tmp_path_factory.mktemp('nlp'))
+    nlp.to_disk(dirpath)
+    return dirpath
+
+
+@pytest.fixture
+def doc(nlp):
+    return Doc(nlp.vocab, words=WORDS, pos=POS, tags=TAGS, heads=HEADS, deps=DEPS,
+               lemmas=[word.lower() for word in WORDS], ents=ENTS)
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix, random as sparse_random
+
+from vsm.vocabulary import Vocabulary
+from wordembedding.cooccurrence import (cooccurrence_matrix, get_shard_ids, ppmi_matrix,
+                                        randomized_svd, shard_cooccurrences, svd_embeddings,
+                                        tokenize_corpus, train_embeddings)
+from wordembedding.embeddings import Embeddings
+
+TEXTS = ['the cat sat on the mat', 'the dog sat on the log', 'a cat and a dog',
+         'the mat and the log', 'cats and dogs'] * 4
+
+
+def _brute_force(ids, doc_lengths, n_terms, window_size, weighting):
+    """Reference co-occurrence counts, by looping over all pairs of tokens of each doc."""
+    counts = np.zeros((n_terms, n_terms))
+    start = 0
+    for length in doc_lengths:
+        doc = [i for i in ids[start: start + length] if i >= 0]
+        start += length
+        for i, a in enumerate(doc):
+            for d, b in enumerate(doc[i + 1: i + 1 + window_size], 1):
+                weight = 1.0 / d if weighting == 'harmonic' else 1.0
+                counts[a, b] += weight
+                counts[b, a] += weight
+    return counts
+
+
+@pytest.mark.parametrize('weighting', ['harmonic', 'uniform'])
+def test_shard_cooccurrences(weighting):
+    rng = np.random.RandomState(0)
+    ids = rng.randint(-1, 10, size=200)
+    doc_lengths = np.array([50, 0, 3, 97, 50])
+    matrix = shard_cooccurrences(ids, doc_lengths, 10, window_size=3, weighting=weighting)
+    assert np.allclose(matrix.toarray(), _brute_force(ids, doc_lengths, 10, 3, weighting))
+    with pytest.raises(ValueError):
+        shard_cooccurrences(ids, doc_lengths, 10, weighting='linear')
+
+
+def test_cooccurrence_matrix_shards(nlp, tmp_path):
+    shards_dirpath = str(tmp_path / 'shards')
+    vocab, strings = tokenize_corpus(iter(TEXTS), nlp, shards_dirpath, batch_size=3, n_process=1)
+    assert get_shard_ids(shards_dirpath) == list(range(7))
+    assert vocab.n_docs == len(TEXTS)
+    vocab_dirpath = str(tmp_path / 'vocab')
+    vocab.prune(min_freq=5).to_disk(vocab_dirpath, strings=strings)
+    matrix = cooccurrence_matrix(shards_dirpath, vocab_dirpath, window_size=2, n_workers=2)
+    # counting all docs in a single shard gives the same matrix
+    hashes = np.concatenate([np.load(os.path.join(shards_dirpath, 'tokens_{:05d}.npy'.format(i)))
+                             for i in range(7)])
+    lengths = np.concatenate([np.load(os.path.join(shards_dirpath, 'doc_lengths_{:05d}.npy'.format(i)))
+                              for i in range(7)])
+    assert lengths.tolist() == [len(text.split()) for text in TEXTS]
+    expected = shard_cooccurrences(vocab.term_ids(hashes), lengths, len(vocab), window_size=2)
+    assert np.allclose(matrix.toarray(), expected.toarray())
+
+
+def test_ppmi_matrix():
+    counts = sparse_random(30, 30, density=0.3, random_state=0, format='csr') * 10
+    dense = counts.toarray()
+    total = dense.sum()
+    word_probs = dense.sum(axis=1) / total
+    context_counts = dense.sum(axis=0) ** 0.75
+    context_probs = context_counts / context_counts.sum()
+    with np.errstate(divide='ignore'):
+        pmi = np.log(dense / total) - np.log(word_probs[:, None]) - np.log(context_probs[None, :]) - np.log(2.0)
+    expected = np.where(dense > 0, np.maximum(pmi, 0.0), 0.0)
+    ppmi = ppmi_matrix(counts, shift=2.0)
+    assert ppmi.dtype == np.float32
+    assert np.all(ppmi.data > 0)
+    assert np.allclose(ppmi.toarray(), expected, atol=1e-5)
+
+
+def test_randomized_svd():
+    rng = np.random.RandomState(0)
+    low_rank = rng.randn(200, 5).dot(rng.randn(5, 100)).astype(np.float32)
+    u, s, vt = randomized_svd(csr_matrix(low_rank), 5)
+    assert u.shape == (200, 5) and s.shape == (5,) and vt.shape == (5, 100)
+    assert np.allclose(s, np.linalg.svd(low_rank, compute_uv=False)[:5], rtol=1e-4)
+    assert np.allclose((u * s).dot(vt), low_rank, atol=1e-3)
+    assert svd_embeddings(csr_matrix(low_rank), n_components=3).shape == (200, 3)
+
+
+def test_train_embeddings(nlp, tmp_path):
+    dirpath = str(tmp_path / 'trained')
+    vectors = train_embeddings(iter(TEXTS), nlp, dirpath, min_freq=5, n_components=4,
+                               batch_size=4, n_process=1)
+    vocab = Vocabulary.from_disk(os.path.join(dirpath, 'vocab'))
+    assert vectors.shape == (len(vocab), 4)
+    embeddings = Embeddings(os.path.join(dirpath, 'embeddings'))
+    assert 'cat' in embeddings and 'cats' not in embeddings
+    assert np.allclose(embeddings['cat'], vectors[vocab.term_ids(['cat'])[0]])
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+
+from vsm.vocabulary import Vocabulary
+from wordembedding.docvectors import doc_vectors, sif_principal_component, write_doc_vectors
+from wordembedding.embeddings import Embeddings, write_embeddings
+
+WORDS = ['the', 'cat', 'sat', 'on', 'mat', 'dog']
+DOCS = [['the', 'cat', 'sat'], [], ['unknown'], ['dog', 'dog', 'unknown', 'mat'],
+        ['on', 'the', 'mat'], ['cat']] * 2
+
+
+@pytest.fixture
+def embeddings(tmp_path):
+    vectors = np.random.RandomState(0).randn(len(WORDS), 5).astype(np.float32)
+    dirpath = str(tmp_path / 'embeddings')
+    write_embeddings(WORDS, vectors, dirpath)
+    return Embeddings(dirpath)
+
+
+@pytest.fixture
+def vocab():
+    return Vocabulary().add_docs(DOCS + [['the'] * 20])
+
+
+def _loop_doc_vectors(docs, embeddings, weights=None):
+    """Reference doc vectors, one doc and word at a time."""
+    result = np.zeros((len(docs), embeddings.dim), dtype=np.float64)
+    for i, doc in enumerate(docs):
+        found = [word for word in doc if word in embeddings]
+        if found:
+            result[i] = np.mean([embeddings[word] * (weights[word] if weights else 1.0)
+                                 for word in found], axis=0)
+    return result
+
+
+def test_doc_vectors_mean(embeddings):
+    vectors = doc_vectors(DOCS, embeddings)
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, _loop_doc_vectors(DOCS, embeddings), atol=1e-6)
+    assert not vectors[1].any() and not vectors[2].any()
+    assert doc_vectors([], embeddings).shape == (0, 5)
+
+
+def test_doc_vectors_sif(embeddings, vocab):
+    total = float(vocab.counts.sum())
+    weights = {word: 1e-2 / (1e-2 + vocab.counts[vocab.term_ids([word])[0]] / total)
+               for word in WORDS}
+    expected = _loop_doc_vectors(DOCS, embeddings, weights)
+    vectors = doc_vectors(DOCS, embeddings, weighting='sif', vocab=vocab, a=1e-2,
+                          principal_component=False)
+    assert np.allclose(vectors, expected, atol=1e-6)
+    pc = sif_principal_component(expected[np.any(expected != 0, axis=1)])
+    assert np.isclose(np.linalg.norm(pc), 1.0)
+    vectors = doc_vectors(DOCS, embeddings, weighting='sif', vocab=vocab, a=1e-2)
+    assert np.allclose(vectors, expected - np.outer(expected.dot(pc), pc), atol=1e-5)
+    with pytest.raises(ValueError):
+        doc_vectors(DOCS, embeddings, weighting='sif')
+    with pytest.raises(ValueError):
+        doc_vectors(DOCS, embeddings, weighting='max')
+
+
+@pytest.mark.parametrize('weighting', ['mean', 'sif'])
+def test_write_doc_vectors(embeddings, vocab, tmp_path, weighting):
+    dirpath = str(tmp_path / 'doc_vectors')
+    filepaths = write_doc_vectors(iter(DOCS), embeddings, dirpath, batch_size=5,
+                                  weighting=weighting, vocab=vocab)
+    assert [os.path.basename(fp) for fp in filepaths] == [
+        'vectors_00000.npy', 'vectors_00001.npy', 'vectors_00002.npy']
+    shards = [np.load(filepath) for filepath in filepaths]
+    assert [shard.shape[0] for shard in shards] == [5, 5, 2]
+    if weighting == 'sif':
+        # the first batch's principal component is removed from all batches
+        pc = np.load(os.path.join(dirpath, 'principal_component.npy'))
+        expected = doc_vectors(DOCS, embeddings, weighting='sif', vocab=vocab, principal_component=pc)
+        assert np.allclose(pc, sif_principal_component(
+            doc_vectors(DOCS[:5], embeddings, weighting='sif', vocab=vocab,
+                        principal_component=False)[[0, 3, 4]]))
+    else:
+        expected = doc_vectors(DOCS, embeddings)
+    assert np.allclose(np.concatenate(shards), expected, atol=1e-6)
@@ -0,0 +1,95 @@
+import gzip
+
+import numpy as np
+import pytest
+from spacy.attrs import ORTH
+
+from wordembedding.embeddings import Embeddings, convert_embeddings, write_embeddings
+
+WORDS = ['the', 'cat', 'New York', 'café', 'dog']
+
+
+@pytest.fixture
+def vectors():
+    return np.random.RandomState(0).rand(len(WORDS), 4).astype(np.float32)
+
+
+def _write_text(filepath, words, vectors, header=True):
+    lines = ['{} {}'.format(*vectors.shape)] if header else []
+    lines.extend('{} {}'.format(word, ' '.join(repr(float(value)) for value in vector))
+                 for word, vector in zip(words, vectors))
+    data = ('\n'.join(lines) + '\n').encode('utf-8')
+    with (gzip.open if filepath.endswith('.gz') else open)(filepath, mode='wb') as f:
+        f.write(data)
+
+
+def _write_bin(filepath, words, vectors):
+    with open(filepath, mode='wb') as f:
+        f.write('{} {}\n'.format(*vectors.shape).encode('utf-8'))
+        for word, vector in zip(words, vectors):
+            f.write(word.encode('utf-8') + b' ' + vector.astype('<f4').tobytes() + b'\n')
+
+
+@pytest.mark.parametrize('fmt, filename', [
+    ('text', 'vectors.vec'), ('text', 'vectors.vec.gz'), ('glove', 'glove.txt'), ('bin', 'vectors.bin')])
+def test_convert_embeddings(tmp_path, vectors, fmt, filename):
+    filepath = str(tmp_path / filename)
+    if fmt == 'bin':
+        # words in word2vec binary files can't contain spaces
+        words = [word.replace(' ', '_') for word in WORDS]
+        _write_bin(filepath, words, vectors)
+    else:
+        words = WORDS
+        _write_text(filepath, words, vectors, header=fmt == 'text')
+    for chunk_size in (2, 100):
+        dirpath = str(tmp_path / 'converted_{}'.format(chunk_size))
+        # the format is guessed from the file's name and first line
+        embeddings = convert_embeddings(filepath, dirpath, chunk_size=chunk_size)
+        assert len(embeddings) == len(WORDS)
+        assert embeddings.dim == 4
+        assert isinstance(embeddings.vectors, np.memmap)
+        assert np.allclose(embeddings.vectors, vectors)
+        assert embeddings.words(range(len(words))) == words
+        assert np.allclose(Embeddings(dirpath, mmap_mode=None)[words[3]], vectors[3])
+
+
+def test_convert_embeddings_options(tmp_path, vectors):
+    filepath = str(tmp_path / 'vectors.vec')
+    _write_text(filepath, WORDS, vectors)
+    embeddings = convert_embeddings(filepath, str(tmp_path / 'small'), dtype=np.float16, max_words=3)
+    assert embeddings.vectors.dtype == np.float16
+    assert len(embeddings) == 3
+    assert 'café' not in embeddings
+    assert np.allclose(embeddings.vectors, vectors[:3], atol=1e-3)
+    with pytest.raises(ValueError):
+        convert_embeddings(filepath, str(tmp_path / 'bad'), fmt='word2vec')
+    bin_filepath = str(tmp_path / 'truncated.bin')
+    _write_bin(bin_filepath, WORDS, vectors)
+    with open(bin_filepath, mode='rb+') as f:
+        f.truncate(40)
+    with pytest.raises(ValueError):
+        convert_embeddings(bin_filepath, str(tmp_path / 'truncated'))
+
+
+def test_lookup(tmp_path, nlp, vectors):
+    # a duplicated word keeps its first row
+    dirpath = str(tmp_path / 'embeddings')
+    write_embeddings(WORDS + ['cat'], np.vstack((vectors, vectors[:1])), dirpath)
+    embeddings = Embeddings(dirpath)
+    doc = nlp('the cat and the dog')
+    expected = [0, 1, -1, 0, 4]
+    assert embeddings.lookup(doc).tolist() == expected
+    assert embeddings.lookup(doc.to_array(ORTH)).tolist() == expected
+    assert embeddings.lookup([token.text for token in doc]).tolist() == expected
+    rows, found = embeddings.get_vectors(doc, missing='skip')
+    assert rows.tolist() == [0, 1, 0, 4]
+    assert np.array_equal(found, vectors[[0, 1, 0, 4]])
+    rows, all_vectors = embeddings.get_vectors(doc)
+    assert not all_vectors[2].any()
+    assert np.allclose(embeddings.norms[:5], np.linalg.norm(vectors, axis=1))
+    with pytest.raises(KeyError):
+        embeddings['and']
+    with pytest.raises(ValueError):
+        embeddings.get_vectors(doc, missing='mean')
+    with pytest.raises(ValueError):
+        write_embeddings(WORDS[:2], vectors, str(tmp_path / 'bad'))
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+from inputoutput import index as line_index
+from inputoutput.read import read_json_lines
+from inputoutput.write import write_json_lines
+
+RECORDS = [{'id': i, 'text': 'record ü ' * (i % 7)} for i in range(100)]
+
+
+@pytest.fixture
+def jsonl_file(tmp_path):
+    filepath = str(tmp_path / 'records.jsonl')
+    write_json_lines(RECORDS, filepath)
+    return filepath
+
+
+def test_build_and_load_line_index(jsonl_file):
+    index = line_index.build_line_index(jsonl_file, blocksize=64)
+    assert index.dtype == np.int64
+    assert index.shape == (len(RECORDS) + 1,)
+    assert index[0] == 0 and index[-1] == os.path.getsize(jsonl_file)
+    assert os.path.exists(line_index.get_index_filepath(jsonl_file))
+    loaded = line_index.load_line_index(jsonl_file, mmap_mode='r')
+    assert isinstance(loaded, np.memmap)
+    assert loaded.tolist() == index.tolist()
+
+
+def test_read_line_and_ranges(jsonl_file):
+    assert line_index.read_json_line(jsonl_file, 0) == RECORDS[0]
+    assert line_index.read_json_line(jsonl_file, 57) == RECORDS[57]
+    assert line_index.read_json_line(jsonl_file, -1) == RECORDS[-1]
+    with pytest.raises(IndexError):
+        line_index.read_line(jsonl_file, len(RECORDS))
+    assert list(line_index.read_json_lines_range(jsonl_file, 10, 20)) == RECORDS[10:20]
+    assert list(line_index.read_json_lines_range(jsonl_file, 95)) == RECORDS[95:]
+    assert list(line_index.read_json_lines_range(jsonl_file, 20, 10)) == []
+
+
+def test_shard_line_index(jsonl_file):
+    index = line_index.load_line_index(jsonl_file)
+    shards = line_index.shard_line_index(index, 7)
+    assert len(shards) == 7
+    assert shards[0][0] == 0 and shards[-1][1] == len(RECORDS)
+    assert all(stop == next_start for (_, stop), (next_start, _) in zip(shards, shards[1:]))
+    records = [record for start, stop in shards
+               for record in line_index.read_json_lines_range(jsonl_file, start, stop, index=index)]
+    assert records == RECORDS
+    assert len(line_index.shard_line_index(index, 1000)) == 1000
+    with pytest.raises(ValueError):
+        line_index.shard_line_index(index, 0)
+
+
+def test_update_line_index_after_append(tmp_path):
+    filepath = str(tmp_path / 'records.jsonl')
+    with open(filepath, 'w') as f:
+        f.write('{"a": 1}\n{"a": 2')  # last record not terminated yet
+    index = line_index.build_line_index(filepath)
+    assert len(index) - 1 == 2
+    with open(filepath, 'a') as f:
+        f.write('2}\n{"a": 3}\n')
+    index = line_index.load_line_index(filepath)
+    assert len(index) - 1 == 3
+    assert list(line_index.read_json_lines_range(filepath, index=index)) == list(
+        read_json_lines(filepath))
+    assert line_index.read_json_line(filepath, 1, index=index) == {'a': 22}
+    # a file that shrank has been modified, not appended to
+    with open(filepath, 'w') as f:
+        f.write('{"a": 1}\n')
+    with pytest.raises(ValueError):
+        line_index.update_line_index(filepath)
+
+
+def test_read_csv_range(tmp_path):
+    filepath = str(tmp_path / 'rows.csv')
+    rows = [[str(i), 'text {}'.format(i)] for i in range(20)]
+    with open(filepath, 'w') as f:
+        f.write(''.join(','.join(row) + '\n' for row in rows))
+    assert list(line_index.read_csv_range(filepath, 5, 8)) == rows[5:8]
+
+
+def test_compressed_file(tmp_path):
+    filepath = str(tmp_path / 'records.jsonl.gz')
+    write_json_lines(RECORDS[:3], filepath)
+    with pytest.raises(ValueError):
+        line_index.build_line_index(filepath)
@@ -0,0 +1,87 @@
+import json
+import math
+
+import pytest
+
+from inputoutput.json_backends import get_json_backend
+from inputoutput.read import read_json_lines, read_json_lines_batched
+from inputoutput.write import write_json, write_json_lines
+
+def _installed_backends():
+    names = ['json']
+    for name in ('orjson', 'ujson', 'simdjson'):
+        try:
+            get_json_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def test_default_backend_is_stdlib():
+    assert get_json_backend().name == 'json'
+    assert get_json_backend('fastest').name in _installed_backends()
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError):
+        get_json_backend('foo')
+
+
+@pytest.mark.parametrize('backend', [None] + _installed_backends())
+@pytest.mark.parametrize('mode', ['wt', 'wb'])
+def test_write_read_json_lines_roundtrip(tmp_path, backend, mode):
+    records = [{'title': 'Harrison Bergeron', 'text': 'The year was 2081.'},
+               {'a': [1, 2.5, None, True], 'ü': 'é'}]
+    filepath = str(tmp_path / 'records.jsonl')
+    write_json_lines(records, filepath, mode=mode, backend=backend)
+    assert list(read_json_lines(filepath, backend=backend)) == records
+    assert list(read_json_lines(filepath, mode='rb', backend=backend)) == records
+
+
+@pytest.mark.parametrize('backend', [None] + _installed_backends())
+def test_write_json_lines_stdlib_only_values(tmp_path, backend):
+    # non-str keys and integers beyond 64 bits are rejected by e.g. orjson,
+    # so such objects fall back to the standard library
+    filepath = str(tmp_path / 'records.jsonl')
+    write_json_lines([{1: 'a'}, {'big': 2 ** 70}], filepath, backend=backend)
+    assert list(read_json_lines(filepath)) == [{'1': 'a'}, {'big': 2 ** 70}]
+
+
+def test_write_json_nan_by_default(tmp_path):
+    filepath = str(tmp_path / 'record.json')
+    write_json({'x': float('nan')}, filepath)
+    with open(filepath) as f:
+        assert math.isnan(json.load(f)['x'])
+
+
+@pytest.mark.parametrize('backend', [None] + _installed_backends())
+def test_read_json_lines_stdlib_written(tmp_path, backend):
+    filepath = tmp_path / 'records.jsonl'
+    filepath.write_text('{"x": NaN}\n{"big": 1180591620717411303424}\n')
+    records = list(read_json_lines(str(filepath), backend=backend))
+    assert math.isnan(records[0]['x'])
+    assert records[1]['big'] == 2 ** 70
+    batches = list(read_json_lines_batched(str(filepath), backend=backend))
+    assert batches[0][1]['big'] == 2 ** 70
+
+
+@pytest.mark.parametrize('backend', [None] + _installed_backends())
+def test_read_json_lines_batched(tmp_path, backend):
+    filepath = tmp_path / 'records.jsonl'
+    filepath.write_text('{"a": 1}\n\n[1, 2]\n"x"\n3\n')
+    batches = list(read_json_lines_batched(str(filepath), batch_size=2, backend=backend))
+    assert batches == [[{'a': 1}], [[1, 2], 'x'], [3]]
+
+
+@pytest.mark.parametrize('backend', [None] + _installed_backends())
+@pytest.mark.parametrize('text, lineno', [
+    ('{"a": 1}\n1,2\n', 2),
+    ('[1\n2]\n3,4\n', 1),
+    ('{"a": 1}\n{"b":\n', 2),
+])
+def test_read_json_lines_batched_one_value_per_line(tmp_path, backend, text, lineno):
+    filepath = tmp_path / 'records.jsonl'
+    filepath.write_text(text)
+    with pytest.raises(ValueError, match='line {} of'.format(lineno)):
+        list(read_json_lines_batched(str(filepath), batch_size=10, backend=backend))
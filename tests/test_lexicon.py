@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from infoextract.lexicon import LexiconMatcher
+from utils.constants import FUNCTIONAL_WORDS
+
+TEXT = 'You ought to be able to do that, and be able to do it again.'
+
+
+def _brute_force(doc, phrases, attr='lower_'):
+    """Reference matches: every phrase compared at every token."""
+    matches = []
+    keys = [getattr(token, attr) for token in doc]
+    for label, label_phrases in phrases.items():
+        for phrase in label_phrases:
+            words = phrase.lower().split() if attr == 'lower_' else phrase.split()
+            for start in range(len(keys) - len(words) + 1):
+                if keys[start: start + len(words)] == words:
+                    matches.append((start, start + len(words), label))
+    return sorted(set(matches))
+
+
+def test_find_all_matches_brute_force(nlp):
+    phrases = {'': list(FUNCTIONAL_WORDS)}
+    matcher = LexiconMatcher.from_phrases(phrases, nlp)
+    assert len(matcher) == len({phrase.lower() for phrase in FUNCTIONAL_WORDS})
+    doc = nlp(TEXT)
+    matches = [(span.start, span.end, span.label_) for span in matcher.find(doc, longest=False)]
+    assert matches == _brute_force(doc, phrases)
+    assert 'be able to' in [span.text for span in matcher.find(doc)]
+
+
+def test_find_leftmost_longest(nlp):
+    matcher = LexiconMatcher.from_phrases({'X': ['a b'], 'Y': ['b c d', 'c d e f']}, nlp)
+    doc = nlp('a b c d e f')
+    # "a b" starts first, so it beats the longer "b c d"; "c d e f" doesn't
+    # overlap "a b", so it's kept too
+    assert [(span.text, span.label_) for span in matcher.find(doc)] == [
+        ('a b', 'X'), ('c d e f', 'Y')]
+    assert matcher.find(doc, longest=False, as_='offsets').tolist() == [
+        [0, 2, 0], [1, 4, 1], [2, 6, 1]]
+    matcher = LexiconMatcher.from_phrases(['new york', 'new york times', 'york'], nlp)
+    assert [span.text for span in matcher.find(nlp('The New York Times in New York'))] == [
+        'New York Times', 'New York']
+
+
+def test_attrs(nlp):
+    matcher = LexiconMatcher.from_phrases(['New York'], nlp, attr='orth')
+    assert [span.text for span in matcher.find(nlp('New York and new york'))] == ['New York']
+    matcher = LexiconMatcher.from_phrases([nlp('new york')], nlp)
+    assert len(matcher.find(nlp('New York and new york'))) == 2
+    with pytest.raises(ValueError):
+        LexiconMatcher.from_phrases(['a'], nlp, attr='norm')
+    with pytest.raises(ValueError):
+        matcher.find(nlp('a'), as_='text')
+
+
+def test_find_unknown_token_in_full_table(nlp):
+    # 8 edges with a load factor close to 1 must still leave an empty slot,
+    # or stepping on a token not in the trie would probe forever
+    phrases = ['a b c d e f g h']
+    matcher = LexiconMatcher.from_phrases(phrases, nlp, load_factor=0.99)
+    assert matcher.edge_keys.shape[0] > 8
+    assert [span.text for span in matcher.find(nlp('z a b c d e f g h z'))] == phrases
+    for load_factor in (0.0, 1.0, 1.5):
+        with pytest.raises(ValueError):
+            LexiconMatcher.from_phrases(phrases, nlp, load_factor=load_factor)
+
+
+def test_disk_round_trip(nlp, tmp_path):
+    phrases = {'GPE': ['new york', 'los angeles'], 'ORG': ['new york times', 'bank of america']}
+    matcher = LexiconMatcher.from_phrases(phrases, nlp, load_factor=0.9)
+    dirpath = str(tmp_path / 'lexicon')
+    matcher.to_disk(dirpath)
+    loaded = LexiconMatcher.from_disk(dirpath)
+    assert isinstance(loaded.edge_keys, np.memmap)
+    assert loaded.labels == ['GPE', 'ORG'] and loaded.attr == 'lower'
+    doc = nlp('The New York Times and Bank of America left Los Angeles for New York.')
+    assert np.array_equal(loaded.find(doc, as_='offsets'), matcher.find(doc, as_='offsets'))
+    assert [(span.text, span.label_) for span in loaded.find(doc)] == [
+        ('New York Times', 'ORG'), ('Bank of America', 'ORG'), ('Los Angeles', 'GPE'),
+        ('New York', 'GPE')]
+    empty = LexiconMatcher.from_phrases([], nlp)
+    assert len(empty) == 0 and empty.find(doc) == []
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import spacy
+
+from summarize.lexrank import similarity_matrix, sentence_vectors, summarize, summarize_batch
+from vsm.vectorizer import HashingVectorizer
+
+TEXTS = ['The cat sat on the mat. The cat was happy. Dogs bark loudly. The mat was red.',
+         'Stocks fell sharply today. Markets were down. The cat ignored the markets.',
+         'Just one sentence here.',
+         '']
+
+
+def _dense_similarities(vectors, block_sizes, method, threshold):
+    """Brute-force similarity graph, to check the block-sparse one against."""
+    dense = vectors.toarray()
+    if method == 'textrank':
+        binary = (dense != 0).astype(np.float64)
+        lengths = np.log(np.maximum(binary.sum(axis=1), 1))
+        norms = lengths[:, None] + lengths[None, :]
+        sims = np.where(norms > 0, binary.dot(binary.T) / np.where(norms > 0, norms, 1), 0.0)
+    else:
+        sims = dense.dot(dense.T)
+    block_ids = np.repeat(np.arange(len(block_sizes)), block_sizes)
+    keep = (block_ids[:, None] == block_ids[None, :]) & (sims >= threshold) & (sims > 0)
+    np.fill_diagonal(keep, False)
+    if method == 'lexrank':
+        return keep.astype(np.float64)
+    return np.where(keep, sims, 0.0)
+
+
+def test_sentence_vectors(nlp):
+    docs = list(nlp.pipe(TEXTS))
+    vectors, sents, block_sizes = sentence_vectors(docs)
+    assert block_sizes == [4, 3, 1, 0]
+    assert [sent.text for sent in sents] == [sent.text for doc in docs for sent in doc.sents]
+    assert vectors.shape[0] == 8
+    assert np.allclose(np.sqrt(vectors.multiply(vectors).sum(axis=1)), 1.0)
+    with pytest.raises(ValueError):
+        sentence_vectors(docs, use_vectors=True)
+
+
+def test_sentence_vectors_use_vectors():
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    rng = np.random.RandomState(0)
+    for word in ('cat', 'mat', 'dogs', 'bark'):
+        nlp.vocab.set_vector(word, rng.rand(5).astype(np.float32))
+    doc = nlp('cat mat cat. dogs bark.')
+    vectors, _, _ = sentence_vectors([doc], use_vectors=True)
+    expected = np.array([2 * nlp.vocab['cat'].vector + nlp.vocab['mat'].vector,
+                         nlp.vocab['dogs'].vector + nlp.vocab['bark'].vector])
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.allclose(vectors.toarray(), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('method', ['lexrank', 'continuous', 'textrank'])
+def test_similarity_matrix(nlp, method):
+    vectors, _, block_sizes = sentence_vectors(list(nlp.pipe(TEXTS)))
+    similarities = similarity_matrix(vectors, block_sizes=block_sizes, method=method,
+                                     threshold=0.05)
+    expected = _dense_similarities(vectors, block_sizes, method, 0.05)
+    assert np.allclose(similarities.toarray(), expected)
+    with pytest.raises(ValueError):
+        similarity_matrix(vectors, method='cosine')
+
+
+@pytest.mark.parametrize('method', ['lexrank', 'continuous', 'textrank'])
+def test_summarize_batch_matches_per_doc(nlp, method):
+    docs = list(nlp.pipe(TEXTS))
+    vectorizer = HashingVectorizer(n_features=2 ** 10, weighting='tfidf', norm='l2', lowercase=True)
+    vectorizer.fit([word.lower_ for word in sent if not word.is_punct]
+                   for doc in docs for sent in doc.sents)
+    summaries = summarize_batch(docs, n_sentences=2, method=method, vectorizer=vectorizer)
+    expected = [summarize(doc, n_sentences=2, method=method, vectorizer=vectorizer)
+                for doc in docs]
+    assert [[sent.text for sent in summary] for summary in summaries] == [
+        [sent.text for sent in summary] for summary in expected]
+    assert [len(summary) for summary in summaries] == [2, 2, 1, 0]
+    assert all(summary == sorted(summary, key=lambda sent: sent.start) for summary in summaries)
+
+
+def test_summarize(nlp):
+    doc = nlp(TEXTS[0])
+    summary = summarize(doc, n_sentences=0.5)
+    assert len(summary) == 2
+    # the two sentences about the cat and the mat are the most central
+    assert [sent.text for sent in summary] == ['The cat sat on the mat.', 'The cat was happy.']
+    with pytest.raises(ValueError):
+        summarize(doc, n_sentences=1.5)
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+from wordembedding.embeddings import Embeddings, write_embeddings
+from wordembedding.neighbors import (IVFIndex, knn, most_similar, most_similar_batch,
+                                     spherical_kmeans)
+
+
+@pytest.fixture
+def embeddings(tmp_path):
+    rng = np.random.RandomState(0)
+    vectors = rng.randn(300, 8).astype(np.float32)
+    vectors[7] = 0.0  # a word without a vector
+    dirpath = str(tmp_path / 'embeddings')
+    write_embeddings(['w{}'.format(i) for i in range(300)], vectors, dirpath)
+    return Embeddings(dirpath)
+
+
+def _brute_force(queries, vectors, k, exclude=None):
+    """Reference exact search: cosine similarities of all pairs, fully sorted."""
+    norms = np.linalg.norm(vectors, axis=1)
+    sims = queries.dot(vectors.T) / np.linalg.norm(queries, axis=1)[:, None] / np.where(norms == 0, 1, norms)
+    if exclude is not None:
+        sims[np.arange(queries.shape[0]), exclude] = -np.inf
+    idxs = np.argsort(-sims, axis=1, kind='mergesort')[:, :k]
+    return idxs, np.take_along_axis(sims, idxs, axis=1)
+
+
+def test_knn(embeddings):
+    queries = np.asarray(embeddings.vectors[:20]) + 0.1
+    expected_idxs, expected_scores = _brute_force(queries, np.asarray(embeddings.vectors), 5)
+    idxs, scores = knn(queries, embeddings, k=5, block_size=32, query_block_size=6)
+    assert np.array_equal(idxs, expected_idxs)
+    assert np.allclose(scores, expected_scores, atol=1e-5)
+    exclude = np.arange(20)
+    idxs, _ = knn(queries, embeddings, k=5, exclude=exclude, block_size=50)
+    assert np.array_equal(idxs, _brute_force(queries, np.asarray(embeddings.vectors), 5, exclude)[0])
+    assert knn(queries[:2], embeddings, k=1000)[0].shape == (2, 300)
+
+
+def test_most_similar(embeddings):
+    vectors = np.asarray(embeddings.vectors)
+    query = vectors[1] / np.linalg.norm(vectors[1]) - vectors[2] / np.linalg.norm(vectors[2])
+    idxs, scores = _brute_force(query[None, :] / 2, vectors, 5, exclude=None)
+    expected = [('w{}'.format(i), s) for i, s in zip(idxs[0], scores[0]) if i not in (1, 2)][:3]
+    results = most_similar(embeddings, 'w1', negative='w2', k=3)
+    assert [word for word, _ in results] == [word for word, _ in expected]
+    assert np.allclose([s for _, s in results], [s for _, s in expected], atol=1e-5)
+    with pytest.raises(KeyError):
+        most_similar(embeddings, 'unknown')
+    with pytest.raises(ValueError):
+        most_similar(embeddings, [])
+
+
+def test_most_similar_batch(embeddings):
+    results = most_similar_batch(embeddings, ['w3', 'unknown', 'w10'], k=4)
+    assert results[1] == []
+    for result, word in ((results[0], 'w3'), (results[2], 'w10')):
+        expected = most_similar(embeddings, word, k=4)
+        assert [w for w, _ in result] == [w for w, _ in expected]
+        assert np.allclose([s for _, s in result], [s for _, s in expected], atol=1e-5)
+
+
+def test_spherical_kmeans():
+    rng = np.random.RandomState(1)
+    centers = np.eye(4, dtype=np.float32)
+    vectors = np.repeat(centers, 25, axis=0) + 0.01 * rng.rand(100, 4).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    centroids = spherical_kmeans(vectors, 4, n_iter=10)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0)
+    assert sorted(np.argmax(centroids, axis=1).tolist()) == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        spherical_kmeans(vectors[:3], 4)
+    with pytest.raises(ValueError):
+        spherical_kmeans(vectors, 0)
+
+
+def test_ivf_index(embeddings, tmp_path):
+    index = IVFIndex.build(embeddings, n_clusters=10, sample_size=200)
+    assert index.centroids.shape == (10, 8)
+    assert np.array_equal(np.sort(index.list_rows), np.arange(300))
+    # (a zero vector, like row 7, ties with everything)
+    queries = np.asarray(embeddings.vectors[8:28])
+    exclude = np.arange(8, 28)
+    # probing all clusters makes the search exact
+    idxs, scores = index.query(queries, k=5, n_probe=10, exclude=exclude)
+    expected_idxs, expected_scores = knn(queries, embeddings, k=5, exclude=exclude)
+    assert np.array_equal(idxs, expected_idxs)
+    assert np.allclose(scores, expected_scores, atol=1e-5)
+    assert ([w for w, _ in most_similar(embeddings, 'w3', k=4, index=index, n_probe=10)] ==
+            [w for w, _ in most_similar(embeddings, 'w3', k=4)])
+    dirpath = str(tmp_path / 'ivf')
+    index.to_disk(dirpath)
+    loaded = IVFIndex.from_disk(dirpath, embeddings)
+    assert np.array_equal(loaded.query(queries, k=5, n_probe=2)[0], index.query(queries, k=5, n_probe=2)[0])
+
+
+def test_ivf_query_batch_matches_probed_lists(embeddings):
+    index = IVFIndex.build(embeddings, n_clusters=10, sample_size=200)
+    queries = np.asarray(embeddings.vectors[8:48]) + 0.05
+    exclude = np.arange(8, 48)
+    idxs, scores = index.query(queries, k=5, n_probe=2, exclude=exclude)
+    vectors = np.asarray(embeddings.vectors)
+    normed = queries / np.linalg.norm(queries, axis=1)[:, None]
+    for i in range(queries.shape[0]):
+        # reference: brute force over the vectors of each query's own probed lists
+        probe = np.argsort(-normed[i].dot(index.centroids.T))[:2]
+        candidates = np.concatenate([index.list_rows[index.list_offsets[c]: index.list_offsets[c + 1]]
+                                     for c in probe])
+        candidates = candidates[candidates != exclude[i]]
+        _, expected_scores = _brute_force(queries[i: i + 1], vectors[candidates], 5)
+        assert np.allclose(scores[i], expected_scores[0], atol=1e-5)
+        assert set(idxs[i].tolist()) <= set(candidates.tolist())
+        one_idxs, _ = index.query(queries[i: i + 1], k=5, n_probe=2, exclude=exclude[i: i + 1])
+        assert np.array_equal(one_idxs[0], idxs[i])
+
+
+def test_ivf_index_few_vectors(embeddings, tmp_path):
+    # more clusters than sampled vectors are capped
+    index = IVFIndex.build(embeddings, n_clusters=50, sample_size=20)
+    assert index.centroids.shape[0] == 20
+    idxs, scores = index.query(np.asarray(embeddings.vectors[:1]), k=400, n_probe=1)
+    assert idxs.shape == (1, 400)
+    assert np.all(idxs[0, np.isinf(scores[0])] == -1)
+    dirpath = str(tmp_path / 'other')
+    write_embeddings(['a', 'b'], np.eye(2, dtype=np.float32), dirpath)
+    index.to_disk(str(tmp_path / 'ivf'))
+    with pytest.raises(ValueError):
+        IVFIndex.from_disk(str(tmp_path / 'ivf'), Embeddings(dirpath))
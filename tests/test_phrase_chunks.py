@@ -0,0 +1,52 @@
+import pytest
+from spacy.tokens import Doc
+
+from infoextract.extract import phrase_chunks
+
+from conftest import DEPS, ENTS, HEADS, POS, TAGS, WORDS
+
+EXPECTED = [('big New York Times', 'ORG'), ('reported', ''), ('news', ''), ('2 new banks', ''),
+            ('Bank of America', 'ORG'), ('said', ''), ('able', ''), ('help', '')]
+
+
+def _phrases(doc, mode, **kwargs):
+    return [(p.text, p.label_ if mode == 'spans' else p.ent_type_)
+            for p in phrase_chunks(doc, mode=mode, **kwargs)]
+
+
+@pytest.mark.parametrize('mode', ['copy', 'inplace', 'spans'])
+def test_phrase_chunks_modes_agree(doc, mode):
+    n_tokens = len(doc)
+    assert _phrases(doc, mode) == EXPECTED
+    if mode == 'inplace':
+        assert len(doc) == n_tokens - 7
+    else:
+        assert len(doc) == n_tokens  # doc isn't modified
+
+
+@pytest.mark.parametrize('mode', ['copy', 'spans'])
+def test_phrase_chunks_filters(doc, mode):
+    assert _phrases(doc, mode, include_types='ORG') == [EXPECTED[0], EXPECTED[4]]
+    assert _phrases(doc, mode, include_pos={'VERB'}) == [('reported', ''), ('said', ''), ('help', '')]
+    assert [text for text, _ in _phrases(doc, mode, filter_stops=False, exclude_pos='VERB')][:4] == [
+        'The', 'big New York Times', 'the', 'news']
+    assert _phrases(doc, mode, filter_nums=True, exclude_types={'ORG'}) == [
+        EXPECTED[1], EXPECTED[2], EXPECTED[3], EXPECTED[5], EXPECTED[6], EXPECTED[7]]
+    with pytest.raises(TypeError):
+        _phrases(doc, mode, include_pos=1)
+
+
+@pytest.mark.parametrize('mode', ['copy', 'inplace', 'spans'])
+def test_phrase_chunks_absorbed_entity_type(nlp, mode):
+    # "New York" is a GPE entity within the noun chunk "The big New York Times",
+    # whose root "Times" isn't part of any entity
+    ents = ENTS[:2] + ['B-GPE', 'I-GPE', 'O'] + ENTS[5:]
+    doc = Doc(nlp.vocab, words=WORDS, pos=POS, tags=TAGS, heads=HEADS, deps=DEPS,
+              lemmas=[word.lower() for word in WORDS], ents=ents)
+    assert _phrases(doc, mode)[0] == ('big New York Times', '')
+    assert _phrases(doc, mode, include_types='GPE') == []
+
+
+def test_phrase_chunks_invalid_mode(doc):
+    with pytest.raises(ValueError):
+        list(phrase_chunks(doc, mode='merge'))
@@ -0,0 +1,159 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+from spacy.attrs import LOWER
+
+from infoextract.vectorized import ngram_hashes
+from summarize.keywords.phrases import (CountMinSketch, PhraseTable, Phrases, PrunedCounter,
+                                        doc_ngrams, learn_phrases)
+
+TEXTS = ['She works at Bank of America in New York.',
+         'Bank of America opened a branch in New York today.',
+         'A bank in the city of New York.',
+         'Shares of Bank of America fell.',
+         'The weather was nice, and the city was busy.',
+         'He moved to New York to work for a bank.'] * 3
+
+
+def _strings(phrases, nlp):
+    return set(phrases.phrase_table().get_strings(nlp.vocab.strings))
+
+
+def _phrase_table(nlp, phrases):
+    """Build a phrase table directly from (space-separated) phrase strings."""
+    keys, ns, components = [], [], []
+    max_n = max(len(phrase.split()) for phrase in phrases)
+    for phrase in phrases:
+        words = phrase.split()
+        hashes = np.array([nlp.vocab.strings.add(word) for word in words], dtype=np.uint64)
+        keys.append(ngram_hashes(hashes, np.array([0]), len(words))[0])
+        ns.append(len(words))
+        components.append(np.pad(hashes, (0, max_n - len(words))))
+    return PhraseTable(np.array(keys, dtype=np.uint64), np.array(ns),
+                       np.ones(len(phrases)), np.array(components, dtype=np.uint64))
+
+
+def test_count_min_sketch():
+    rng = np.random.RandomState(0)
+    hashes = rng.randint(1, 2 ** 62, size=200, dtype=np.int64).astype(np.uint64)
+    stream = rng.choice(hashes, size=5000)
+    sketch = CountMinSketch(width=64, depth=3)
+    sketch.add(stream[:2500])
+    other = CountMinSketch(width=64, depth=3).merge(CountMinSketch(width=64, depth=3))
+    other.add(stream[2500:])
+    sketch.merge(other)
+    counts = Counter(stream.tolist())
+    exact = np.array([counts[h] for h in hashes.tolist()])
+    assert sketch.total == 5000
+    assert np.all(sketch.query(hashes) >= exact)
+    with pytest.raises(ValueError):
+        sketch.merge(CountMinSketch(width=64, depth=3, seed=1))
+
+
+def test_pruned_counter():
+    counter = PrunedCounter(max_size=2)
+    counter.add(np.array([1, 2, 2, 3, 3, 3], dtype=np.uint64))
+    assert counter.keys.tolist() == [2, 3]
+    assert counter.pruned_count == 1
+    assert counter.query(np.array([3, 1, 4], dtype=np.uint64)).tolist() == [3, 0, 0]
+
+
+def test_pruned_counter_keeps_ties():
+    counter = PrunedCounter(max_size=3, n_cols=1)
+    hashes = np.array([5, 1, 4, 2, 3], dtype=np.uint64)
+    counter.add(hashes, hashes[:, None])
+    # all counts are tied at 1, yet max_size hashes are kept, still sorted
+    assert len(counter) == 3
+    assert counter.keys.tolist() == sorted(counter.keys.tolist())
+    assert counter.components[:, 0].tolist() == counter.keys.tolist()
+    assert counter.pruned_count == 1
+    counter.add(np.array([6, 6, 6], dtype=np.uint64), np.full((3, 1), 6, dtype=np.uint64))
+    assert len(counter) == 3
+    assert 6 in counter.keys.tolist()
+
+
+def test_doc_ngrams(nlp):
+    doc = nlp('Bank of America, in New York.')
+    words, ngrams, prefixes = doc_ngrams(doc, max_n=3, prefixes=True)
+    lower = doc.to_array(LOWER).astype(np.uint64)
+    assert words.tolist() == lower[[0, 1, 2, 4, 5, 6]].tolist()
+    assert ngrams[0][1].tolist() == [lower[[5, 6]].tolist()]  # new york
+    assert ngrams[1][1].tolist() == [lower[[0, 1, 2]].tolist()]  # bank of america
+    # "bank of" only counts as the prefix of longer n-grams
+    assert prefixes[0].tolist() == ngram_hashes(lower, np.array([0]), 2).tolist()
+    assert len(doc_ngrams(doc, max_n=3)) == 2
+
+
+@pytest.mark.parametrize('scoring', ['pmi', 'npmi', 'llr'])
+@pytest.mark.parametrize('counter', ['pruned', 'sketch'])
+def test_learn_phrases(nlp, scoring, counter):
+    # the default PMI threshold is too strict for such a small corpus
+    threshold = 2.0 if scoring == 'pmi' else None
+    phrases = Phrases(scoring=scoring, counter=counter, threshold=threshold, min_count=3,
+                      sketch_width=2 ** 12)
+    learned = _strings(phrases.add_docs(nlp.pipe(TEXTS)), nlp)
+    assert 'new york' in learned
+    assert 'bank of america' in learned
+    assert 'the city' not in learned
+
+
+def test_sketch_candidates_are_bounded(nlp):
+    phrases = Phrases(counter='sketch', min_count=1, max_size=2, sketch_width=2 ** 12,
+                      buffer_size=20)
+    phrases.add_docs(nlp.pipe(TEXTS))
+    assert all(len(candidates) <= 2 for candidates in phrases.candidates.values())
+    # the most frequent n-grams survive pruning
+    new_york = ngram_hashes(nlp('new york').to_array(LOWER).astype(np.uint64), np.array([0]), 2)
+    assert new_york[0] in phrases.candidates[2].keys
+
+
+def test_llr_counts_stop_ended_prefixes(nlp):
+    phrases = Phrases(scoring='llr', min_count=3).add_docs(nlp.pipe(TEXTS))
+    table = phrases.phrase_table()
+    scores = dict(zip(table.get_strings(nlp.vocab.strings), table.scores.tolist()))
+    assert np.isfinite(scores['bank of america'])
+    # without prefix counts, "bank of" is unknown and the score is NaN
+    phrases = Phrases(scoring='llr', min_count=3)
+    for doc in nlp.pipe(TEXTS):
+        phrases.add_ngrams(*doc_ngrams(doc, max_n=3))
+    assert 'bank of america' not in _strings(phrases, nlp)
+
+
+def test_learn_phrases_workers(nlp, nlp_path):
+    expected = _strings(learn_phrases(iter(TEXTS), nlp, Phrases(scoring='llr', min_count=3),
+                                      batch_size=4, n_process=1), nlp)
+    phrases = learn_phrases(iter(TEXTS), nlp_path, Phrases(scoring='llr', min_count=3),
+                            batch_size=4, n_process=2, max_in_flight=2)
+    assert _strings(phrases, nlp) == expected
+
+
+def test_find_leftmost_longest(nlp):
+    table = _phrase_table(nlp, ['a b', 'b c d', 'c d', 'e f', 'e f g'])
+    doc = nlp('A b c d e f g c d')
+    # "a b" beats the longer "b c d" starting later, and "e f g" beats "e f"
+    assert [span.text for span in table.find(doc)] == ['A b', 'c d', 'e f g', 'c d']
+    assert table.find(doc, as_='offsets').tolist() == [[0, 2], [2, 4], [4, 7], [7, 9]]
+    assert table.find(nlp('x'), as_='offsets').shape == (0, 2)
+    with pytest.raises(ValueError):
+        table.find(doc, as_='text')
+
+
+def test_phrase_table_disk_round_trip(nlp, tmp_path):
+    table = Phrases(min_count=3).add_docs(nlp.pipe(TEXTS)).phrase_table()
+    dirpath = str(tmp_path / 'phrases')
+    table.to_disk(dirpath)
+    loaded = PhraseTable.from_disk(dirpath, mmap_mode='r')
+    assert len(loaded) == len(table)
+    assert loaded.get_strings(nlp.vocab.strings) == table.get_strings(nlp.vocab.strings)
+    doc = nlp(TEXTS[1])
+    assert np.array_equal(loaded.find(doc, as_='offsets'), table.find(doc, as_='offsets'))
+
+
+def test_invalid_args():
+    with pytest.raises(ValueError):
+        Phrases(max_n=1)
+    with pytest.raises(ValueError):
+        Phrases(scoring='chi2')
+    with pytest.raises(ValueError):
+        Phrases(counter='exact')
@@ -0,0 +1,45 @@
+import pytest
+
+from infoextract import extract
+from infoextract.pipeline import extract_corpus, extract_doc
+
+TEXTS = ['The quick brown fox jumps over the lazy dog.',
+         'Numbers like 42 and words like apple.',
+         '',
+         'Another short text, with punctuation!'] * 3
+
+
+def test_extract_doc(doc):
+    results = extract_doc(doc, {'words': {}, 'ngrams': {'n': 2}}, as_='text')
+    assert results['words'] == [w.text for w in extract.words(doc)]
+    assert results['ngrams'] == [ng.text for ng in extract.ngrams(doc, 2)]
+    offsets = extract_doc(doc, {'words': {}}, as_='offsets')['words']
+    assert offsets == [(w.i, w.i + 1) for w in extract.words(doc)]
+    hashes = extract_doc(doc, {'words': {}}, as_='hash')['words']
+    assert hashes == [w.orth for w in extract.words(doc)]
+
+
+def test_extract_corpus_in_process(nlp):
+    results = list(extract_corpus(TEXTS, nlp, extractors={'words': {'filter_nums': True}},
+                                  batch_size=5, n_process=1))
+    expected = [{'words': [w.text for w in extract.words(nlp(text), filter_nums=True)]}
+                for text in TEXTS]
+    assert results == expected
+
+
+def test_extract_corpus_workers_keep_order_and_metadata(nlp, nlp_path):
+    items = [(text, {'id': i}) for i, text in enumerate(TEXTS)]
+    results = list(extract_corpus(items, nlp_path, extractors=['words'], as_='lower',
+                                  batch_size=2, n_process=2, max_in_flight=2))
+    assert [meta['id'] for _, meta in results] == list(range(len(TEXTS)))
+    assert [features['words'] for features, _ in results] == [
+        [w.lower_ for w in extract.words(nlp(text))] for text in TEXTS]
+
+
+def test_extract_corpus_invalid_args(nlp):
+    with pytest.raises(ValueError):
+        list(extract_corpus(TEXTS, nlp, extractors=['foo'], n_process=1))
+    with pytest.raises(ValueError):
+        list(extract_corpus(TEXTS, nlp, as_='foo', n_process=1))
+    with pytest.raises(TypeError):
+        list(extract_corpus(TEXTS, nlp, n_process=2))
@@ -0,0 +1,50 @@
+import re
+
+import pytest
+
+from infoextract.extract import pos_regex_matches, pos_regex_matches_batch
+from utils.constants import POS_REGEX_PATTERNS
+
+PATTERNS = list(POS_REGEX_PATTERNS['en'].values()) + [
+    r'<ADJ>? <PROPN>+', r'<DET> <CONJ>? <NOUN>', r'(<ADP>|<PART>)<PROPN>']
+
+
+def _string_matches(doc, pattern):
+    """Reference matcher, over a space-joined string of POS tag names."""
+    pattern = re.sub(r'\s', '', pattern).replace('<CONJ>', '(<CONJ>|<CCONJ>)')
+    pattern = re.sub(r'<([A-Z]+)>', r'( \1)', pattern)
+    tags = ' ' + ' '.join(tok.pos_ for tok in doc)
+    for match in re.finditer(pattern, tags):
+        start, end = tags[:match.start()].count(' '), tags[:match.end()].count(' ')
+        if end > start:
+            yield doc[start: end]
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_pos_regex_matches(doc, pattern):
+    matches = [(span.start, span.end) for span in pos_regex_matches(doc, pattern)]
+    assert matches == [(span.start, span.end) for span in _string_matches(doc, pattern)]
+
+
+def test_pos_regex_matches_noun_phrases(doc):
+    matches = [span.text for span in pos_regex_matches(doc, POS_REGEX_PATTERNS['en']['NP'])]
+    assert matches == ['The big New York Times', 'the news', '2 new banks', 'Bank', 'America']
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_pos_regex_matches_batch(nlp, doc, pattern):
+    docs = [doc, nlp(''), doc[13:].as_doc(), doc[:5].as_doc()]
+    assert pos_regex_matches_batch(docs, pattern) == [list(pos_regex_matches(d, pattern))
+                                                      for d in docs]
+
+
+def test_pos_regex_matches_batch_no_cross_doc_matches(doc):
+    # "York Times" ends one doc and "reported" starts the next
+    docs = [doc[:5].as_doc(), doc[5:13].as_doc()]
+    matches = pos_regex_matches_batch(docs, r'<PROPN> <VERB>')
+    assert matches == [[], []]
+
+
+def test_pos_regex_matches_invalid_tag(doc):
+    with pytest.raises(ValueError):
+        list(pos_regex_matches(doc, r'<DET> <NOUNS>'))
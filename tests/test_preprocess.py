@@ -0,0 +1,50 @@
+import pytest
+
+from utils import constants
+from utils.preprocess import preprocess_batch, preprocess_text
+
+TEXTS = ['Call 555-123-4567 or email a.b@example.com about $1,200 at https://example.com/x today.',
+         '  Line one\r\n\r\nline   two and\tthree \n',
+         'Prices: £30, €12.50 and 7 zł; see www.shop.example.org.',
+         'nothing to see here',
+         '']
+FLAGS = {'no_urls': True, 'no_emails': True, 'no_phone_numbers': True,
+         'no_numbers': True, 'no_currency_symbols': True}
+
+
+def _chained(text):
+    """Reference normalization, as a chain of substitutions that each copy the text."""
+    text = constants.URL_REGEX.sub('*URL*', text)
+    text = constants.SHORT_URL_REGEX.sub('*URL*', text)
+    text = constants.EMAIL_REGEX.sub('*EMAIL*', text)
+    text = constants.PHONE_REGEX.sub('*PHONE*', text)
+    # numbers go before currency symbols, whose codes would hide adjacent numbers
+    text = constants.NUMBERS_REGEX.sub('*NUMBER*', text)
+    text = constants.CURRENCY_REGEX.sub(lambda match: constants.CURRENCIES[match.group()], text)
+    text = constants.LINEBREAK_REGEX.sub('\n', text)
+    return constants.NONBREAKING_SPACE_REGEX.sub(' ', text).strip()
+
+
+def test_preprocess_text():
+    assert preprocess_text(TEXTS[0], **FLAGS) == (
+        'Call *PHONE* or email *EMAIL* about USD*NUMBER* at *URL* today.')
+    assert preprocess_text(TEXTS[1]) == 'Line one\nline two and three'
+    assert preprocess_text(TEXTS[1], normalize_whitespace=False) == TEXTS[1]
+    assert preprocess_text(TEXTS[0], no_phone_numbers=True, normalize_whitespace=False) == (
+        TEXTS[0].replace('555-123-4567', '*PHONE*'))
+    for text in TEXTS:
+        assert preprocess_text(text, **FLAGS) == _chained(text)
+
+
+def test_preprocess_text_replacements():
+    text = preprocess_text(TEXTS[0], no_urls=True, no_numbers=True,
+                           replacements={'url': '', 'number': '<num>'})
+    assert text == 'Call <num>-<num>-<num> or email a.b@example.com about $<num> at  today.'
+
+
+def test_preprocess_batch():
+    texts = TEXTS * 3
+    expected = [preprocess_text(text, **FLAGS) for text in texts]
+    assert list(preprocess_batch(iter(texts), batch_size=2, **FLAGS)) == expected
+    assert list(preprocess_batch(iter(texts), batch_size=2, n_workers=2, max_in_flight=2,
+                                 **FLAGS)) == expected
@@ -0,0 +1,66 @@
+import warnings
+
+import pytest
+
+from inputoutput.read import read_csv_dir, read_dir, read_files_parallel, read_json_dir
+
+
+@pytest.fixture
+def text_dir(tmp_path):
+    for i in range(5):
+        (tmp_path / 'doc{}.txt'.format(i)).write_text('text {}'.format(i))
+    (tmp_path / '.hidden').write_text('hidden')
+    return tmp_path
+
+
+@pytest.mark.parametrize('use_processes', [False, True])
+def test_read_dir_same_files_in_parallel(text_dir, use_processes):
+    # every file is read, dotfiles included, as os.listdir() lists them
+    sequential = sorted(read_dir(str(text_dir)))
+    assert sequential == ['hidden'] + ['text {}'.format(i) for i in range(5)]
+    parallel = read_dir(str(text_dir), n_workers=2, use_processes=use_processes,
+                        max_in_flight=2)
+    assert sorted(parallel) == sequential
+
+
+def test_read_json_dir_same_files_in_parallel(tmp_path):
+    for i in range(3):
+        (tmp_path / 'items{}.json'.format(i)).write_text('[{{"i": {}}}, {{"j": {}}}]'.format(i, i))
+    # with the default prefix, each file's single item is its whole JSON array
+    sequential = list(read_json_dir(str(tmp_path)))
+    parallel = list(read_json_dir(str(tmp_path), n_workers=2))
+    # both modes yield the same type: an iterator over each file's items
+    assert {type(items) for items in sequential} == {type(items) for items in parallel}
+    sequential = sorted((list(items) for items in sequential), key=str)
+    parallel = sorted((list(items) for items in parallel), key=str)
+    assert sequential == parallel == [[[{'i': i}, {'j': i}]] for i in range(3)]
+
+
+def test_read_csv_dir_same_files_in_parallel(tmp_path):
+    for i in range(3):
+        (tmp_path / 'rows{}.csv'.format(i)).write_text('a,b\n{},{}\n'.format(i, i + 1))
+    (tmp_path / '.hidden.csv').write_text('x,y\n')
+    sequential = list(read_csv_dir(str(tmp_path)))
+    parallel = list(read_csv_dir(str(tmp_path), n_workers=2))
+    assert {type(rows) for rows in sequential} == {type(rows) for rows in parallel}
+    sequential = sorted(list(rows) for rows in sequential)
+    assert sorted(list(rows) for rows in parallel) == sequential
+    assert len(sequential) == 4
+
+
+def test_read_files_parallel_ordered_and_errors(text_dir):
+    filepaths = [str(text_dir / 'doc{}.txt'.format(i)) for i in range(5)]
+    results = list(read_files_parallel(filepaths, n_workers=3, max_in_flight=2))
+    assert [content for _, content in results] == ['text {}'.format(i) for i in range(5)]
+
+    missing = filepaths[:2] + [str(text_dir / 'missing.txt')] + filepaths[2:]
+    with pytest.raises(IOError):
+        list(read_files_parallel(missing, n_workers=2))
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        results = list(read_files_parallel(missing, n_workers=2, errors='warn'))
+    assert len(results) == 5
+    assert any('missing.txt' in str(w.message) for w in caught)
+    assert len(list(read_files_parallel(missing, n_workers=2, errors='ignore'))) == 5
+    with pytest.raises(ValueError):
+        list(read_files_parallel(filepaths, errors='foo'))
@@ -0,0 +1,49 @@
+import gzip
+import json
+
+import pytest
+
+from inputoutput.read import read_json_mash
+
+OBJECTS = [{'title': 'Harrison Bergeron', 'text': 'The year was 2081. ' * 20},
+           {'title': '2BR02B', 'text': 'Everything was perfectly swell.', 'ü': 'é'},
+           12345678,
+           [1.5, 2, None],
+           'a string',
+           987654321]
+
+
+@pytest.fixture
+def mash_file(tmp_path):
+    filepath = tmp_path / 'mash.json'
+    filepath.write_text(''.join(json.dumps(obj, ensure_ascii=False) for obj in OBJECTS),
+                        encoding='utf-8')
+    return str(filepath)
+
+
+@pytest.mark.parametrize('buffersize', [1, 3, 7, 64, 65536])
+@pytest.mark.parametrize('kwargs', [{'mode': 'rt', 'encoding': 'utf-8'}, {'mode': 'rb'},
+                                    {'use_mmap': True}])
+def test_read_json_mash(mash_file, buffersize, kwargs):
+    # small buffers split objects and numbers across chunks
+    assert list(read_json_mash(mash_file, buffersize=buffersize, **kwargs)) == OBJECTS
+
+
+def test_read_json_mash_whitespace_and_compressed(tmp_path):
+    filepath = str(tmp_path / 'mash.json.gz')
+    with gzip.open(filepath, mode='wt', encoding='utf-8') as f:
+        f.write(' \n'.join(json.dumps(obj) for obj in OBJECTS) + '\n')
+    assert list(read_json_mash(filepath, mode='rb', buffersize=5)) == OBJECTS
+    with pytest.raises(ValueError):
+        list(read_json_mash(filepath, use_mmap=True))
+
+
+def test_read_json_mash_empty_and_invalid(tmp_path):
+    empty = tmp_path / 'empty.json'
+    empty.write_text('')
+    assert list(read_json_mash(str(empty))) == []
+    assert list(read_json_mash(str(empty), use_mmap=True)) == []
+    invalid = tmp_path / 'invalid.json'
+    invalid.write_text('{"a": 1}{"b": ')
+    with pytest.raises(ValueError):
+        list(read_json_mash(str(invalid), buffersize=4))
@@ -0,0 +1,53 @@
+import pytest
+
+from infoextract.scanner import KINDS, PATTERNS, scan, scan_batch
+
+TEXTS = ['Visit https://example.com or www.foo.org/bar, or email me at jane.doe@example.com!',
+         'Call (555) 123-4567 ext. 89 about the $1,200.50 invoice, or 800-555-0199.',
+         'The U.S. and the EU spent €3.5 billion; NASA got ¥ 40,000.',
+         'pizza and jazz, with a zebra',
+         'A short link: bit.ly/abc123 and 42 things.',
+         '']
+
+
+def test_currency_does_not_match_letters():
+    # currency symbols are matched as alternatives, not as a character class
+    # that would pick up e.g. the 'z' of 'zł' on its own
+    assert scan('pizza and jazz, with a zebra', kinds='currency') == []
+    assert scan('pizza and jazz, with a zebra') == []
+    assert scan('it cost 20 zł, or $5') == [(8, 10, 'number'), (11, 13, 'currency'),
+                                          (18, 19, 'currency'), (19, 20, 'number')]
+
+
+@pytest.mark.parametrize('kind, regex', PATTERNS)
+def test_scan_single_kind_matches_regex(kind, regex):
+    for text in TEXTS:
+        expected = [(match.start(), match.end(), kind) for match in regex.finditer(text)]
+        assert scan(text, kinds=kind) == expected
+
+
+def test_scan_all_kinds():
+    entities = scan(TEXTS[1])
+    assert (5, 27, 'phone') in entities
+    assert (38, 39, 'currency') in entities
+    assert (39, 47, 'number') in entities
+    for text in TEXTS:
+        entities = scan(text)
+        assert all(kind in KINDS for _, _, kind in entities)
+        # entities are in order and never overlap
+        assert all(end <= next_start for (_, end, _), (next_start, _, _) in zip(entities, entities[1:]))
+
+
+def test_scan_batch():
+    texts = TEXTS * 5
+    expected = [scan(text, kinds={'email', 'number'}) for text in texts]
+    assert list(scan_batch(iter(texts), kinds={'number', 'email'}, batch_size=4)) == expected
+    assert list(scan_batch(iter(texts), kinds={'number', 'email'}, batch_size=4,
+                           n_workers=2, max_in_flight=2)) == expected
+
+
+def test_invalid_kinds():
+    with pytest.raises(ValueError):
+        scan('text', kinds={'number', 'hashtag'})
+    with pytest.raises(ValueError):
+        list(scan_batch(['text'], kinds='hashtag'))
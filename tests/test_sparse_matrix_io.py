@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from inputoutput.read import (read_sparse_csc_cols, read_sparse_csc_matrix,
+                              read_sparse_csr_matrix, read_sparse_csr_rows)
+from inputoutput.write import write_sparse_matrix
+
+
+@pytest.fixture
+def csr():
+    return sparse_random(50, 30, density=0.1, format='csr', random_state=0)
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'compressed': False}])
+def test_write_read_npz(tmp_path, csr, kwargs):
+    filepath = str(tmp_path / 'matrix.npz')
+    write_sparse_matrix(csr, filepath, **kwargs)
+    assert (read_sparse_csr_matrix(filepath) != csr).nnz == 0
+    assert (read_sparse_csr_rows(filepath, 10, 20) != csr[10:20]).nnz == 0
+
+
+def test_write_read_mmappable_dir(tmp_path, csr):
+    dirpath = str(tmp_path / 'matrix')
+    write_sparse_matrix(csr, dirpath, mmappable=True)
+    matrix = read_sparse_csr_matrix(dirpath, mmap_mode='r')
+    assert matrix.shape == csr.shape
+    assert (matrix != csr).nnz == 0
+    assert (read_sparse_csr_rows(dirpath, 5, 17) != csr[5:17]).nnz == 0
+    assert read_sparse_csr_rows(dirpath, 45, 100).shape == (5, 30)
+    assert read_sparse_csr_rows(dirpath, 20, 10).shape == (0, 30)
+    assert (read_sparse_csr_rows(dirpath, -5, None) != csr[-5:]).nnz == 0
+    # a matrix directory knows its own format
+    with pytest.raises(ValueError):
+        read_sparse_csc_matrix(dirpath)
+
+
+@pytest.mark.parametrize('index_dtype', [np.int32, np.int64])
+def test_read_mmappable_dir_zero_copy(tmp_path, csr, index_dtype):
+    csr = csr.copy()
+    csr.indices = csr.indices.astype(index_dtype)
+    csr.indptr = csr.indptr.astype(index_dtype)
+    dirpath = str(tmp_path / 'matrix')
+    write_sparse_matrix(csr, dirpath, mmappable=True)
+    # int64 indices must not be downcast, i.e. copied into memory
+    for matrix in (read_sparse_csr_matrix(dirpath, mmap_mode='r'),
+                   read_sparse_csr_rows(dirpath, 5, 17)):
+        assert isinstance(matrix.data, np.memmap)
+        assert isinstance(matrix.indices, np.memmap)
+        assert matrix.indices.dtype == index_dtype
+    assert (read_sparse_csr_rows(dirpath, 5, 17) != csr[5:17]).nnz == 0
+
+
+def test_write_read_mmappable_csc_cols(tmp_path, csr):
+    csc = csr.tocsc()
+    dirpath = str(tmp_path / 'matrix')
+    write_sparse_matrix(csc, dirpath, mmappable=True)
+    assert (read_sparse_csc_matrix(dirpath, mmap_mode='r') != csc).nnz == 0
+    cols = read_sparse_csc_cols(dirpath, 3, 11)
+    assert cols.format == 'csc'
+    assert np.array_equal(cols.toarray(), csc[:, 3:11].toarray())
+
+
+def test_write_sparse_matrix_type(tmp_path):
+    with pytest.raises(TypeError):
+        write_sparse_matrix(np.eye(3), str(tmp_path / 'matrix.npz'))
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix, random as sparse_random
+
+from inputoutput.read import read_sparse_csr_matrix
+from inputoutput.write import SparseMatrixWriter, write_sparse_matrix_rows
+
+
+def _matrix_rows(matrix):
+    for i in range(matrix.shape[0]):
+        row = matrix.getrow(i)
+        yield list(zip(row.indices.tolist(), row.data.tolist()))
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'compressed': False}, {'mmappable': True}])
+def test_write_sparse_matrix_rows(tmp_path, kwargs):
+    matrix = sparse_random(103, 40, density=0.05, format='csr', random_state=1)
+    filepath = str(tmp_path / ('matrix' if kwargs.get('mmappable') else 'matrix.npz'))
+    shape = write_sparse_matrix_rows(_matrix_rows(matrix), filepath, batch_size=10,
+                                     n_cols=40, **kwargs)
+    assert shape == (103, 40)
+    assert (read_sparse_csr_matrix(filepath) != matrix).nnz == 0
+
+
+def test_writer_int64_indices_stay_memory_mapped(tmp_path):
+    matrix = sparse_random(20, 10, density=0.2, format='csr', random_state=2)
+    dirpath = str(tmp_path / 'matrix')
+    with SparseMatrixWriter(dirpath, n_cols=10, index_dtype=np.int64, mmappable=True) as writer:
+        writer.append(matrix)
+    loaded = read_sparse_csr_matrix(dirpath, mmap_mode='r')
+    assert isinstance(loaded.indices, np.memmap)
+    assert loaded.indices.dtype == np.int64
+    assert (loaded != matrix).nnz == 0
+
+
+def test_writer_append_mixed(tmp_path):
+    filepath = str(tmp_path / 'matrix.npz')
+    with SparseMatrixWriter(filepath, dtype=np.int64) as writer:
+        writer.append([[(0, 1), (3, 2), (0, 1)], {}, {5: 4}])
+        writer.append(csr_matrix(np.array([[0, 7, 0, 0, 0, 0, 0]])))
+        writer.append([])
+    # without `n_cols`, the matrix is only as wide as its largest column index
+    expected = np.array([[2, 0, 0, 2, 0, 0],
+                         [0, 0, 0, 0, 0, 0],
+                         [0, 0, 0, 0, 0, 4],
+                         [0, 7, 0, 0, 0, 0]])
+    matrix = read_sparse_csr_matrix(filepath)
+    assert matrix.dtype == np.int64
+    assert np.array_equal(matrix.toarray(), expected)
+
+
+def test_writer_col_out_of_bounds(tmp_path):
+    with SparseMatrixWriter(str(tmp_path / 'matrix.npz'), n_cols=3) as writer:
+        with pytest.raises(ValueError):
+            writer.append([[(3, 1.0)]])
+
+
+def test_writer_index_overflow(tmp_path):
+    filepath = str(tmp_path / 'matrix.npz')
+    n_cols = np.iinfo(np.int32).max + 2
+    with pytest.raises(ValueError):
+        SparseMatrixWriter(filepath, n_cols=n_cols)
+    rows = csr_matrix(([1.0], ([0], [n_cols - 1])), shape=(1, n_cols))
+    with SparseMatrixWriter(filepath) as writer:
+        with pytest.raises(ValueError):
+            writer.append(rows)
+        with pytest.raises(ValueError):
+            writer.append([[(n_cols - 1, 1.0)]])
+        assert writer.nnz == 0
+    with SparseMatrixWriter(filepath, index_dtype=np.int64) as writer:
+        writer.append(rows)
+    assert read_sparse_csr_matrix(filepath).shape == (1, n_cols)
+
+
+def test_writer_close_twice(tmp_path):
+    filepath = str(tmp_path / 'matrix.npz')
+    writer = SparseMatrixWriter(filepath)
+    writer.append([[(1, 1.0)]])
+    writer.close()
+    writer.close()
+    assert os.path.exists(filepath)
+    assert not os.path.exists(writer._tmpdir)
+    with SparseMatrixWriter(filepath) as writer:
+        writer.append([[(2, 1.0)]])
+        writer.close()
+    assert read_sparse_csr_matrix(filepath).shape == (1, 3)
@@ -0,0 +1,68 @@
+import pytest
+
+from infoextract import extract
+from infoextract.terms import CacheInfo, TermCleaner, clean_term
+
+
+@pytest.mark.parametrize('term, expected', [
+    ('  -Bank of America. ', 'Bank of America.'),
+    ('(the) thing', '(the) thing'),
+    ('the ) thing (', ''),
+    ('a (b', ''),
+    ('- 5 degrees', '-5 degrees'),
+    ('...', ''),
+    ('New\xa0 York', 'New York'),
+])
+def test_clean_term(term, expected):
+    assert clean_term(term) == expected
+
+
+def test_term_cleaner_matches_clean_term(doc):
+    terms = ['  -Bank of America. ', '...', 'a (b', 'New York'] * 3
+    cleaner = TermCleaner()
+    assert [cleaner.clean(term) for term in terms] == [clean_term(term) for term in terms]
+    assert list(cleaner.clean_terms(terms)) == [clean_term(term) for term in terms if clean_term(term)]
+    entities = list(extract.named_entities(doc))
+    assert list(cleaner.clean_terms(entities)) == [clean_term(ent.text) for ent in entities]
+
+
+def test_term_cleaner_lru():
+    cleaner = TermCleaner(max_size=2)
+    for term in ['a', 'b', 'a', 'c', 'b']:
+        cleaner.clean(term)
+    # 'b' was least recently used when 'c' came in, so it had to be cleaned again
+    assert cleaner.cache_info() == CacheInfo(hits=1, misses=4, max_size=2, size=2)
+    assert cleaner.hit_rate == pytest.approx(0.2)
+    cleaner.clean('c')
+    assert cleaner.hits == 2
+    cleaner.clean('a')  # evicted along with 'b' coming back
+    assert cleaner.misses == 5
+    cleaner.clear()
+    assert cleaner.cache_info() == CacheInfo(hits=0, misses=0, max_size=2, size=0)
+    assert cleaner.hit_rate == 0.0
+
+
+def test_term_cleaner_unbounded():
+    cleaner = TermCleaner(max_size=None)
+    list(cleaner.clean_terms(str(i) for i in range(1000)))
+    assert len(cleaner) == 1000
+    with pytest.raises(ValueError):
+        TermCleaner(max_size=0)
+
+
+def test_term_cleaner_keys_on_token_orths(nlp):
+    cleaner = TermCleaner()
+    doc = nlp('( Bank of America ) and (Bank of America) and (Bank of America)')
+    spaced, tight, again = doc[0:5], doc[6:11], doc[12:17]
+    # same tokens, different whitespace between them: cleaned separately
+    assert cleaner.clean(spaced) == clean_term(spaced.text)
+    assert cleaner.clean(tight) == clean_term(tight.text)
+    assert cleaner.misses == 2
+    # same tokens and whitespace, elsewhere in the doc or in another doc
+    assert cleaner.clean(again) == clean_term(again.text)
+    assert cleaner.clean(nlp('(Bank of America)')[:]) == clean_term(tight.text)
+    assert cleaner.hits == 2
+    # a token is keyed like its text
+    assert cleaner.clean(doc[1]) == 'Bank'
+    assert cleaner.clean('Bank') == 'Bank'
+    assert cleaner.cache_info() == CacheInfo(hits=3, misses=3, max_size=2 ** 20, size=3)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from scipy.sparse import block_diag, csr_matrix, random as sparse_random
+
+from summarize.graph import pagerank
+from summarize.keywords.textrank import key_terms_batch, singlerank, textrank
+
+
+def _dense_pagerank(adjacency, damping=0.85):
+    """Reference PageRank: the stationary distribution of the dense Google matrix."""
+    adjacency = np.asarray(adjacency, dtype=np.float64)
+    n_nodes = adjacency.shape[0]
+    out_weights = adjacency.sum(axis=1, keepdims=True)
+    transition = np.where(out_weights > 0, adjacency / np.where(out_weights > 0, out_weights, 1),
+                          1.0 / n_nodes)
+    google = damping * transition + (1.0 - damping) / n_nodes
+    eigvals, eigvecs = np.linalg.eig(google.T)
+    scores = np.real(eigvecs[:, np.argmax(np.real(eigvals))])
+    return scores / scores.sum()
+
+
+def test_pagerank():
+    adjacency = sparse_random(20, 20, density=0.2, random_state=0, format='lil')
+    adjacency[3, :] = 0  # a dangling node
+    adjacency = adjacency.tocsr()
+    scores = pagerank(adjacency, tol=1e-12, max_iter=1000)
+    assert np.isclose(scores.sum(), 1.0)
+    assert np.allclose(scores, _dense_pagerank(adjacency.toarray()), atol=1e-8)
+
+
+def test_pagerank_blocks():
+    blocks = [sparse_random(n, n, density=0.3, random_state=n, format='csr') for n in (5, 1, 8)]
+    scores = pagerank(block_diag(blocks), block_sizes=[5, 1, 8], tol=1e-12, max_iter=1000)
+    expected = np.concatenate([pagerank(block, tol=1e-12, max_iter=1000) for block in blocks])
+    assert np.allclose(scores, expected, atol=1e-8)
+    assert pagerank(csr_matrix((0, 0))).shape == (0,)
+    with pytest.raises(ValueError):
+        pagerank(blocks[0], block_sizes=[2, 2])
+
+
+def test_textrank(doc):
+    keyterms = textrank(doc)
+    terms = [term for term, _ in keyterms]
+    assert terms[0] == 'big new york times'
+    assert 'new banks' in terms
+    scores = [score for _, score in keyterms]
+    assert scores == sorted(scores, reverse=True)
+    words = textrank(doc, normalize=None, join_key_words=False, n_keyterms=0.5)
+    assert len(words) == 5
+    assert all(' ' not in term for term, _ in words)
+
+
+def test_key_terms_batch_matches_per_doc(nlp, doc):
+    docs = [doc, nlp('nothing'), doc[13:].as_doc(), nlp('')]
+    for func, kwargs in ((textrank, {}), (singlerank, {'normalize': 'lower'})):
+        window_width = 2 if func is textrank else 10
+        edge_weighting = 'binary' if func is textrank else 'count'
+        batch = key_terms_batch(docs, window_width=window_width, edge_weighting=edge_weighting,
+                                **kwargs)
+        expected = [func(d, **kwargs) for d in docs]
+        assert len(batch) == len(expected)
+        for result, exp in zip(batch, expected):
+            assert [term for term, _ in result] == [term for term, _ in exp]
+            assert np.allclose([score for _, score in result], [score for _, score in exp])
+
+
+def test_invalid_args(doc):
+    with pytest.raises(ValueError):
+        textrank(doc, normalize='stem')
+    with pytest.raises(ValueError):
+        key_terms_batch([doc], edge_weighting='cosine')
+    with pytest.raises(ValueError):
+        key_terms_batch([doc], window_width=1)
+    with pytest.raises(ValueError):
+        textrank(doc, n_keyterms=1.5)
@@ -0,0 +1,112 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+from spacy.strings import hash_string
+
+from summarize.keywords.tfidf import (IdfTable, build_idf_table, candidate_terms,
+                                      key_terms_tfidf)
+
+TEXTS = ['The quick brown fox jumps over the lazy dog.',
+         'The lazy dog sleeps.',
+         '',
+         'A quick brown dog and a quick brown fox.'] * 2
+# a blank pipeline has no parser, so no noun chunks
+CANDIDATES = {'ngrams': (1, 2), 'noun_chunks': False}
+
+
+def _idf(df, n_docs):
+    return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+
+def test_lookup_with_collisions():
+    rng = np.random.RandomState(0)
+    # keys sharing their low bits all want the same few slots
+    keys = np.unique(rng.randint(1, 2 ** 20, size=500).astype(np.uint64) << np.uint64(16))
+    doc_freqs = rng.randint(1, 100, size=keys.shape[0])
+    table = IdfTable.from_doc_freqs(keys, doc_freqs, n_docs=100, load_factor=0.75)
+    assert len(table) == keys.shape[0]
+    assert np.allclose(table.lookup(keys), _idf(doc_freqs, 100), rtol=1e-6)
+    missing = (keys + np.uint64(1))[:10]
+    assert np.allclose(table.lookup(missing), table.default_idf)
+    assert table.default_idf == pytest.approx(_idf(0, 100))
+
+
+def test_lookup_missing_key_in_full_table():
+    # with a load factor close to 1, a table must still keep an empty slot,
+    # or lookups of missing keys would probe forever
+    keys = np.arange(1, 9, dtype=np.uint64)
+    table = IdfTable.from_doc_freqs(keys, np.ones(8), n_docs=10, load_factor=0.99)
+    assert table.keys.shape[0] > keys.shape[0]
+    assert np.allclose(table.lookup([12345]), table.default_idf)
+    assert np.allclose(table.lookup(keys), _idf(1, 10), rtol=1e-6)
+
+
+@pytest.mark.parametrize('load_factor', [0.0, 1.0, 1.5, -0.5])
+def test_invalid_load_factor(load_factor):
+    with pytest.raises(ValueError):
+        IdfTable.from_doc_freqs(np.arange(1, 9), np.ones(8), n_docs=10, load_factor=load_factor)
+
+
+def test_lookup_terms_and_disk_round_trip(tmp_path):
+    keys = np.array([hash_string(term) for term in ('fox', 'dog', 'new york')], dtype=np.uint64)
+    table = IdfTable.from_doc_freqs(keys, [1, 3, 2], n_docs=4)
+    expected = _idf(np.array([3, 1, 2, 0]), 4)
+    assert np.allclose(table.lookup(['DOG', 'fox', 'New York', 'cat']), expected, rtol=1e-6)
+    dirpath = str(tmp_path / 'idf')
+    table.to_disk(dirpath)
+    loaded = IdfTable.from_disk(dirpath)
+    assert isinstance(loaded.keys, np.memmap)
+    assert loaded.n_docs == 4
+    assert np.array_equal(loaded.lookup(['DOG', 'fox', 'New York', 'cat']),
+                          table.lookup(['DOG', 'fox', 'New York', 'cat']))
+    assert len(IdfTable.from_doc_freqs(np.zeros(0, dtype=np.uint64), [], n_docs=0)) == 0
+
+
+def test_build_idf_table(nlp, nlp_path):
+    table = build_idf_table(iter(TEXTS), nlp, **CANDIDATES, batch_size=3, n_process=1)
+    doc_freqs = Counter(term for text in TEXTS for term in set(
+        span.text.lower() for span in candidate_terms(nlp(text), **CANDIDATES)))
+    terms = sorted(doc_freqs)
+    assert table.n_docs == len(TEXTS)
+    assert len(table) == len(terms)
+    assert np.allclose(table.lookup(terms), _idf(np.array([doc_freqs[t] for t in terms]), len(TEXTS)),
+                       rtol=1e-6)
+    parallel = build_idf_table(iter(TEXTS), nlp_path, **CANDIDATES, batch_size=3,
+                               n_process=2, max_in_flight=2)
+    assert np.array_equal(parallel.lookup(terms), table.lookup(terms))
+    pruned = build_idf_table(iter(TEXTS), nlp, **CANDIDATES, min_df=4, n_process=1)
+    assert len(pruned) == sum(df >= 4 for df in doc_freqs.values())
+
+
+def test_key_terms_tfidf(nlp):
+    table = build_idf_table(iter(TEXTS), nlp, **CANDIDATES, n_process=1)
+    doc = nlp(TEXTS[3])
+    keyterms = key_terms_tfidf(doc, table, n_keyterms=1.0, **CANDIDATES)
+    counts = Counter(span.text.lower() for span in candidate_terms(doc, **CANDIDATES))
+    assert dict(keyterms) == pytest.approx(
+        {term: count * table.lookup([term])[0] for term, count in counts.items()})
+    scores = [score for _, score in keyterms]
+    assert scores == sorted(scores, reverse=True)
+    assert len(key_terms_tfidf(doc, table, n_keyterms=2, **CANDIDATES)) == 2
+    assert key_terms_tfidf(nlp(''), table, **CANDIDATES) == []
+    with pytest.raises(ValueError):
+        key_terms_tfidf(doc, table, n_keyterms=2.0, **CANDIDATES)
+
+
+def test_candidate_terms(doc):
+    candidates = [span.text for span in candidate_terms(doc, ngrams=(2,))]
+    assert 'New York' in candidates
+    assert 'big New York Times' in candidates  # noun chunk, without determiner
+    assert 'Bank of America' in candidates  # entity
+
+
+def test_candidate_terms_counted_once_per_span(doc):
+    # "New York Times" is both a trigram and an entity, but the same span
+    candidates = candidate_terms(doc)
+    offsets = [(span.start, span.end) for span in candidates]
+    assert len(offsets) == len(set(offsets))
+    assert [span.text for span in candidates].count('New York Times') == 1
+    table = IdfTable.from_doc_freqs(np.zeros(0, dtype=np.uint64), [], n_docs=1)
+    scores = dict(key_terms_tfidf(doc, table, n_keyterms=1.0))
+    assert scores['new york times'] == pytest.approx(table.default_idf)
@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+from spacy.attrs import LOWER, ORTH
+
+from infoextract import extract, vectorized
+from infoextract.vectorized import extract_all
+
+
+def _as_offsets(objs):
+    return [(obj.i, obj.i + 1) if hasattr(obj, 'i') else (obj.start, obj.end) for obj in objs]
+
+
+def _reference_ngrams(doc, n, filter_stops=True, filter_punct=True, filter_nums=False,
+                      include_pos=None, exclude_pos=None):
+    """Offsets of n-grams filtered one by one in plain Python, token by token."""
+    if isinstance(include_pos, str):
+        include_pos = {include_pos}
+    if isinstance(exclude_pos, str):
+        exclude_pos = {exclude_pos}
+    include_pos = {pos.upper() for pos in include_pos} if include_pos else None
+    exclude_pos = {pos.upper() for pos in exclude_pos} if exclude_pos else set()
+    offsets = []
+    for start in range(len(doc) - n + 1):
+        tokens = doc[start: start + n]
+        if any(tok.is_space for tok in tokens):
+            continue
+        if filter_stops and (tokens[0].is_stop or tokens[-1].is_stop):
+            continue
+        if filter_punct and any(tok.is_punct for tok in tokens):
+            continue
+        if filter_nums and any(tok.like_num for tok in tokens):
+            continue
+        if include_pos is not None and any(tok.pos_ not in include_pos for tok in tokens):
+            continue
+        if any(tok.pos_ in exclude_pos for tok in tokens):
+            continue
+        offsets.append((start, start + n))
+    return offsets
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'filter_stops': False, 'filter_punct': False},
+    {'filter_nums': True},
+    {'include_pos': 'NOUN'},
+    {'include_pos': {'noun', 'PROPN'}},
+    {'exclude_pos': ['ADJ', 'VERB']},
+])
+def test_extract_all_words_and_ngrams_match_extract(doc, kwargs):
+    results = extract_all(doc, words=kwargs, ngrams=dict(kwargs, n=2))
+    assert _as_offsets(results['words']) == _as_offsets(extract.words(doc, **kwargs))
+    assert _as_offsets(results['ngrams']) == _as_offsets(extract.ngrams(doc, 2, **kwargs))
+    # extract.ngrams() is itself vectorized, so check against a plain-Python reference too
+    assert _as_offsets(results['ngrams']) == _reference_ngrams(doc, 2, **kwargs)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'drop_determiners': False},
+    {'include_types': 'ORG'},
+    {'exclude_types': 'NUMERIC'},
+    {'include_types': {'CARDINAL'}},
+])
+def test_extract_all_entities_match_extract(doc, kwargs):
+    results = extract_all(doc, named_entities=kwargs)
+    assert _as_offsets(results['named_entities']) == _as_offsets(
+        extract.named_entities(doc, **kwargs))
+
+
+@pytest.mark.parametrize('drop_determiners', [True, False])
+def test_extract_all_noun_chunks_match_extract(doc, drop_determiners):
+    results = extract_all(doc, noun_chunks={'drop_determiners': drop_determiners})
+    assert _as_offsets(results['noun_chunks']) == _as_offsets(
+        extract.noun_chunks(doc, drop_determiners=drop_determiners))
+
+
+def test_extract_all_only_requested(doc):
+    assert set(extract_all(doc, words={})) == {'words'}
+    assert extract_all(doc) == {}
+
+
+def test_extract_all_invalid_filters(doc):
+    with pytest.raises(TypeError):
+        extract_all(doc, words={'include_pos': 1})
+    with pytest.raises(ValueError):
+        extract_all(doc, ngrams={'n': 0})
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'filter_stops': False}, {'include_pos': 'PROPN'}])
+@pytest.mark.parametrize('n', [1, 2, 3])
+def test_ngrams_match_extract(doc, n, kwargs):
+    expected = _reference_ngrams(doc, n, **kwargs)
+    assert _as_offsets(extract.ngrams(doc, n, **kwargs)) == expected
+    assert _as_offsets(vectorized.ngrams(doc, n, **kwargs)) == expected
+    offsets = vectorized.ngrams(doc, n, as_='offsets', **kwargs)
+    assert [tuple(row) for row in offsets.tolist()] == expected
+
+
+def test_ngrams_expected_texts(doc):
+    assert [span.text for span in extract.ngrams(doc, 2)] == [
+        'big New', 'New York', 'York Times', 'Times reported', '2 new', 'new banks',
+        'America said']
+    assert [span.text for span in vectorized.ngrams(doc, 3, filter_nums=True)] == [
+        'big New York', 'New York Times', 'York Times reported', 'reported the news',
+        'Bank of America', 'able to help']
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'filter_stops': False, 'filter_punct': False},
+                                    {'filter_nums': True}])
+@pytest.mark.parametrize('n', [1, 2, 3])
+def test_ngrams_match_reference_with_spaces(nlp, n, kwargs):
+    doc = nlp('New  York has 10 big, busy banks.\n\nIt is one of the ten best, \tsaid  Ann.')
+    assert any(token.is_space for token in doc)
+    expected = _reference_ngrams(doc, n, **kwargs)
+    assert _as_offsets(vectorized.ngrams(doc, n, **kwargs)) == expected
+    assert _as_offsets(extract.ngrams(doc, n, **kwargs)) == expected
+
+
+def test_ngrams_several_n(doc):
+    spans = vectorized.ngrams(doc, (1, 2), filter_stops=False)
+    expected = (list(extract.ngrams(doc, 1, filter_stops=False)) +
+                list(extract.ngrams(doc, 2, filter_stops=False)))
+    assert _as_offsets(spans) == _as_offsets(expected)
+
+
+def test_ngrams_numpy_integer_n(doc):
+    assert _as_offsets(vectorized.ngrams(doc, np.int64(2))) == _as_offsets(extract.ngrams(doc, 2))
+    assert _as_offsets(vectorized.ngrams(doc, np.array([1, 2]))) == _as_offsets(
+        vectorized.ngrams(doc, (1, 2)))
+    assert _as_offsets(extract.ngrams(doc, np.int64(2))) == _as_offsets(extract.ngrams(doc, 2))
+    with pytest.raises(TypeError):
+        vectorized.ngrams(doc, 2.5)
+    with pytest.raises(ValueError):
+        vectorized.ngrams(doc, 0)
+
+
+def test_ngram_hashes(doc):
+    keys = doc.to_array(ORTH).astype(np.uint64)
+    # unigram ids are the tokens' own hashes
+    unigrams = vectorized.ngrams(doc, 1, filter_stops=False, filter_punct=False, as_='hashes')
+    assert unigrams.tolist() == keys.tolist()
+    assert doc.vocab.strings[int(unigrams[0])] == doc[0].text
+    # equal n-grams get equal ids, different ones (almost surely) don't
+    starts = np.arange(len(doc) - 1)
+    bigrams = vectorized.ngram_hashes(keys, starts, 2)
+    texts = [doc[i: i + 2].text for i in starts.tolist()]
+    assert len(set(bigrams.tolist())) == len(set(texts))
+    assert vectorized.ngrams(doc, 2, as_='hashes').tolist() == [
+        bigrams[start] for start, _ in vectorized.ngrams(doc, 2, as_='offsets').tolist()]
+    lower = vectorized.ngrams(doc, 2, as_='hashes', attr=LOWER)
+    assert lower.dtype == np.uint64
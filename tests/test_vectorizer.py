@@ -0,0 +1,99 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+from scipy.sparse import vstack
+from spacy.strings import hash_string
+
+from infoextract import extract
+from vsm.vectorizer import HashingVectorizer, normalize_rows, term_hashes, vectorize_corpus
+
+DOCS = [['a', 'b', 'a', 'c'], ['b', 'd'], [], ['c', 'c', 'c', 'e', 'a']] * 3
+TEXTS = ['The quick brown fox jumps over the lazy dog.',
+         'Numbers like 42 and words like apple.',
+         '',
+         'The dog and the fox.'] * 3
+
+
+def _dense(docs, n_features):
+    """Brute-force tf matrix, to check the vectorized one against."""
+    matrix = np.zeros((len(docs), n_features))
+    for i, doc in enumerate(docs):
+        for term, count in Counter(doc).items():
+            matrix[i, hash_string(term) % n_features] += count
+    return matrix
+
+
+def test_term_hashes(doc):
+    words = list(extract.words(doc))
+    hashes = term_hashes(words)
+    assert hashes.dtype == np.uint64
+    assert hashes.tolist() == [hash_string(w.text) for w in words]
+    assert term_hashes([w.text for w in words]).tolist() == hashes.tolist()
+    assert term_hashes(words, lowercase=True).tolist() == [hash_string(w.lower_) for w in words]
+    spans = list(extract.ngrams(doc, 2))
+    assert term_hashes(spans).tolist() == [hash_string(s.text) for s in spans]
+    assert term_hashes(hashes.tolist()).tolist() == hashes.tolist()
+
+
+@pytest.mark.parametrize('norm', ['l1', 'l2'])
+def test_normalize_rows(norm):
+    matrix = HashingVectorizer(n_features=16).transform_batch(DOCS)
+    expected = matrix.toarray()
+    norms = np.linalg.norm(expected, ord=1 if norm == 'l1' else 2, axis=1)
+    norms[norms == 0] = 1
+    assert np.allclose(normalize_rows(matrix, norm=norm).toarray(), expected / norms[:, None])
+
+
+def test_transform_tf_binary():
+    vectorizer = HashingVectorizer(n_features=8)
+    matrix = vectorizer.transform_batch(DOCS)
+    assert matrix.shape == (len(DOCS), 8)
+    assert np.array_equal(matrix.toarray(), _dense(DOCS, 8))
+    binary = HashingVectorizer(n_features=8, weighting='binary').transform_batch(DOCS)
+    assert np.array_equal(binary.toarray(), (_dense(DOCS, 8) > 0).astype(float))
+
+
+def test_transform_tfidf():
+    vectorizer = HashingVectorizer(n_features=1024, weighting='tfidf', norm='l2')
+    with pytest.raises(ValueError):
+        vectorizer.transform_batch(DOCS)
+    vectorizer.fit(iter(DOCS[:6])).fit(iter(DOCS[6:]))
+    assert vectorizer.n_docs == len(DOCS)
+    tf = _dense(DOCS, 1024)
+    df = (tf > 0).sum(axis=0)
+    expected = tf * (np.log((1.0 + len(DOCS)) / (1.0 + df)) + 1.0)
+    norms = np.linalg.norm(expected, axis=1)
+    norms[norms == 0] = 1
+    matrix = vectorizer.transform_batch(DOCS)
+    assert np.allclose(matrix.toarray(), expected / norms[:, None])
+
+
+def test_transform_batches_and_workers():
+    vectorizer = HashingVectorizer(n_features=32)
+    expected = vectorizer.transform_batch(DOCS).toarray()
+    batches = list(vectorizer.transform(iter(DOCS), batch_size=5))
+    assert [batch.shape[0] for batch in batches] == [5, 5, 2]
+    assert np.array_equal(vstack(batches).toarray(), expected)
+    batches = list(vectorizer.transform(iter(DOCS), batch_size=5, n_workers=2, max_in_flight=2))
+    assert np.array_equal(vstack(batches).toarray(), expected)
+
+
+def test_invalid_args():
+    with pytest.raises(ValueError):
+        HashingVectorizer(weighting='bm25')
+    with pytest.raises(ValueError):
+        HashingVectorizer(norm='max')
+
+
+def test_vectorize_corpus(nlp, nlp_path):
+    vectorizer = HashingVectorizer(n_features=64, lowercase=True)
+    expected = vectorizer.transform_batch(
+        [w.lower_ for w in extract.words(nlp(text))] for text in TEXTS).toarray()
+    batches = list(vectorize_corpus(iter(TEXTS), nlp, vectorizer, batch_size=5, n_process=1))
+    assert np.array_equal(vstack(batches).toarray(), expected)
+    batches = list(vectorize_corpus(iter(TEXTS), nlp_path, vectorizer,
+                                    batch_size=5, n_process=2, max_in_flight=2))
+    assert np.array_equal(vstack(batches).toarray(), expected)
+    with pytest.raises(TypeError):
+        next(vectorize_corpus(iter(TEXTS), nlp, vectorizer, n_process=2))
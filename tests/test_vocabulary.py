@@ -0,0 +1,80 @@
+from collections import Counter
+
+import numpy as np
+from spacy.strings import StringStore, hash_string
+
+from infoextract import extract
+from vsm.vocabulary import Vocabulary, merge_vocabularies
+
+DOCS = [['a', 'b', 'a', 'c'], ['b', 'd'], [], ['c', 'c', 'c', 'e', 'a'], ['A', 'b']]
+
+
+def _vocab_dict(vocab):
+    """Map each term's hash to its (count, doc freq), for comparison."""
+    return {key: (count, df) for key, count, df in zip(
+        vocab.keys.tolist(), vocab.counts.tolist(), vocab.doc_freqs.tolist())}
+
+
+def _expected(docs):
+    counts = Counter(term for doc in docs for term in doc)
+    doc_freqs = Counter(term for doc in docs for term in set(doc))
+    return {hash_string(term): (counts[term], doc_freqs[term]) for term in counts}
+
+
+def test_add_docs():
+    vocab = Vocabulary(buffer_size=3).add_docs(iter(DOCS))
+    assert len(vocab) == 6
+    assert vocab.n_docs == len(DOCS)
+    assert np.all(np.diff(vocab.keys.astype(np.float64)) > 0)
+    assert _vocab_dict(vocab) == _expected(DOCS)
+    lower = Vocabulary(lowercase=True).add_docs(iter(DOCS))
+    assert len(lower) == 5
+    assert _vocab_dict(lower)[hash_string('a')] == (4, 3)
+
+
+def test_term_ids_and_counts():
+    vocab = Vocabulary().add_docs(iter(DOCS))
+    ids = vocab.term_ids(['c', 'zzz', 'a'])
+    assert ids[1] == -1
+    assert vocab.keys[ids[0]] == hash_string('c')
+    assert vocab.keys[ids[2]] == hash_string('a')
+    assert 'd' in vocab and 'zzz' not in vocab
+    assert vocab.term_counts(['c', 'zzz', 'c', 'a']) == sorted([(ids[0], 2), (ids[2], 1)])
+    assert Vocabulary().term_ids(['a']).tolist() == [-1]
+
+
+def test_prune():
+    vocab = Vocabulary().add_docs(iter(DOCS))
+    vocab.prune(min_freq=2)
+    assert _vocab_dict(vocab) == {key: value for key, value in _expected(DOCS).items()
+                                  if value[0] >= 2}
+    vocab = Vocabulary().add_docs(iter(DOCS)).prune(min_df=2, max_df=0.5)
+    assert _vocab_dict(vocab) == {key: value for key, value in _expected(DOCS).items()
+                                  if 2 <= value[1] <= 2}
+    vocab = Vocabulary().add_docs(iter(DOCS)).prune(max_n_terms=2)
+    assert sorted(vocab.counts.tolist()) == [3, 4]
+    assert 'c' in vocab
+
+
+def test_merge():
+    vocabs = [Vocabulary().add_docs(DOCS[:2]), Vocabulary().add_docs(DOCS[2:])]
+    merged = merge_vocabularies(vocabs)
+    assert merged.n_docs == len(DOCS)
+    assert _vocab_dict(merged) == _vocab_dict(Vocabulary().add_docs(DOCS))
+
+
+def test_disk_round_trip(doc, tmp_path):
+    strings = StringStore()
+    vocab = Vocabulary(lowercase=True, strings=strings)
+    vocab.add_docs([extract.words(doc), list(extract.ngrams(doc, 2))])
+    dirpath = str(tmp_path / 'vocab')
+    vocab.to_disk(dirpath, strings=strings)
+    new_strings = StringStore()
+    loaded = Vocabulary.from_disk(dirpath, mmap_mode='r', strings=new_strings)
+    assert isinstance(loaded.keys, np.memmap)
+    assert loaded.lowercase is True
+    assert loaded.n_docs == 2
+    assert _vocab_dict(loaded) == _vocab_dict(vocab)
+    assert loaded.get_strings(new_strings) == vocab.get_strings()
+    assert 'new york' in loaded.get_strings(new_strings)
+    assert loaded.term_ids(['NEW YORK'])[0] >= 0
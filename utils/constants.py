@@ -87,7 +87,7 @@ EMAIL_REGEX = re.compile(r"(?:^|(?<=[^\w@.)]))([\w+-](\.(?!\.))?)*?[\w+-]@(?:\w-
 PHONE_REGEX = re.compile(r'(?:^|(?<=[^\w)]))(\+?1[ .-]?)?(\(?\d{3}\)?[ .-]?)?\d{3}[ .-]?\d{4}(\s?(?:ext\.?|[#x-])\s?\d{2,6})?(?:$|(?=\W))')
 NUMBERS_REGEX = re.compile(r'(?:^|(?<=[^\w,.]))[+–-]?(([1-9]\d{0,2}(,\d{3})+(\.\d*)?)|([1-9]\d{0,2}([ .]\d{3})+(,\d*)?)|(\d*?[.,]\d+)|\d+)(?:$|(?=\b))')
 PUNCT_REGEX = re.compile('[{0}]+'.format(re.escape(string.punctuation)))
-CURRENCY_REGEX = re.compile('[{0}]+'.format(''.join(CURRENCIES.keys())))
+CURRENCY_REGEX = re.compile('|'.join(re.escape(symbol) for symbol in sorted(CURRENCIES, key=len, reverse=True)))
 LINEBREAK_REGEX = re.compile(r'((\r\n)|[\n\v])+')
 NONBREAKING_SPACE_REGEX = re.compile(r'(?!\n)\s+')
 URL_REGEX = re.compile(
@@ -0,0 +1,33 @@
+"""
+Helpers for the open-addressing (linear probing) hash tables backed by NumPy
+arrays that are used to persist term statistics and lexicons.
+"""
+import numpy as np
+
+
+def n_table_slots(n_keys, load_factor):
+    """
+    Get the number of slots of a hash table holding ``n_keys`` keys, a power
+    of 2 with at least one slot always left empty, since lookups of missing
+    keys only stop probing at an empty slot.
+
+    Args:
+        n_keys (int): number of keys to be stored
+        load_factor (float): maximum fraction of slots in use; must be greater
+            than 0.0 and less than 1.0
+
+    Returns:
+        int
+
+    Raises:
+        ValueError: if ``load_factor`` is not between 0.0 and 1.0, exclusive
+    """
+    if not 0.0 < load_factor < 1.0:
+        msg = 'load_factor={} is invalid; must be greater than 0.0 and less than 1.0'.format(
+            load_factor)
+        raise ValueError(msg)
+    n_slots = 1 << max(3, int(np.ceil(np.log2(max(n_keys, 1) / load_factor))))
+    # guard against n_keys / load_factor rounding down to n_keys
+    while n_slots <= n_keys:
+        n_slots <<= 1
+    return n_slots
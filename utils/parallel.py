@@ -0,0 +1,99 @@
+"""
+Helpers for running a function over a (possibly huge) stream of inputs in a
+pool of worker threads or processes, without ever materializing the stream or
+the results in memory.
+"""
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+import os
+
+
+def get_n_workers(n_workers):
+    """
+    Resolve the number of workers to use: if ``n_workers`` is None or less than
+    1, use all available CPUs, otherwise use ``n_workers`` as-is.
+    """
+    if n_workers is None or n_workers < 1:
+        return os.cpu_count() or 1
+    return n_workers
+
+
+def bounded_imap(func, items,
+                 n_workers=None,
+                 use_processes=False,
+                 ordered=True,
+                 max_in_flight=None,
+                 initializer=None,
+                 initargs=()):
+    """
+    Apply ``func`` to each element of ``items`` in a pool of workers, keeping
+    at most ``max_in_flight`` calls submitted (running or finished but not yet
+    consumed) at any given time, so that memory use is bounded regardless of
+    how many ``items`` there are.
+
+    Args:
+        func (callable): function of one argument; must be picklable (i.e.
+            defined at module level) if ``use_processes`` is True
+        items (iterable): arguments to ``func``, consumed lazily
+        n_workers (int): number of worker threads or processes; if None,
+            all available CPUs are used
+        use_processes (bool): if True, use a pool of processes (for CPU-bound
+            work); otherwise, use a pool of threads (for I/O-bound work)
+        ordered (bool): if True, results are yielded in the same order as
+            ``items``; otherwise, they are yielded as soon as they complete
+        max_in_flight (int): maximum number of submitted but not yet yielded
+            calls; if None, defaults to twice the number of workers
+        initializer (callable): optional function called once at the start of
+            each worker, e.g. to load a model
+        initargs (tuple): arguments passed to ``initializer``
+
+    Yields:
+        Tuple[obj, ``concurrent.futures.Future``]: the next item and its
+            *completed* future; call ``future.result()`` to get the value
+            returned by ``func`` or re-raise the exception it raised, which
+            lets callers decide how to handle per-item failures
+    """
+    n_workers = get_n_workers(n_workers)
+    if max_in_flight is None:
+        max_in_flight = 2 * n_workers
+    elif max_in_flight < 1:
+        raise ValueError('max_in_flight must be greater than or equal to 1')
+
+    executor_cls = ProcessPoolExecutor if use_processes is True else ThreadPoolExecutor
+    items = iter(items)
+    with executor_cls(max_workers=n_workers, initializer=initializer,
+                      initargs=initargs) as executor:
+        if ordered is True:
+            pending = deque()
+            try:
+                for item in items:
+                    pending.append((item, executor.submit(func, item)))
+                    if len(pending) >= max_in_flight:
+                        item_, future = pending.popleft()
+                        wait((future,))
+                        yield item_, future
+                while pending:
+                    item_, future = pending.popleft()
+                    wait((future,))
+                    yield item_, future
+            finally:
+                # don't run work nobody will consume if the caller stops early
+                for _, future in pending:
+                    future.cancel()
+        else:
+            pending = {}
+            try:
+                for item in items:
+                    pending[executor.submit(func, item)] = item
+                    if len(pending) >= max_in_flight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield pending.pop(future), future
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future
+            finally:
+                for future in pending:
+                    future.cancel()
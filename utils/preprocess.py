@@ -0,0 +1,131 @@
+"""
+Module for normalizing raw texts before parsing: replacing or removing URLs,
+emails, phone numbers, numbers and currency symbols, and normalizing line
+breaks and whitespace, with the regexes in :mod:`utils.constants`.
+
+All of it is done in a *single* pass per text: the selected regexes are
+combined into one alternation (see :func:`combine_patterns() <infoextract.scanner.combine_patterns>`)
+and substituted at once, rather than chaining ``re.sub`` calls that each scan
+and copy the whole string.
+"""
+from functools import lru_cache, partial
+
+from cytoolz.itertoolz import partition_all
+
+from infoextract.scanner import PATTERNS, PREFILTERS, combine_patterns
+from utils import constants
+from utils.parallel import bounded_imap
+
+# default replacement of each kind of match; None means each currency symbol
+# is replaced by its standard code, e.g. '$' by 'USD'
+REPLACEMENTS = {
+    'url': '*URL*',
+    'short_url': '*URL*',
+    'email': '*EMAIL*',
+    'phone': '*PHONE*',
+    'number': '*NUMBER*',
+    'currency': None,
+    'linebreak': '\n',
+    'space': ' ',
+}
+
+_WHITESPACE_PATTERNS = (
+    ('linebreak', constants.LINEBREAK_REGEX),
+    ('space', constants.NONBREAKING_SPACE_REGEX),
+)
+
+
+@lru_cache(maxsize=None)
+def _combined_regex(kinds):
+    patterns = dict(PATTERNS + _WHITESPACE_PATTERNS)
+    return combine_patterns([(kind, patterns[kind]) for kind in kinds])
+
+
+def _replace(match, replacements):
+    replacement = replacements[match.lastgroup]
+    if replacement is None:
+        return constants.CURRENCIES[match.group()]
+    return replacement
+
+
+def preprocess_text(text, no_urls=False, no_emails=False, no_phone_numbers=False,
+                    no_numbers=False, no_currency_symbols=False, normalize_whitespace=True,
+                    replacements=None):
+    """
+    Normalize ``text`` in one pass, as specified by the flags; where matches
+    of several kinds would overlap, the first kind in the order of the flags
+    wins (e.g. phone numbers aren't also replaced as numbers).
+
+    Args:
+        text (str): raw text
+        no_urls (bool): if True, replace all URLs with '*URL*'
+        no_emails (bool): if True, replace all emails with '*EMAIL*'
+        no_phone_numbers (bool): if True, replace all phone numbers with '*PHONE*'
+        no_numbers (bool): if True, replace all numbers with '*NUMBER*'
+        no_currency_symbols (bool): if True, replace all currency symbols with
+            their standard 3-letter abbreviations
+        normalize_whitespace (bool): if True, replace each run of line breaks
+            with a single newline and each other run of whitespace with a
+            single space, and strip leading and trailing whitespace
+        replacements (dict): replacements to use instead of the defaults
+            in :data:`REPLACEMENTS`, by kind; use '' to remove matches
+
+    Returns:
+        str
+    """
+    kinds = []
+    if no_urls:
+        kinds.extend(('url', 'short_url'))
+    if no_emails:
+        kinds.append('email')
+    if no_phone_numbers:
+        kinds.append('phone')
+    if no_currency_symbols:
+        kinds.append('currency')
+    if no_numbers:
+        kinds.append('number')
+    kinds = [kind for kind in kinds if PREFILTERS[kind](text)]
+    if normalize_whitespace:
+        kinds.extend(kind for kind, _ in _WHITESPACE_PATTERNS)
+    if not kinds:
+        return text
+    if replacements:
+        replacements = dict(REPLACEMENTS, **replacements)
+    else:
+        replacements = REPLACEMENTS
+    text = _combined_regex(tuple(kinds)).sub(partial(_replace, replacements=replacements), text)
+    return text.strip() if normalize_whitespace else text
+
+
+def _preprocess_texts(texts, kwargs):
+    return [preprocess_text(text, **kwargs) for text in texts]
+
+
+def preprocess_batch(texts, batch_size=1000, n_workers=1, max_in_flight=None, **kwargs):
+    """
+    Normalize each of a stream of texts, as with :func:`preprocess_text()`, in
+    batches of ``batch_size`` texts, optionally in parallel worker processes.
+
+    Args:
+        texts (Iterable[str]): stream of raw texts, consumed lazily
+        batch_size (int): number of texts sent to a worker at a time
+        n_workers (int): number of worker processes; if None, use all available
+            CPUs; if 1, everything runs in the current process
+        max_in_flight (int): maximum number of batches being processed or
+            waiting to be yielded at any given time
+        **kwargs: passed to :func:`preprocess_text()`
+
+    Yields:
+        str: the next normalized text, in the same order as ``texts``
+    """
+    batches = partition_all(batch_size, texts)
+    if n_workers == 1:
+        results = (_preprocess_texts(batch, kwargs) for batch in batches)
+    else:
+        futures = bounded_imap(partial(_preprocess_texts, kwargs=kwargs), batches,
+                               n_workers=n_workers, use_processes=True,
+                               max_in_flight=max_in_flight)
+        results = (future.result() for _, future in futures)
+    for batch_results in results:
+        for text in batch_results:
+            yield text
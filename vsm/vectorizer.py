@@ -0,0 +1,270 @@
+"""
+Module for turning documents' extracted terms into a (sparse) term-document
+matrix without a vocabulary: each term is identified by its 64-bit spaCy
+``StringStore`` hash, which is mapped into a fixed number of feature columns
+with the "hashing trick", so memory use doesn't grow with the corpus.
+"""
+from functools import partial
+
+from cytoolz.itertoolz import partition_all
+import numpy as np
+from scipy.sparse import csr_matrix
+import spacy
+from spacy.strings import hash_string
+
+from infoextract import pipeline
+from utils import compat
+from utils.parallel import bounded_imap
+
+
+# vectorizer sent once per worker process by `_init_worker()`, rather than
+# pickled along with every batch
+_VECTORIZER = None
+
+
+def _init_worker(vectorizer, lang=None, disable=()):
+    global _VECTORIZER
+    _VECTORIZER = vectorizer
+    if lang is not None:
+        pipeline._init_worker(lang, disable)
+
+
+def term_hashes(terms, lowercase=False):
+    """
+    Get the 64-bit ``StringStore`` hash of each of ``terms``, as an array.
+
+    Args:
+        terms (Iterable[``spacy.Token`` or ``spacy.Span`` or str or int]): e.g. as
+            yielded by :func:`extract.words() <infoextract.extract.words>` or
+            :func:`extract.ngrams() <infoextract.extract.ngrams>`; ints are taken
+            to be hashes already
+        lowercase (bool): if True, hash the lower-cased form of each term
+            (ignored for ints)
+
+    Returns:
+        ``np.ndarray``: uint64 array with one hash per term
+    """
+    if isinstance(terms, np.ndarray):
+        return terms.astype(np.uint64, copy=False)
+    hashes = []
+    for term in terms:
+        if isinstance(term, compat.string_types):
+            hashes.append(hash_string(term.lower() if lowercase else term))
+        elif isinstance(term, (int, np.integer)):
+            hashes.append(term)
+        elif hasattr(term, 'start'):  # spacy.Span
+            hashes.append(hash_string(term.text.lower() if lowercase else term.text))
+        else:  # spacy.Token
+            hashes.append(term.lower if lowercase else term.orth)
+    return np.array(hashes, dtype=np.uint64)
+
+
+def normalize_rows(matrix, norm='l2'):
+    """
+    Scale each row of a ``scipy.sparse.csr_matrix`` with float values to unit
+    'l1' or 'l2' norm, in place; all-zero rows are left as-is.
+
+    Returns:
+        ``scipy.sparse.csr_matrix``: ``matrix``
+    """
+    row_lengths = np.diff(matrix.indptr)
+    values = np.abs(matrix.data) if norm == 'l1' else matrix.data ** 2
+    norms = np.bincount(np.repeat(np.arange(matrix.shape[0]), row_lengths),
+                        weights=values, minlength=matrix.shape[0])
+    if norm == 'l2':
+        norms = np.sqrt(norms)
+    norms[norms == 0] = 1
+    matrix.data /= np.repeat(norms, row_lengths).astype(matrix.dtype)
+    return matrix
+
+
+class HashingVectorizer(object):
+    """
+    Transform a stream of documents, each given as a sequence of terms, into
+    batches of rows of a term-document matrix, with terms mapped to columns by
+    their (64-bit spaCy) hashes modulo ``n_features``.
+
+    Args:
+        n_features (int): number of columns in the output matrix; distinct
+            terms whose hashes collide modulo ``n_features`` share a column
+        weighting (str): how term counts are weighted; one of
+            'tf': raw counts of each term in each doc
+            'tfidf': counts times the smoothed inverse document frequency
+                learned by :meth:`fit()`, i.e. ``log((1 + n_docs) / (1 + df)) + 1``
+            'binary': 1 if a term occurs in a doc, else 0
+        norm (str): if 'l1' or 'l2', normalize each row to unit norm
+        lowercase (bool): if True, terms are lower-cased before hashing
+        dtype (``numpy.dtype``): type of the output matrices' values
+
+    Example::
+
+        vectorizer = HashingVectorizer(weighting='tfidf', norm='l2')
+        vectorizer.fit(list(extract.words(doc)) for doc in docs)
+        for batch in vectorizer.transform(list(extract.words(doc)) for doc in docs):
+            writer.append(batch)  # see inputoutput.write.SparseMatrixWriter
+    """
+
+    def __init__(self, n_features=2 ** 20, weighting='tf', norm=None,
+                 lowercase=False, dtype=np.float64):
+        if weighting not in ('tf', 'tfidf', 'binary'):
+            msg = 'invalid `weighting` value: "{}"; valid values are {}'.format(
+                weighting, {'tf', 'tfidf', 'binary'})
+            raise ValueError(msg)
+        if norm not in (None, 'l1', 'l2'):
+            msg = 'invalid `norm` value: "{}"; valid values are {}'.format(
+                norm, {None, 'l1', 'l2'})
+            raise ValueError(msg)
+        self.n_features = n_features
+        self.weighting = weighting
+        self.norm = norm
+        self.lowercase = lowercase
+        self.dtype = dtype
+        self.n_docs = 0
+        self.doc_freqs = None
+        self.idf = None
+
+    def _columns(self, terms):
+        hashes = term_hashes(terms, lowercase=self.lowercase)
+        return (hashes % np.uint64(self.n_features)).astype(np.int64)
+
+    def fit(self, docs):
+        """
+        Count the number of docs in which each (hashed) term occurs, for use
+        in 'tfidf' weighting; may be called repeatedly to keep counting.
+
+        Args:
+            docs (Iterable[Iterable]): stream of docs, each an iterable of terms
+                (see :func:`term_hashes()`)
+
+        Returns:
+            :class:`HashingVectorizer`: self
+        """
+        if self.doc_freqs is None:
+            self.doc_freqs = np.zeros(self.n_features, dtype=np.int64)
+        for doc in docs:
+            self.doc_freqs[np.unique(self._columns(doc))] += 1
+            self.n_docs += 1
+        self.idf = np.log((1.0 + self.n_docs) / (1.0 + self.doc_freqs)) + 1.0
+        return self
+
+    def transform_batch(self, docs):
+        """
+        Transform a batch of docs into a ``scipy.sparse.csr_matrix`` of shape
+        (number of docs, ``n_features``), with weighting and normalization applied.
+
+        Raises:
+            ValueError: if ``weighting`` is 'tfidf' but :meth:`fit()` hasn't been called
+        """
+        if self.weighting == 'tfidf' and self.idf is None:
+            raise ValueError("vectorizer must be fit before 'tfidf' weighting can be applied")
+        cols = [self._columns(doc) for doc in docs]
+        lengths = np.array([len(c) for c in cols], dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        # duplicate (row, col) entries are summed into counts
+        matrix = csr_matrix((np.ones(len(cols), dtype=self.dtype), (rows, cols)),
+                            shape=(len(lengths), self.n_features))
+        matrix.sum_duplicates()
+        if self.weighting == 'binary':
+            matrix.data[:] = 1
+        elif self.weighting == 'tfidf':
+            matrix.data *= self.idf[matrix.indices]
+        if self.norm is not None:
+            normalize_rows(matrix, norm=self.norm)
+        return matrix
+
+    def transform(self, docs, batch_size=1000, n_workers=1, max_in_flight=None):
+        """
+        Transform a stream of docs into a stream of term-document matrices of
+        (up to) ``batch_size`` rows each, in the same order as ``docs``.
+
+        Args:
+            docs (Iterable[Iterable]): stream of docs, each an iterable of terms
+                (see :func:`term_hashes()`)
+            batch_size (int): number of docs per output matrix
+            n_workers (int): if not 1, batches are transformed in parallel by this
+                many worker processes, in which case terms must be picklable,
+                i.e. strings or hashes rather than ``spacy.Token`` s or ``spacy.Span`` s
+            max_in_flight (int): maximum number of batches being transformed or
+                waiting to be yielded at any given time
+
+        Yields:
+            ``scipy.sparse.csr_matrix``: next batch of rows
+        """
+        batches = partition_all(batch_size, docs)
+        if n_workers == 1:
+            for batch in batches:
+                yield self.transform_batch(batch)
+        else:
+            futures = bounded_imap(_transform_batch, batches,
+                                   n_workers=n_workers, use_processes=True,
+                                   max_in_flight=max_in_flight,
+                                   initializer=_init_worker, initargs=(self,))
+            for _, future in futures:
+                yield future.result()
+
+
+def _transform_batch(docs):
+    return _VECTORIZER.transform_batch(docs)
+
+
+def _vectorize_texts(texts, extractors, vectorizer=None, nlp=None):
+    nlp = nlp or pipeline._NLP
+    vectorizer = vectorizer or _VECTORIZER
+    as_ = 'lower_hash' if vectorizer.lowercase else 'hash'
+    docs = ([h for features in pipeline.extract_doc(doc, extractors, as_=as_).values()
+             for h in features]
+            for doc in nlp.pipe(texts, batch_size=len(texts)))
+    return vectorizer.transform_batch(docs)
+
+
+def vectorize_corpus(texts,
+                     lang,
+                     vectorizer,
+                     extractors=('words',),
+                     batch_size=1000,
+                     n_process=None,
+                     max_in_flight=None,
+                     disable=()):
+    """
+    Parse, extract terms from, and vectorize a stream of texts, with each
+    worker process turning a batch of ``batch_size`` texts all the way into
+    a term-document matrix, so that only compact sparse matrices are sent
+    back to the main process.
+
+    Args:
+        texts (Iterable[str]): stream of texts, consumed lazily
+        lang (str or ``spacy.Language``): name of or path to a spaCy pipeline;
+            see :func:`extract_corpus() <infoextract.pipeline.extract_corpus>`
+        vectorizer (:class:`HashingVectorizer`): if its weighting is 'tfidf',
+            it must already be fit
+        extractors (str or Set[str] or Dict[str, dict]): extractors whose terms
+            are vectorized, all in the same bag; see
+            :func:`extract_corpus() <infoextract.pipeline.extract_corpus>`
+        batch_size (int): number of texts per output matrix
+        n_process (int): number of worker processes; if None, use all available
+            CPUs; if 1, everything runs in the current process
+        max_in_flight (int): maximum number of batches being processed or
+            waiting to be yielded at any given time
+        disable (Iterable[str]): names of pipeline components to disable
+
+    Yields:
+        ``scipy.sparse.csr_matrix``: next batch of rows, in the same order as ``texts``
+    """
+    extractors = pipeline._parse_extractors(extractors)
+    batches = (list(batch) for batch in partition_all(batch_size, texts))
+    if n_process == 1:
+        nlp = spacy.load(lang, disable=disable) if isinstance(lang, compat.string_types) else lang
+        for batch in batches:
+            yield _vectorize_texts(batch, extractors, vectorizer, nlp=nlp)
+    else:
+        if not isinstance(lang, compat.string_types):
+            raise TypeError('`lang` must be a str if `n_process` is not 1')
+        futures = bounded_imap(partial(_vectorize_texts, extractors=extractors),
+                               batches,
+                               n_workers=n_process, use_processes=True,
+                               max_in_flight=max_in_flight,
+                               initializer=_init_worker,
+                               initargs=(vectorizer, lang, list(disable)))
+        for _, future in futures:
+            yield future.result()
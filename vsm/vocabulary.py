@@ -0,0 +1,296 @@
+"""
+Module for a compact, array-backed vocabulary of corpus terms: rather than a
+Python dict of term strings, terms are stored as sorted 64-bit spaCy
+``StringStore`` hashes with their counts in parallel NumPy arrays, so that
+millions of terms (e.g. n-grams) cost only a few dozen bytes each.
+"""
+import json
+import os
+
+import numpy as np
+
+from inputoutput.read import read_json_lines
+from inputoutput.write import write_json_lines
+from utils import compat
+from vsm.vectorizer import term_hashes
+
+
+class Vocabulary(object):
+    """
+    Vocabulary of terms, each identified by its 64-bit spaCy ``StringStore``
+    hash, with term and document frequencies. A term's id is its position in
+    the sorted array of hashes, so ids are contiguous in ``[0, len(vocab))``.
+
+    Args:
+        lowercase (bool): if True, terms are lower-cased before hashing
+        buffer_size (int): number of term occurrences buffered before being
+            merged into the vocabulary's arrays
+        strings (``spacy.strings.StringStore``): if given, the string of every
+            added term is added to it, so that all terms -- including spans
+            such as n-grams, whose strings spacy doesn't store -- can later be
+            resolved by :meth:`get_strings()`
+
+    Attributes:
+        keys (``np.ndarray``): sorted uint64 term hashes
+        counts (``np.ndarray``): int64 total number of occurrences of each term
+        doc_freqs (``np.ndarray``): int64 number of docs in which each term occurs
+        n_docs (int): number of docs added
+
+    Example::
+
+        vocab = Vocabulary()
+        vocab.add_docs(extract.words(doc) for doc in docs)
+        vocab.prune(min_freq=5, max_df=0.5)
+        vocab.to_disk('vocab', strings=nlp.vocab.strings)
+        rows = (vocab.term_counts(extract.words(doc)) for doc in docs)
+        write_sparse_matrix_rows(rows, 'doc_term_matrix.npz', n_cols=len(vocab))
+    """
+
+    def __init__(self, lowercase=False, buffer_size=2 ** 20, strings=None):
+        self.lowercase = lowercase
+        self.buffer_size = buffer_size
+        self.strings = strings
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.doc_freqs = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+        self._buffer = []
+        self._buffer_len = 0
+
+    def __len__(self):
+        self._flush()
+        return self.keys.shape[0]
+
+    def __contains__(self, term):
+        return bool(self.term_ids([term])[0] >= 0)
+
+    def add_doc(self, terms):
+        """
+        Add the terms of one doc to the vocabulary.
+
+        Args:
+            terms (Iterable[``spacy.Token`` or ``spacy.Span`` or str or int]): e.g.
+                as yielded by :func:`extract.words() <infoextract.extract.words>`;
+                see :func:`term_hashes() <vsm.vectorizer.term_hashes>`
+        """
+        if self.strings is not None:
+            terms = list(terms)
+            for term in terms:
+                if not isinstance(term, (int, np.integer)):
+                    text = term if isinstance(term, compat.string_types) else term.text
+                    self.strings.add(text.lower() if self.lowercase else text)
+        hashes = term_hashes(terms, lowercase=self.lowercase)
+        self._buffer.append(hashes)
+        self._buffer_len += hashes.shape[0]
+        self.n_docs += 1
+        if self._buffer_len >= self.buffer_size:
+            self._flush()
+
+    def add_docs(self, docs):
+        """
+        Add the terms of each of a stream of docs to the vocabulary.
+
+        Returns:
+            :class:`Vocabulary`: self
+        """
+        for terms in docs:
+            self.add_doc(terms)
+        self._flush()
+        return self
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        doc_ids = np.repeat(np.arange(len(self._buffer)), [h.shape[0] for h in self._buffer])
+        hashes = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffer_len = 0
+        keys, inverse, counts = np.unique(hashes, return_inverse=True, return_counts=True)
+        # each distinct (doc, term) pair counts once towards a term's doc freq
+        doc_terms = np.unique(doc_ids * keys.shape[0] + inverse.ravel())
+        doc_freqs = np.bincount(doc_terms % keys.shape[0], minlength=keys.shape[0])
+        self.keys, self.counts, self.doc_freqs = _merge_arrays(
+            [(self.keys, self.counts, self.doc_freqs), (keys, counts, doc_freqs)])
+
+    def term_ids(self, terms):
+        """
+        Get the ids of ``terms``, vectorized over terms.
+
+        Args:
+            terms (Iterable[``spacy.Token`` or ``spacy.Span`` or str or int])
+
+        Returns:
+            ``np.ndarray``: int64 array of term ids, with -1 for terms not in
+                the vocabulary
+        """
+        self._flush()
+        hashes = term_hashes(terms, lowercase=self.lowercase)
+        if self.keys.shape[0] == 0:
+            return np.full(hashes.shape[0], -1, dtype=np.int64)
+        ids = np.searchsorted(self.keys, hashes).clip(max=self.keys.shape[0] - 1)
+        return np.where(self.keys[ids] == hashes, ids, -1).astype(np.int64)
+
+    def term_counts(self, terms):
+        """
+        Count the in-vocabulary ``terms`` of a single doc, e.g. to build a row of
+        a doc-term matrix with :class:`SparseMatrixWriter <inputoutput.write.SparseMatrixWriter>`.
+
+        Returns:
+            List[Tuple[int, int]]: (term id, count) pairs, sorted by term id
+        """
+        ids = self.term_ids(terms)
+        ids, counts = np.unique(ids[ids >= 0], return_counts=True)
+        return list(zip(ids.tolist(), counts.tolist()))
+
+    def prune(self, min_freq=1, min_df=1, max_df=1.0, max_n_terms=None):
+        """
+        Remove infrequent and/or too-common terms from the vocabulary, in place.
+        Note that term ids change as a result.
+
+        Args:
+            min_freq (int): remove terms occurring fewer than this many times
+            min_df (int or float): remove terms occurring in fewer than this many
+                docs, or fraction of docs if a float
+            max_df (int or float): remove terms occurring in more than this many
+                docs, or fraction of docs if a float
+            max_n_terms (int): if not None, keep only this many terms, those with
+                the highest counts
+
+        Returns:
+            :class:`Vocabulary`: self
+        """
+        self._flush()
+        if isinstance(min_df, float):
+            min_df = int(np.ceil(min_df * self.n_docs))
+        if isinstance(max_df, float):
+            max_df = int(np.floor(max_df * self.n_docs))
+        keep = ((self.counts >= min_freq) &
+                (self.doc_freqs >= min_df) &
+                (self.doc_freqs <= max_df))
+        if max_n_terms is not None and keep.sum() > max_n_terms:
+            kept = np.flatnonzero(keep)
+            # stable sort => ties are broken by (arbitrary but fixed) hash order
+            top = kept[np.argsort(-self.counts[kept], kind='mergesort')[:max_n_terms]]
+            keep = np.zeros_like(keep)
+            keep[top] = True
+        self.keys = self.keys[keep]
+        self.counts = self.counts[keep]
+        self.doc_freqs = self.doc_freqs[keep]
+        return self
+
+    def merge(self, *others):
+        """
+        Merge other vocabularies, e.g. built by parallel workers over different
+        parts of a corpus, into this one, in place.
+
+        Returns:
+            :class:`Vocabulary`: self
+        """
+        self._flush()
+        for other in others:
+            other._flush()
+        self.keys, self.counts, self.doc_freqs = _merge_arrays(
+            [(vocab.keys, vocab.counts, vocab.doc_freqs) for vocab in (self,) + others])
+        self.n_docs += sum(other.n_docs for other in others)
+        return self
+
+    def get_strings(self, strings=None):
+        """
+        Get the string of each term in the vocabulary, in order of term id.
+
+        Args:
+            strings (``spacy.strings.StringStore``): e.g. ``nlp.vocab.strings``
+                or the ``strings`` this vocabulary was created with; if None,
+                the latter is used
+
+        Returns:
+            List[str]
+
+        Raises:
+            KeyError: if a term's hash isn't in ``strings``
+        """
+        self._flush()
+        strings = strings if strings is not None else self.strings
+        return [strings[key] for key in self.keys.tolist()]
+
+    def to_disk(self, dirpath, strings=None):
+        """
+        Save the vocabulary's arrays as ``.npy`` files in directory ``dirpath``,
+        which can later be memory-mapped by :meth:`from_disk()`.
+
+        Args:
+            dirpath (str): /path/to/dir on disk, created if needed
+            strings (``spacy.strings.StringStore``): if given, the strings of
+                all terms are saved as well, to be restored into a
+                ``StringStore`` by :meth:`from_disk()`
+        """
+        self._flush()
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        np.save(os.path.join(dirpath, 'keys.npy'), self.keys)
+        np.save(os.path.join(dirpath, 'counts.npy'), self.counts)
+        np.save(os.path.join(dirpath, 'doc_freqs.npy'), self.doc_freqs)
+        with open(os.path.join(dirpath, 'meta.json'), mode='wt') as f:
+            json.dump({'n_docs': self.n_docs, 'lowercase': self.lowercase}, f)
+        if strings is not None:
+            write_json_lines(self.get_strings(strings), os.path.join(dirpath, 'strings.jsonl'))
+
+    @classmethod
+    def from_disk(cls, dirpath, mmap_mode=None, strings=None):
+        """
+        Load a vocabulary saved by :meth:`to_disk()`.
+
+        Args:
+            dirpath (str): /path/to/dir on disk
+            mmap_mode (str): if not None, memory-map the arrays with this mode
+                (see ``numpy.load``), e.g. 'r' to share them across processes
+            strings (``spacy.strings.StringStore``): if given, and terms' strings
+                were saved, they're added to this ``StringStore``
+
+        Returns:
+            :class:`Vocabulary`
+        """
+        with open(os.path.join(dirpath, 'meta.json'), mode='rt') as f:
+            meta = json.load(f)
+        vocab = cls(lowercase=meta['lowercase'])
+        vocab.n_docs = meta['n_docs']
+        vocab.keys = np.load(os.path.join(dirpath, 'keys.npy'), mmap_mode=mmap_mode)
+        vocab.counts = np.load(os.path.join(dirpath, 'counts.npy'), mmap_mode=mmap_mode)
+        vocab.doc_freqs = np.load(os.path.join(dirpath, 'doc_freqs.npy'), mmap_mode=mmap_mode)
+        strings_filepath = os.path.join(dirpath, 'strings.jsonl')
+        if strings is not None and os.path.exists(strings_filepath):
+            for string in read_json_lines(strings_filepath):
+                strings.add(string)
+        return vocab
+
+
+def _merge_arrays(arrays):
+    """
+    Merge (keys, counts, doc_freqs) array triples, summing counts and doc freqs
+    of identical keys; keys of the result are sorted and unique.
+    """
+    keys = np.concatenate([keys for keys, _, _ in arrays])
+    counts = np.concatenate([counts for _, counts, _ in arrays])
+    doc_freqs = np.concatenate([doc_freqs for _, _, doc_freqs in arrays])
+    keys, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+    # float64 weights sum int64 counts exactly up to 2**53
+    merged_counts = np.bincount(inverse, weights=counts, minlength=keys.shape[0])
+    merged_doc_freqs = np.bincount(inverse, weights=doc_freqs, minlength=keys.shape[0])
+    return keys, merged_counts.astype(np.int64), merged_doc_freqs.astype(np.int64)
+
+
+def merge_vocabularies(vocabs):
+    """
+    Merge vocabularies, e.g. built by parallel workers over different parts of
+    a corpus, into a new one.
+
+    Args:
+        vocabs (Iterable[:class:`Vocabulary`])
+
+    Returns:
+        :class:`Vocabulary`
+    """
+    vocabs = list(vocabs)
+    merged = Vocabulary(lowercase=vocabs[0].lowercase if vocabs else False)
+    return merged.merge(*vocabs)
@@ -0,0 +1,328 @@
+"""
+Module for training count-based word embeddings on a corpus, on CPUs alone:
+docs' words are streamed into on-disk shards of token hashes, windowed word
+co-occurrences are counted per shard in parallel into sparse matrices and
+merged, and the merged counts are weighted by positive pointwise mutual
+information (PPMI) and factored by randomized truncated SVD.
+"""
+from functools import partial
+import os
+
+from cytoolz.itertoolz import partition_all
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+import spacy
+from spacy.attrs import LOWER
+from spacy.strings import StringStore
+
+from infoextract import pipeline
+from infoextract.vectorized import token_attrs, word_mask
+from utils import compat
+from utils.parallel import bounded_imap
+from vsm.vocabulary import Vocabulary
+from wordembedding.embeddings import write_embeddings
+
+
+def _tokenize_batch(texts, words, nlp=None):
+    """
+    Parse ``texts`` and get the lower-cased hashes of their words, plus the
+    strings of all distinct hashes.
+    """
+    nlp = nlp or pipeline._NLP
+    hashes = []
+    for doc in nlp.pipe(texts, batch_size=len(texts)):
+        hashes.append(doc.to_array(LOWER)[word_mask(token_attrs(doc), **words)].astype(np.uint64))
+    lengths = np.array([h.shape[0] for h in hashes], dtype=np.int64)
+    hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+    strings = {key: nlp.vocab.strings[key] for key in np.unique(hashes).tolist()}
+    return hashes, lengths, strings
+
+
+def tokenize_corpus(texts,
+                    lang,
+                    dirpath,
+                    words=None,
+                    batch_size=10000,
+                    n_process=None,
+                    max_in_flight=None,
+                    disable=()):
+    """
+    Parse a stream of texts and save their words, as lower-cased hashes, into
+    shards of ``.npy`` files in ``dirpath``, one per batch of texts; count
+    words into a :class:`Vocabulary <vsm.vocabulary.Vocabulary>` along the way.
+
+    Args:
+        texts (Iterable[str]): stream of texts, e.g. the 'text' field of each
+            record of a JSONL file read by
+            :func:`read_json_lines() <inputoutput.read.read_json_lines>`
+        lang (str or ``spacy.Language``): name of or path to a spaCy pipeline;
+            see :func:`extract_corpus() <infoextract.pipeline.extract_corpus>`
+        dirpath (str): /path/to/dir on disk, created if needed
+        words (dict): keyword arguments for the word filters of
+            :func:`extract.words() <infoextract.extract.words>`; by default,
+            only punctuation is removed, since stop words are useful context
+        batch_size (int): number of texts per worker batch, and per shard
+        n_process (int): number of worker processes; if None, use all available
+            CPUs; if 1, everything runs in the current process
+        max_in_flight (int): maximum number of batches being processed or
+            waiting to be saved at any given time
+        disable (Iterable[str]): names of pipeline components to disable;
+            words need only a tokenizer (and attribute ruler for stop words)
+
+    Returns:
+        Tuple[:class:`Vocabulary <vsm.vocabulary.Vocabulary>`, ``spacy.strings.StringStore``]:
+            counts of all words, and their strings
+    """
+    words = words if words is not None else {'filter_stops': False}
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+    batches = (list(batch) for batch in partition_all(batch_size, texts))
+    if n_process == 1:
+        nlp = spacy.load(lang, disable=disable) if isinstance(lang, compat.string_types) else lang
+        results = (_tokenize_batch(batch, words, nlp=nlp) for batch in batches)
+    else:
+        if not isinstance(lang, compat.string_types):
+            raise TypeError('`lang` must be a str if `n_process` is not 1')
+        futures = bounded_imap(partial(_tokenize_batch, words=words), batches,
+                               n_workers=n_process, use_processes=True,
+                               max_in_flight=max_in_flight,
+                               initializer=pipeline._init_worker,
+                               initargs=(lang, list(disable)))
+        results = (future.result() for _, future in futures)
+
+    vocab = Vocabulary()
+    strings = StringStore()
+    for i, (hashes, lengths, batch_strings) in enumerate(results):
+        np.save(os.path.join(dirpath, 'tokens_{:05d}.npy'.format(i)), hashes)
+        np.save(os.path.join(dirpath, 'doc_lengths_{:05d}.npy'.format(i)), lengths)
+        for string in batch_strings.values():
+            strings.add(string)
+        for doc_hashes in np.split(hashes, np.cumsum(lengths)[:-1]):
+            vocab.add_doc(doc_hashes)
+    vocab._flush()
+    return vocab, strings
+
+
+def get_shard_ids(dirpath):
+    """Get the ids of all token shards saved in ``dirpath`` by :func:`tokenize_corpus()`."""
+    return sorted(int(fname[len('tokens_'): -len('.npy')]) for fname in os.listdir(dirpath)
+                  if fname.startswith('tokens_') and fname.endswith('.npy'))
+
+
+def _shard_cooccurrences(shard_id, dirpath, vocab_dirpath, window_size, weighting):
+    vocab = Vocabulary.from_disk(vocab_dirpath, mmap_mode='r')
+    hashes = np.load(os.path.join(dirpath, 'tokens_{:05d}.npy'.format(shard_id)))
+    lengths = np.load(os.path.join(dirpath, 'doc_lengths_{:05d}.npy'.format(shard_id)))
+    return shard_cooccurrences(vocab.term_ids(hashes), lengths, len(vocab),
+                               window_size=window_size, weighting=weighting)
+
+
+def shard_cooccurrences(ids, doc_lengths, n_terms, window_size=5, weighting='harmonic'):
+    """
+    Count the windowed co-occurrences of terms within each of a shard's docs,
+    vectorized over all tokens of the shard at once: for each distance d up to
+    ``window_size``, every token is paired with the one d positions later.
+
+    Args:
+        ids (``np.ndarray``): term id of each token of all docs, back to back,
+            or -1 for terms not in the vocabulary, which are dropped beforehand
+            (so windows span over them)
+        doc_lengths (``np.ndarray``): number of tokens in each doc
+        n_terms (int): number of terms in the vocabulary
+        window_size (int): maximum distance between co-occurring tokens
+        weighting (str): 'harmonic' to weight co-occurrences at distance d by
+            1 / d, as in GloVe, or 'uniform' to count them all as 1
+
+    Returns:
+        ``scipy.sparse.csr_matrix``: symmetric float64 matrix of shape
+            (``n_terms``, ``n_terms``) of co-occurrence counts
+    """
+    if weighting not in ('harmonic', 'uniform'):
+        msg = 'invalid `weighting` value: "{}"; valid values are {}'.format(
+            weighting, {'harmonic', 'uniform'})
+        raise ValueError(msg)
+    doc_ids = np.repeat(np.arange(doc_lengths.shape[0]), doc_lengths)
+    in_vocab = ids >= 0
+    ids, doc_ids = ids[in_vocab], doc_ids[in_vocab]
+    rows, cols, weights = [], [], []
+    for distance in range(1, window_size + 1):
+        same_doc = doc_ids[:-distance] == doc_ids[distance:]
+        rows.append(ids[:-distance][same_doc])
+        cols.append(ids[distance:][same_doc])
+        weight = 1.0 / distance if weighting == 'harmonic' else 1.0
+        weights.append(np.full(rows[-1].shape[0], weight, dtype=np.float64))
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float64)
+    # count each pair in both directions; duplicates are summed by tocsr()
+    return coo_matrix((np.concatenate((weights, weights)),
+                       (np.concatenate((rows, cols)), np.concatenate((cols, rows)))),
+                      shape=(n_terms, n_terms)).tocsr()
+
+
+def cooccurrence_matrix(dirpath, vocab_dirpath, window_size=5, weighting='harmonic',
+                        n_workers=None, max_in_flight=None):
+    """
+    Count the windowed co-occurrences of vocabulary terms in all token shards
+    in ``dirpath``, one shard per worker process at a time, and merge them.
+
+    Args:
+        dirpath (str): /path/to/dir of shards saved by :func:`tokenize_corpus()`
+        vocab_dirpath (str): /path/to/dir of a (pruned) vocabulary saved by
+            :meth:`Vocabulary.to_disk() <vsm.vocabulary.Vocabulary.to_disk>`,
+            which workers memory-map
+        window_size (int), weighting (str): see :func:`shard_cooccurrences()`
+        n_workers (int): number of worker processes; if None, use all available CPUs
+        max_in_flight (int): maximum number of shard matrices being counted
+            or waiting to be merged at any given time
+
+    Returns:
+        ``scipy.sparse.csr_matrix``: symmetric float64 matrix of co-occurrence counts
+    """
+    n_terms = len(Vocabulary.from_disk(vocab_dirpath, mmap_mode='r'))
+    merged = csr_matrix((n_terms, n_terms), dtype=np.float64)
+    futures = bounded_imap(partial(_shard_cooccurrences, dirpath=dirpath,
+                                   vocab_dirpath=vocab_dirpath,
+                                   window_size=window_size, weighting=weighting),
+                           get_shard_ids(dirpath),
+                           n_workers=n_workers, use_processes=True, ordered=False,
+                           max_in_flight=max_in_flight)
+    for _, future in futures:
+        merged = merged + future.result()
+    return merged
+
+
+def ppmi_matrix(cooccurrences, alpha=0.75, shift=1.0):
+    """
+    Weight a matrix of co-occurrence counts by positive pointwise mutual
+    information, ``max(log(p(w, c) / (p(w) p_alpha(c))) - log(shift), 0)``,
+    vectorized over its non-zero values.
+
+    Args:
+        cooccurrences (``scipy.sparse.csr_matrix``)
+        alpha (float): exponent with which context counts are smoothed, which
+            reduces PMI's bias towards rare contexts
+        shift (float): PMI values are shifted down by ``log(shift)``, as with
+            ``shift`` negative samples in word2vec
+
+    Returns:
+        ``scipy.sparse.csr_matrix``: float32 PPMI matrix, with no explicit zeros
+    """
+    matrix = csr_matrix(cooccurrences, dtype=np.float64, copy=True)
+    matrix.sum_duplicates()
+    total = matrix.data.sum()
+    word_counts = np.asarray(matrix.sum(axis=1)).ravel()
+    context_counts = np.asarray(matrix.sum(axis=0)).ravel() ** alpha
+    context_probs = context_counts / context_counts.sum()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    pmi = (np.log(matrix.data) - np.log(total) - np.log(word_counts[rows] / total)
+           - np.log(context_probs[matrix.indices]) - np.log(shift))
+    matrix.data = np.maximum(pmi, 0.0)
+    matrix.eliminate_zeros()
+    return matrix.astype(np.float32)
+
+
+def randomized_svd(matrix, n_components, n_oversamples=10, n_iter=4, seed=0):
+    """
+    Compute a truncated SVD of a (sparse) matrix by randomized range finding
+    with power iterations (Halko, Martinsson & Tropp, 2011), using only
+    products with ``matrix`` and dense linear algebra on small matrices.
+
+    Args:
+        matrix (``scipy.sparse.spmatrix`` or ``np.ndarray``)
+        n_components (int): number of singular values and vectors
+        n_oversamples (int): number of extra random vectors, for accuracy
+        n_iter (int): number of power iterations, for accuracy on matrices
+            whose singular values decay slowly
+        seed (int): random seed
+
+    Returns:
+        Tuple[``np.ndarray``, ``np.ndarray``, ``np.ndarray``]: left singular
+            vectors, singular values, and right singular vectors (as rows)
+    """
+    rng = np.random.RandomState(seed)
+    n_random = min(n_components + n_oversamples, min(matrix.shape))
+    q = matrix.dot(rng.standard_normal((matrix.shape[1], n_random)).astype(np.float32))
+    q, _ = np.linalg.qr(q)
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(matrix.T.dot(q))
+        q, _ = np.linalg.qr(matrix.dot(q))
+    b = np.asarray(matrix.T.dot(q)).T  # == q.T @ matrix
+    u_b, s, vt = np.linalg.svd(b, full_matrices=False)
+    return q.dot(u_b)[:, :n_components], s[:n_components], vt[:n_components]
+
+
+def svd_embeddings(ppmi, n_components=300, eig_weight=0.5, **kwargs):
+    """
+    Get word vectors from a PPMI matrix, as its left singular vectors scaled
+    by the singular values raised to ``eig_weight``.
+
+    Args:
+        ppmi (``scipy.sparse.csr_matrix``)
+        n_components (int): number of dimensions
+        eig_weight (float): 0.5 weights words and contexts symmetrically,
+            and usually works better than 1 (plain SVD) for word similarity
+        **kwargs: passed to :func:`randomized_svd()`
+
+    Returns:
+        ``np.ndarray``: float32 matrix of shape (number of words, ``n_components``)
+    """
+    u, s, _ = randomized_svd(ppmi, n_components, **kwargs)
+    return (u * s ** eig_weight).astype(np.float32)
+
+
+def train_embeddings(texts,
+                     lang,
+                     dirpath,
+                     min_freq=5,
+                     max_n_terms=100000,
+                     window_size=5,
+                     weighting='harmonic',
+                     alpha=0.75,
+                     shift=1.0,
+                     n_components=300,
+                     words=None,
+                     batch_size=10000,
+                     n_process=None,
+                     disable=()):
+    """
+    Train count-based word embeddings on a stream of texts, end to end:
+    :func:`tokenize_corpus()`, prune the vocabulary, :func:`cooccurrence_matrix()`,
+    :func:`ppmi_matrix()`, and :func:`svd_embeddings()`. Intermediate results
+    are kept under ``dirpath``, and the embeddings are saved in
+    ``dirpath/embeddings`` in the layout of :class:`Embeddings <wordembedding.embeddings.Embeddings>`.
+
+    Args:
+        texts (Iterable[str]): stream of texts
+        lang (str or ``spacy.Language``): see :func:`tokenize_corpus()`
+        dirpath (str): /path/to/dir on disk, created if needed
+        min_freq (int): words occurring fewer times get no vector
+        max_n_terms (int): maximum number of words with vectors, the most frequent ones
+        window_size (int), weighting (str): see :func:`shard_cooccurrences()`
+        alpha (float), shift (float): see :func:`ppmi_matrix()`
+        n_components (int): number of dimensions of the vectors
+        words (dict), batch_size (int), n_process (int), disable (Iterable[str]):
+            see :func:`tokenize_corpus()`
+
+    Returns:
+        ``np.ndarray``: vectors of all words in the pruned vocabulary
+
+    Example::
+
+        texts = (record['text'] for record in read_json_lines('corpus.jsonl'))
+        train_embeddings(texts, 'en_core_web_sm', 'domain_vectors', disable=('parser', 'ner'))
+        embeddings = Embeddings('domain_vectors/embeddings')
+    """
+    shards_dirpath = os.path.join(dirpath, 'shards')
+    vocab_dirpath = os.path.join(dirpath, 'vocab')
+    vocab, strings = tokenize_corpus(texts, lang, shards_dirpath, words=words,
+                                     batch_size=batch_size, n_process=n_process,
+                                     disable=disable)
+    vocab.prune(min_freq=min_freq, max_n_terms=max_n_terms)
+    vocab.to_disk(vocab_dirpath, strings=strings)
+    cooccurrences = cooccurrence_matrix(shards_dirpath, vocab_dirpath, window_size=window_size,
+                                        weighting=weighting, n_workers=n_process)
+    vectors = svd_embeddings(ppmi_matrix(cooccurrences, alpha=alpha, shift=shift),
+                             n_components=n_components)
+    write_embeddings(vocab.get_strings(strings), vectors, os.path.join(dirpath, 'embeddings'))
+    return vectors
@@ -0,0 +1,150 @@
+"""
+Module for turning docs' words (e.g. as extracted by :mod:`infoextract.extract`)
+into dense doc vectors from word embeddings, by mean or SIF (smooth inverse
+frequency) weighting, vectorized over a whole batch of docs: the words of all
+docs are concatenated into one ragged array, looked up at once, and summed per
+doc with ``np.add.reduceat``.
+"""
+import os
+
+import numpy as np
+
+from vsm.vectorizer import term_hashes
+
+WEIGHTINGS = ('mean', 'sif')
+
+
+def sif_principal_component(vectors):
+    """
+    Get the first principal component (first right singular vector, without
+    centering) of a matrix of doc vectors, which SIF removes from each of them.
+
+    Returns:
+        ``np.ndarray``: unit-length vector
+    """
+    _, _, vt = np.linalg.svd(np.asarray(vectors, dtype=np.float64), full_matrices=False)
+    return vt[0].astype(np.float32)
+
+
+def doc_vectors(docs, embeddings, weighting='mean', vocab=None, a=1e-3,
+                principal_component=None):
+    """
+    Get the vectors of a batch of docs, each the (weighted) average of the
+    embeddings of its words; words without embeddings are ignored, and docs
+    with none get all-zero vectors.
+
+    Args:
+        docs (Sequence[Iterable[``spacy.Token`` or str or int] or ``np.ndarray``]):
+            words of each doc, e.g. as yielded by :func:`extract.words() <infoextract.extract.words>`,
+            or arrays of their hashes; see :func:`term_hashes() <vsm.vectorizer.term_hashes>`
+        embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`)
+        weighting (str): how words' vectors are weighted; one of
+            'mean': equally
+            'sif': by ``a / (a + p(w))``, with word probabilities ``p(w)`` from
+                ``vocab``, after which the docs' first principal component is
+                removed (Arora, Liang & Ma, 2017)
+        vocab (:class:`Vocabulary <vsm.vocabulary.Vocabulary>`): word counts
+            in a corpus, built from the same kind of terms as ``docs``;
+            required for 'sif' weighting
+        a (float): SIF smoothing parameter; lower values down-weight
+            frequent words more
+        principal_component (``np.ndarray``): for 'sif' weighting, the component
+            to remove, e.g. computed once on a sample of a corpus by
+            :func:`sif_principal_component()`, so that all batches are
+            treated alike; if None, it's computed from this batch; if False,
+            none is removed
+
+    Returns:
+        ``np.ndarray``: float32 matrix of shape (number of docs, number of dimensions)
+    """
+    if weighting not in WEIGHTINGS:
+        msg = 'invalid `weighting` value: "{}"; valid values are {}'.format(weighting, WEIGHTINGS)
+        raise ValueError(msg)
+    if weighting == 'sif' and vocab is None:
+        raise ValueError("`vocab` is required for 'sif' weighting")
+    hashes = [term_hashes(doc) for doc in docs]
+    lengths = np.array([h.shape[0] for h in hashes], dtype=np.int64)
+    hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+    rows = embeddings.lookup(hashes)
+    found = rows >= 0
+    doc_ids = np.repeat(np.arange(lengths.shape[0]), lengths)[found]
+    rows = rows[found]
+
+    vectors = embeddings.vectors[rows].astype(np.float32)
+    if weighting == 'sif':
+        ids = vocab.term_ids(hashes[found])
+        probs = np.where(ids >= 0, vocab.counts[ids] / float(max(vocab.counts.sum(), 1)), 0.0)
+        vectors *= (a / (a + probs)).astype(np.float32)[:, None]
+
+    # sum the (contiguous) words of each doc that has any
+    counts = np.bincount(doc_ids, minlength=lengths.shape[0])
+    nonempty = counts > 0
+    starts = (np.cumsum(counts) - counts)[nonempty]
+    result = np.zeros((lengths.shape[0], embeddings.dim), dtype=np.float32)
+    if starts.shape[0]:
+        result[nonempty] = np.add.reduceat(vectors, starts, axis=0) / counts[nonempty][:, None]
+
+    if weighting == 'sif' and principal_component is not False:
+        if principal_component is None:
+            if not nonempty.any():
+                return result
+            principal_component = sif_principal_component(result[nonempty])
+        result -= np.outer(result.dot(principal_component), principal_component)
+    return result
+
+
+def write_doc_vectors(docs, embeddings, dirpath, batch_size=10000, weighting='mean',
+                      vocab=None, a=1e-3, principal_component=None):
+    """
+    Get the vectors of a stream of docs (see :func:`doc_vectors()`), a batch
+    at a time, and save them into ``.npy`` shards of ``batch_size`` rows each,
+    e.g. to be memory-mapped and clustered.
+
+    Args:
+        docs (Iterable[Iterable[``spacy.Token`` or str or int] or ``np.ndarray``]):
+            stream of docs' words, e.g. the 'words' of each result of
+            :func:`extract_corpus() <infoextract.pipeline.extract_corpus>` with
+            ``as_='hash'``
+        embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`)
+        dirpath (str): /path/to/dir on disk, created if needed; shards are
+            named 'vectors_00000.npy', 'vectors_00001.npy', etc.
+        batch_size (int): number of docs per shard
+        weighting, vocab, a: see :func:`doc_vectors()`
+        principal_component (``np.ndarray``): see :func:`doc_vectors()`; if None
+            and ``weighting`` is 'sif', it's computed from the first batch and
+            used for all of them, and saved as 'principal_component.npy'
+
+    Returns:
+        List[str]: filepaths of all shards, in order
+    """
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+    filepaths = []
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            principal_component = _write_batch(batch, embeddings, dirpath, filepaths, weighting,
+                                               vocab, a, principal_component)
+            batch = []
+    if batch:
+        _write_batch(batch, embeddings, dirpath, filepaths, weighting, vocab, a, principal_component)
+    return filepaths
+
+
+def _write_batch(batch, embeddings, dirpath, filepaths, weighting, vocab, a, principal_component):
+    if weighting == 'sif' and principal_component is None:
+        vectors = doc_vectors(batch, embeddings, weighting=weighting, vocab=vocab, a=a,
+                              principal_component=False)
+        nonempty = np.any(vectors != 0, axis=1)
+        if nonempty.any():
+            principal_component = sif_principal_component(vectors[nonempty])
+            np.save(os.path.join(dirpath, 'principal_component.npy'), principal_component)
+            vectors -= np.outer(vectors.dot(principal_component), principal_component)
+    else:
+        vectors = doc_vectors(batch, embeddings, weighting=weighting, vocab=vocab, a=a,
+                              principal_component=principal_component)
+    filepath = os.path.join(dirpath, 'vectors_{:05d}.npy'.format(len(filepaths)))
+    np.save(filepath, vectors)
+    filepaths.append(filepath)
+    return principal_component
@@ -0,0 +1,357 @@
+"""
+Module for word embeddings stored on disk in a memory-mappable layout: a
+float32 (or float16) ``.npy`` matrix of vectors, plus a vocabulary index of
+sorted 64-bit spaCy ``StringStore`` hashes and a blob of UTF-8 words. Files in
+word2vec (binary or text), fastText ``.vec``, and GloVe formats are converted
+into this layout once, after which any number of processes can open it near
+instantly and share one copy of it through the OS page cache.
+"""
+from itertools import islice
+import json
+import os
+
+import numpy as np
+from spacy.strings import hash_string
+
+from inputoutput.util import open_sesame
+from vsm.vectorizer import term_hashes
+
+EMBEDDING_FORMATS = ('bin', 'text', 'glove')
+
+
+def _detect_format(filepath):
+    """
+    Guess the format of an embeddings file: word2vec 'bin' from its extension,
+    otherwise 'text' (word2vec / fastText) if its first line is a header of
+    two integers, else 'glove'.
+    """
+    name = os.path.basename(filepath).lower()
+    for ext in ('.gz', '.bz2', '.xz'):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    if name.endswith('.bin'):
+        return 'bin'
+    with open_sesame(filepath, mode='rb') as f:
+        first_line = f.readline().split()
+    if len(first_line) == 2 and all(field.isdigit() for field in first_line):
+        return 'text'
+    return 'glove'
+
+
+def _count_lines(filepath, blocksize=2 ** 24):
+    n_lines = 0
+    with open_sesame(filepath, mode='rb') as f:
+        block = f.read(blocksize)
+        last = b''
+        while block:
+            n_lines += block.count(b'\n')
+            last = block
+            block = f.read(blocksize)
+    return n_lines + (1 if last and not last.endswith(b'\n') else 0)
+
+
+def _read_text_chunks(f, dim, chunk_size):
+    """
+    Read (words, vectors) chunks from a text embeddings file positioned at its
+    first vector; each line's last ``dim`` fields are its vector, the rest its
+    word (which may contain spaces).
+    """
+    while True:
+        lines = [line for line in islice(f, chunk_size) if line.strip()]
+        if not lines:
+            return
+        words = []
+        values = []
+        for line in lines:
+            fields = line.rstrip().rsplit(b' ', dim)
+            words.append(fields[0])
+            values.append(line[len(fields[0]) + 1:])
+        # parse all values of the chunk at once, in C
+        vectors = np.fromstring(b' '.join(values), dtype=np.float32, sep=' ')
+        if vectors.shape[0] != len(words) * dim:
+            msg = 'vectors in lines {!r}... do not all have {} values'.format(lines[0][:50], dim)
+            raise ValueError(msg)
+        yield words, vectors.reshape(len(words), dim)
+
+
+def _read_bin_chunks(f, n_words, dim, chunk_size, blocksize=2 ** 24):
+    """
+    Read (words, vectors) chunks from a word2vec binary file positioned after
+    its header line: each word is followed by a space and ``dim`` little-endian
+    float32 values, and optionally by a newline.
+    """
+    n_bytes = dim * 4
+    buf = b''
+    pos = 0
+    n_read = 0
+    while n_read < n_words:
+        words = []
+        vectors = np.zeros((min(chunk_size, n_words - n_read), dim), dtype=np.float32)
+        for i in range(vectors.shape[0]):
+            space = buf.find(b' ', pos)
+            while space < 0 or len(buf) < space + 1 + n_bytes:
+                block = f.read(blocksize)
+                if not block:
+                    raise ValueError('unexpected end of file after {} words'.format(n_read + i))
+                buf = buf[pos:] + block
+                pos = 0
+                space = buf.find(b' ', pos)
+            words.append(buf[pos: space].lstrip(b'\n'))
+            vectors[i] = np.frombuffer(buf, dtype='<f4', count=dim, offset=space + 1)
+            pos = space + 1 + n_bytes
+        n_read += vectors.shape[0]
+        yield words, vectors
+
+
+def _write_index(words, dirpath, errors='strict'):
+    """
+    Write the vocabulary index of ``words`` (bytes, in row order) into ``dirpath``:
+    sorted unique word hashes, the row of each, and the words themselves as
+    one UTF-8 blob with offsets. Where words are duplicated, the first row wins.
+    """
+    words = [word.decode('utf-8', errors).encode('utf-8') if isinstance(word, bytes)
+             else word.encode('utf-8')
+             for word in words]
+    hashes = np.array([hash_string(word.decode('utf-8')) for word in words], dtype=np.uint64)
+    keys, rows = np.unique(hashes, return_index=True)
+    np.save(os.path.join(dirpath, 'keys.npy'), keys)
+    np.save(os.path.join(dirpath, 'rows.npy'), rows.astype(np.int64))
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(word) for word in words])
+    np.save(os.path.join(dirpath, 'word_offsets.npy'), offsets)
+    with open(os.path.join(dirpath, 'words.bin'), mode='wb') as f:
+        f.write(b''.join(words))
+
+
+def _write_meta(dirpath, n_words, dim, dtype):
+    with open(os.path.join(dirpath, 'meta.json'), mode='wt') as f:
+        json.dump({'n_words': n_words, 'dim': dim, 'dtype': np.dtype(dtype).name}, f)
+
+
+def convert_embeddings(filepath,
+                       dirpath,
+                       fmt=None,
+                       dtype=np.float32,
+                       max_words=None,
+                       errors='strict',
+                       chunk_size=100000):
+    """
+    Convert a word embeddings file into the memory-mappable layout read by
+    :class:`Embeddings`, streaming it in chunks so that the whole matrix is
+    never held in memory.
+
+    Args:
+        filepath (str): /path/to/file on disk; may be compressed (see
+            :func:`open_sesame() <inputoutput.util.open_sesame>`)
+        dirpath (str): /path/to/dir on disk into which the converted embeddings
+            are written, created if needed
+        fmt (str): format of ``filepath``; one of
+            'bin': word2vec binary
+            'text': word2vec text or fastText ``.vec``, with a header line
+                giving the number of words and of dimensions
+            'glove': GloVe text, with no header line
+            if None, the format is guessed from the file's name and first line
+        dtype (``numpy.dtype``): type of the stored vectors, e.g. ``np.float16``
+            to halve their size
+        max_words (int): if not None, only convert the first this many words,
+            which in most files are the most frequent ones
+        errors (str): how words that aren't valid UTF-8 are decoded (see
+            ``bytes.decode``); word2vec binary files often contain truncated ones
+        chunk_size (int): number of words read and written at a time
+
+    Returns:
+        :class:`Embeddings`: the converted embeddings, memory-mapped
+    """
+    fmt = fmt or _detect_format(filepath)
+    if fmt not in EMBEDDING_FORMATS:
+        msg = 'invalid `fmt` value: "{}"; valid values are {}'.format(fmt, EMBEDDING_FORMATS)
+        raise ValueError(msg)
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+
+    with open_sesame(filepath, mode='rb') as f:
+        if fmt == 'glove':
+            n_words = _count_lines(filepath)
+            first_line = f.readline()
+            dim = len(first_line.rstrip().split(b' ')) - 1
+            f.seek(0)
+        else:
+            n_words, dim = (int(field) for field in f.readline().split())
+        if max_words is not None:
+            n_words = min(n_words, max_words)
+        if fmt == 'bin':
+            chunks = _read_bin_chunks(f, n_words, dim, chunk_size)
+        else:
+            chunks = _read_text_chunks(f, dim, chunk_size)
+
+        vectors = np.lib.format.open_memmap(os.path.join(dirpath, 'vectors.npy'), mode='w+',
+                                            dtype=dtype, shape=(n_words, dim))
+        words = []
+        for chunk_words, chunk_vectors in chunks:
+            chunk_words = chunk_words[:n_words - len(words)]
+            vectors[len(words): len(words) + len(chunk_words)] = chunk_vectors[:len(chunk_words)]
+            words.extend(chunk_words)
+            if len(words) >= n_words:
+                break
+        vectors.flush()
+        del vectors
+    if len(words) < n_words:
+        msg = 'expected {} words in "{}", but found only {}'.format(n_words, filepath, len(words))
+        raise ValueError(msg)
+    _write_index(words, dirpath, errors=errors)
+    _write_meta(dirpath, n_words, dim, dtype)
+    return Embeddings(dirpath)
+
+
+def write_embeddings(words, vectors, dirpath, dtype=None):
+    """
+    Write word embeddings held in memory (e.g. trained on a corpus) in the
+    memory-mappable layout read by :class:`Embeddings`.
+
+    Args:
+        words (Sequence[str]): word of each row of ``vectors``
+        vectors (``np.ndarray``): matrix of shape (number of words, number of dimensions)
+        dirpath (str): /path/to/dir on disk, created if needed
+        dtype (``numpy.dtype``): type of the stored vectors; if None, that of ``vectors``
+    """
+    if len(words) != vectors.shape[0]:
+        raise ValueError('there must be one word per row of vectors')
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+    vectors = np.asarray(vectors, dtype=dtype)
+    np.save(os.path.join(dirpath, 'vectors.npy'), vectors)
+    _write_index(words, dirpath)
+    _write_meta(dirpath, vectors.shape[0], vectors.shape[1], vectors.dtype)
+
+
+class Embeddings(object):
+    """
+    Word embeddings in the layout written by :func:`convert_embeddings()` or
+    :func:`write_embeddings()`, memory-mapped by default. Words are identified
+    by their 64-bit spaCy ``StringStore`` hashes, i.e. the ``orth`` of tokens
+    with the same text, so tokens are looked up without decoding any strings.
+
+    Args:
+        dirpath (str): /path/to/dir on disk
+        mmap_mode (str): mode with which the arrays are memory-mapped (see
+            ``numpy.load``); if None, they're read into memory instead
+
+    Attributes:
+        vectors (``np.ndarray``): matrix of shape (number of words, :attr:`dim`)
+        keys (``np.ndarray``): sorted uint64 hashes of all (distinct) words
+        rows (``np.ndarray``): row in :attr:`vectors` of each of :attr:`keys`
+
+    Example::
+
+        embeddings = convert_embeddings('glove.6B.300d.txt.gz', 'glove_300d')
+        ...  # then, in any number of processes
+        embeddings = Embeddings('glove_300d')
+        rows, vectors = embeddings.get_vectors(doc.to_array(ORTH))
+    """
+
+    def __init__(self, dirpath, mmap_mode='r'):
+        self.dirpath = dirpath
+        with open(os.path.join(dirpath, 'meta.json'), mode='rt') as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(dirpath, 'vectors.npy'), mmap_mode=mmap_mode)
+        self.keys = np.load(os.path.join(dirpath, 'keys.npy'), mmap_mode=mmap_mode)
+        self.rows = np.load(os.path.join(dirpath, 'rows.npy'), mmap_mode=mmap_mode)
+        self._word_offsets = np.load(os.path.join(dirpath, 'word_offsets.npy'), mmap_mode=mmap_mode)
+        words_filepath = os.path.join(dirpath, 'words.bin')
+        if os.path.getsize(words_filepath) == 0:
+            self._words = np.zeros(0, dtype=np.uint8)
+        elif mmap_mode is None:
+            self._words = np.fromfile(words_filepath, dtype=np.uint8)
+        else:
+            self._words = np.memmap(words_filepath, dtype=np.uint8, mode='r')
+        self._norms = None
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dim(self):
+        """int: number of dimensions of the vectors"""
+        return self.vectors.shape[1]
+
+    @property
+    def norms(self):
+        """``np.ndarray``: float32 L2 norm of each vector, computed (block-wise) on first access"""
+        if self._norms is None:
+            norms = np.zeros(len(self), dtype=np.float32)
+            for start in range(0, len(self), 65536):
+                block = self.vectors[start: start + 65536].astype(np.float32)
+                norms[start: start + block.shape[0]] = np.sqrt(np.einsum('ij,ij->i', block, block))
+            self._norms = norms
+        return self._norms
+
+    def __contains__(self, word):
+        return bool(self.lookup([word])[0] >= 0)
+
+    def __getitem__(self, word):
+        row = int(self.lookup([word])[0])
+        if row < 0:
+            raise KeyError(word)
+        return self.vectors[row]
+
+    def lookup(self, terms):
+        """
+        Get the row of each of ``terms`` in :attr:`vectors`, vectorized over terms.
+
+        Args:
+            terms (Iterable[``spacy.Token`` or ``spacy.Span`` or str or int] or ``np.ndarray``):
+                e.g. as yielded by :func:`extract.words() <infoextract.extract.words>`,
+                or an array of hashes such as ``doc.to_array(ORTH)``, which
+                skips all per-token Python work; see :func:`term_hashes() <vsm.vectorizer.term_hashes>`
+
+        Returns:
+            ``np.ndarray``: int64 array of rows, with -1 for terms not in the embeddings
+        """
+        hashes = term_hashes(terms)
+        if self.keys.shape[0] == 0:
+            return np.full(hashes.shape[0], -1, dtype=np.int64)
+        idxs = np.searchsorted(self.keys, hashes).clip(max=self.keys.shape[0] - 1)
+        return np.where(self.keys[idxs] == hashes, self.rows[idxs], -1).astype(np.int64)
+
+    def get_vectors(self, terms, missing='zeros'):
+        """
+        Get the vectors of ``terms``, stacked into a matrix.
+
+        Args:
+            terms: see :meth:`lookup()`
+            missing (str): what to do with terms not in the embeddings; one of
+                'zeros': give them all-zero vectors
+                'skip': leave them out
+
+        Returns:
+            Tuple[``np.ndarray``, ``np.ndarray``]: rows of the terms (see
+                :meth:`lookup()`) and a matrix of their vectors; if ``missing``
+                is 'skip', only rows of terms in the embeddings are returned
+        """
+        if missing not in ('zeros', 'skip'):
+            msg = 'invalid `missing` value: "{}"; valid values are {}'.format(
+                missing, {'zeros', 'skip'})
+            raise ValueError(msg)
+        rows = self.lookup(terms)
+        found = rows >= 0
+        if missing == 'skip':
+            rows = rows[found]
+            return rows, self.vectors[rows]
+        vectors = np.zeros((rows.shape[0], self.dim), dtype=self.vectors.dtype)
+        vectors[found] = self.vectors[rows[found]]
+        return rows, vectors
+
+    def words(self, rows):
+        """
+        Get the words of ``rows`` of :attr:`vectors`.
+
+        Args:
+            rows (Iterable[int])
+
+        Returns:
+            List[str]
+        """
+        starts = self._word_offsets[:-1]
+        ends = self._word_offsets[1:]
+        return [self._words[starts[row]: ends[row]].tobytes().decode('utf-8')
+                for row in np.asarray(rows, dtype=np.int64).tolist()]
@@ -0,0 +1,387 @@
+"""
+Module for nearest-neighbour search over word embeddings by cosine similarity:
+exact search as blocked matrix products with ``np.argpartition`` top-k, so that
+memory use is bounded by the block size rather than the vocabulary size, and
+approximate search with a persisted inverted-file (IVF) index of k-means
+clusters, built and queried locally.
+"""
+from functools import partial
+import json
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from utils import compat
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    norms[norms == 0] = 1.0
+    return vectors / norms[:, None]
+
+
+def _top_k(scores, k):
+    """Get the column indexes of the (unsorted) top ``k`` scores in each row."""
+    if k >= scores.shape[1]:
+        return np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def _merge_top_k(idxs, scores, new_idxs, new_scores, k):
+    idxs = np.concatenate((idxs, new_idxs), axis=1)
+    scores = np.concatenate((scores, new_scores), axis=1)
+    top = _top_k(scores, k)
+    return (np.take_along_axis(idxs, top, axis=1),
+            np.take_along_axis(scores, top, axis=1))
+
+
+def _sort_top_k(idxs, scores):
+    order = np.argsort(-scores, axis=1, kind='mergesort')
+    return np.take_along_axis(idxs, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def knn(queries, embeddings, k=10, exclude=None, block_size=65536, query_block_size=1024):
+    """
+    Find the ``k`` nearest neighbours of each of ``queries`` among all vectors
+    of ``embeddings``, by cosine similarity, exactly. Vectors are scored a block
+    at a time, keeping a running top-k per query, so that at most a
+    (``query_block_size``, ``block_size``) matrix of scores is in memory.
+
+    Args:
+        queries (``np.ndarray``): matrix of query vectors, of shape
+            (number of queries, number of dimensions)
+        embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`)
+        k (int): number of neighbours per query
+        exclude (``np.ndarray``): row of a vector to exclude from each query's
+            neighbours, e.g. the query word itself, or -1 for none
+        block_size (int): number of vectors scored at a time
+        query_block_size (int): number of queries scored at a time
+
+    Returns:
+        Tuple[``np.ndarray``, ``np.ndarray``]: rows of neighbours and their
+            cosine similarities, each of shape (number of queries, ``k``),
+            sorted by similarity in descending order
+    """
+    queries = _normalize(np.atleast_2d(queries))
+    n_queries = queries.shape[0]
+    n_vectors = len(embeddings)
+    k = min(k, n_vectors - (1 if exclude is not None else 0))
+    all_idxs = np.zeros((n_queries, max(k, 0)), dtype=np.int64)
+    all_scores = np.zeros((n_queries, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return all_idxs, all_scores
+    norms = embeddings.norms
+    for q_start in range(0, n_queries, query_block_size):
+        q_block = queries[q_start: q_start + query_block_size]
+        q_exclude = exclude[q_start: q_start + query_block_size] if exclude is not None else None
+        idxs = np.zeros((q_block.shape[0], 0), dtype=np.int64)
+        scores = np.zeros((q_block.shape[0], 0), dtype=np.float32)
+        for start in range(0, n_vectors, block_size):
+            block = embeddings.vectors[start: start + block_size].astype(np.float32)
+            block_norms = norms[start: start + block.shape[0]]
+            block_scores = q_block.dot(block.T) / np.where(block_norms == 0, 1.0, block_norms)
+            if q_exclude is not None:
+                in_block = (q_exclude >= start) & (q_exclude < start + block.shape[0])
+                block_scores[np.flatnonzero(in_block), q_exclude[in_block] - start] = -np.inf
+            top = _top_k(block_scores, k)
+            idxs, scores = _merge_top_k(idxs, scores, top + start,
+                                        np.take_along_axis(block_scores, top, axis=1), k)
+        all_idxs[q_start: q_start + q_block.shape[0]], all_scores[q_start: q_start + q_block.shape[0]] = \
+            _sort_top_k(idxs, scores)
+    return all_idxs, all_scores
+
+
+def _query_vectors(embeddings, positive, negative):
+    """
+    Combine words (or vectors) into a query vector as in word2vec: the mean of
+    normalized ``positive`` vectors minus ``negative`` ones.
+    """
+    vectors, rows = [], []
+    for terms, sign in ((positive, 1.0), (negative or (), -1.0)):
+        for term in terms:
+            if isinstance(term, np.ndarray):
+                vectors.append(sign * _normalize(term[None, :])[0])
+            else:
+                row = int(embeddings.lookup([term])[0])
+                if row < 0:
+                    raise KeyError(term)
+                rows.append(row)
+                vectors.append(sign * _normalize(embeddings.vectors[row][None, :])[0])
+    if not vectors:
+        raise ValueError('at least one positive or negative term is required')
+    return np.mean(vectors, axis=0), rows
+
+
+def most_similar(embeddings, positive, negative=None, k=10, index=None, **kwargs):
+    """
+    Find the words most similar to ``positive`` ones and most dissimilar to
+    ``negative`` ones, e.g. ``most_similar(embeddings, ['king', 'woman'], ['man'])``.
+
+    Args:
+        embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`)
+        positive (Iterable[str or ``spacy.Token`` or ``np.ndarray``]): words or vectors
+        negative (Iterable[str or ``spacy.Token`` or ``np.ndarray``]): words or vectors
+        k (int): number of words to return
+        index (:class:`IVFIndex`): if given, search it approximately rather than
+            all vectors exactly
+        **kwargs: passed to :func:`knn()` or :meth:`IVFIndex.query()`
+
+    Returns:
+        List[Tuple[str, float]]: words and their cosine similarities, sorted
+            by similarity in descending order; input words are never included
+
+    Raises:
+        KeyError: if a word isn't in the embeddings
+    """
+    if isinstance(positive, (compat.string_types, np.ndarray)):
+        positive = [positive]
+    if isinstance(negative, (compat.string_types, np.ndarray)):
+        negative = [negative]
+    query, rows = _query_vectors(embeddings, positive, negative)
+    # ask for extra neighbours, to make up for input words being dropped
+    search = index.query if index is not None else partial(knn, embeddings=embeddings)
+    idxs, scores = search(query[None, :], k=k + len(rows), **kwargs)
+    keep = ~np.isin(idxs[0], rows) & (idxs[0] >= 0)
+    idxs, scores = idxs[0][keep][:k], scores[0][keep][:k]
+    return list(zip(embeddings.words(idxs), scores.tolist()))
+
+
+def most_similar_batch(embeddings, words, k=10, index=None, **kwargs):
+    """
+    Find the words most similar to each of many ``words``, in one batched search.
+
+    Args:
+        embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`)
+        words (Iterable[str or ``spacy.Token``] or ``np.ndarray``): words, or
+            an array of their hashes; see :meth:`Embeddings.lookup() <wordembedding.embeddings.Embeddings.lookup>`
+        k (int): number of similar words per word
+        index (:class:`IVFIndex`): if given, search it approximately rather than
+            all vectors exactly
+        **kwargs: passed to :func:`knn()` or :meth:`IVFIndex.query()`
+
+    Returns:
+        List[List[Tuple[str, float]]]: similar words and their cosine
+            similarities for each of ``words``, or an empty list for words not
+            in the embeddings
+    """
+    rows = embeddings.lookup(words)
+    found = np.flatnonzero(rows >= 0)
+    queries = embeddings.vectors[rows[found]]
+    if index is not None:
+        idxs, scores = index.query(queries, k=k, exclude=rows[found], **kwargs)
+    else:
+        idxs, scores = knn(queries, embeddings, k=k, exclude=rows[found], **kwargs)
+    results = [[] for _ in range(rows.shape[0])]
+    for i, q_idxs, q_scores in zip(found.tolist(), idxs, scores):
+        valid = q_idxs >= 0
+        results[i] = list(zip(embeddings.words(q_idxs[valid]), q_scores[valid].tolist()))
+    return results
+
+
+def _assign(vectors, centroids, block_size=65536):
+    """Get the index of each (normalized) vector's most similar centroid, block-wise."""
+    labels = np.zeros(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block_size):
+        labels[start: start + block_size] = np.argmax(
+            vectors[start: start + block_size].dot(centroids.T), axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0, block_size=65536):
+    """
+    Cluster unit-length ``vectors`` by spherical k-means, i.e. with cosine
+    similarity, block-wise.
+
+    Returns:
+        ``np.ndarray``: unit-length centroids, of shape (``n_clusters``, number of dimensions)
+
+    Raises:
+        ValueError: if ``n_clusters`` is less than 1 or more than the number of
+            ``vectors``, which are sampled to initialize the centroids
+    """
+    if not 1 <= n_clusters <= vectors.shape[0]:
+        msg = 'n_clusters={} is invalid; must be between 1 and the number of vectors, {}'.format(
+            n_clusters, vectors.shape[0])
+        raise ValueError(msg)
+    rng = np.random.RandomState(seed)
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(vectors, centroids, block_size=block_size)
+        # sums of each cluster's vectors, as a product with a sparse one-hot matrix
+        one_hot = csr_matrix((np.ones(labels.shape[0], dtype=np.float32),
+                              (labels, np.arange(labels.shape[0]))),
+                             shape=(n_clusters, vectors.shape[0]))
+        sums = np.asarray(one_hot.dot(vectors))
+        empty = np.flatnonzero(np.diff(one_hot.indptr) == 0)
+        sums[empty] = vectors[rng.choice(vectors.shape[0], empty.shape[0], replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex(object):
+    """
+    Inverted-file index for approximate nearest-neighbour search over
+    embeddings: vectors are clustered by spherical k-means, and a query is
+    only compared to the vectors in its ``n_probe`` most similar clusters.
+
+    Args:
+        centroids (``np.ndarray``): float32 unit-length cluster centroids
+        list_offsets (``np.ndarray``): start of each cluster's rows in ``list_rows``,
+            plus the total number of rows
+        list_rows (``np.ndarray``): rows of all vectors, grouped by cluster
+        embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`):
+            embeddings whose vectors are indexed
+
+    Example::
+
+        index = IVFIndex.build(embeddings)
+        index.to_disk('glove_300d/ivf')
+        ...
+        index = IVFIndex.from_disk('glove_300d/ivf', embeddings)
+        most_similar(embeddings, 'king', index=index)
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, embeddings):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.embeddings = embeddings
+
+    @classmethod
+    def build(cls, embeddings, n_clusters=None, n_iter=10, sample_size=100000,
+              seed=0, block_size=65536):
+        """
+        Build an index by clustering (a sample of) ``embeddings``' vectors, and
+        assigning every vector to its most similar cluster.
+
+        Args:
+            embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`)
+            n_clusters (int): number of clusters; if None, about the square root
+                of the number of vectors; at most the number of sampled vectors
+            n_iter (int): number of k-means iterations
+            sample_size (int): number of vectors sampled for clustering
+            seed (int): random seed for sampling and initialization
+            block_size (int): number of vectors normalized and assigned at a time
+
+        Returns:
+            :class:`IVFIndex`
+
+        Raises:
+            ValueError: if ``embeddings`` has no vectors
+        """
+        n_vectors = len(embeddings)
+        if n_clusters is None:
+            n_clusters = max(1, int(np.sqrt(n_vectors)))
+        rng = np.random.RandomState(seed)
+        sample = np.sort(rng.choice(n_vectors, min(sample_size, n_vectors), replace=False))
+        # each cluster is initialized with a distinct sampled vector
+        n_clusters = min(n_clusters, sample.shape[0])
+        centroids = spherical_kmeans(_normalize(embeddings.vectors[sample]), n_clusters,
+                                     n_iter=n_iter, seed=seed, block_size=block_size)
+        labels = np.zeros(n_vectors, dtype=np.int64)
+        for start in range(0, n_vectors, block_size):
+            block = _normalize(embeddings.vectors[start: start + block_size])
+            labels[start: start + block.shape[0]] = _assign(block, centroids)
+        list_rows = np.argsort(labels, kind='mergesort')
+        list_offsets = np.zeros(n_clusters + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_clusters))
+        return cls(centroids, list_offsets, list_rows, embeddings)
+
+    def query(self, queries, k=10, n_probe=8, exclude=None):
+        """
+        Find approximately the ``k`` nearest neighbours of each of ``queries``.
+
+        Args:
+            queries (``np.ndarray``): matrix of query vectors
+            k (int): number of neighbours per query
+            n_probe (int): number of clusters searched per query; more means
+                better recall but slower queries
+            exclude (``np.ndarray``): row of a vector to exclude from each
+                query's neighbours, or -1 for none
+
+        Returns:
+            Tuple[``np.ndarray``, ``np.ndarray``]: rows of neighbours and their
+                cosine similarities, each of shape (number of queries, ``k``),
+                sorted by similarity in descending order; if fewer than ``k``
+                candidates are found, rows are padded with -1 and scores with -inf
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        n_queries = queries.shape[0]
+        n_probe = min(n_probe, self.centroids.shape[0])
+        # all queries are scored against the centroids at once, then grouped
+        # by the lists they probe, so that each list is scored against all of
+        # its queries in a single matrix product
+        probes = _top_k(queries.dot(self.centroids.T), n_probe).ravel()
+        probe_queries = np.repeat(np.arange(n_queries), n_probe)
+        order = np.argsort(probes, kind='mergesort')
+        probes, probe_queries = probes[order], probe_queries[order]
+        clusters, bounds = np.unique(probes, return_index=True)
+        bounds = np.append(bounds, probes.shape[0])
+        norms = self.embeddings.norms
+        all_idxs = np.full((n_queries, k), -1, dtype=np.int64)
+        all_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        for c, lo, hi in zip(clusters.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+            rows = self.list_rows[self.list_offsets[c]: self.list_offsets[c + 1]]
+            if rows.shape[0] == 0:
+                continue
+            rows = np.sort(rows)  # for sequential reads of memory-mapped vectors
+            q_idxs = probe_queries[lo: hi]
+            row_norms = norms[rows]
+            scores = (queries[q_idxs].dot(self.embeddings.vectors[rows].astype(np.float32).T) /
+                      np.where(row_norms == 0, 1.0, row_norms))
+            if exclude is not None:
+                scores[rows[None, :] == exclude[q_idxs][:, None]] = -np.inf
+            top = _top_k(scores, k)
+            all_idxs[q_idxs], all_scores[q_idxs] = _merge_top_k(
+                all_idxs[q_idxs], all_scores[q_idxs],
+                rows[top], np.take_along_axis(scores, top, axis=1), k)
+        all_idxs, all_scores = _sort_top_k(all_idxs, all_scores)
+        # excluded vectors, scored -inf, count as missing
+        all_idxs[np.isneginf(all_scores)] = -1
+        return all_idxs, all_scores
+
+    def to_disk(self, dirpath):
+        """
+        Save the index's arrays as ``.npy`` files in directory ``dirpath``.
+
+        Args:
+            dirpath (str): /path/to/dir on disk, created if needed
+        """
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        np.save(os.path.join(dirpath, 'centroids.npy'), self.centroids)
+        np.save(os.path.join(dirpath, 'list_offsets.npy'), self.list_offsets)
+        np.save(os.path.join(dirpath, 'list_rows.npy'), self.list_rows)
+        with open(os.path.join(dirpath, 'meta.json'), mode='wt') as f:
+            json.dump({'n_clusters': int(self.centroids.shape[0]),
+                       'n_vectors': int(self.list_rows.shape[0])}, f)
+
+    @classmethod
+    def from_disk(cls, dirpath, embeddings, mmap_mode='r'):
+        """
+        Load an index saved by :meth:`to_disk()`.
+
+        Args:
+            dirpath (str): /path/to/dir on disk
+            embeddings (:class:`Embeddings <wordembedding.embeddings.Embeddings>`):
+                the embeddings from which the index was built
+            mmap_mode (str): see ``numpy.load``
+
+        Returns:
+            :class:`IVFIndex`
+
+        Raises:
+            ValueError: if ``embeddings`` doesn't have as many vectors as were indexed
+        """
+        with open(os.path.join(dirpath, 'meta.json'), mode='rt') as f:
+            meta = json.load(f)
+        if meta['n_vectors'] != len(embeddings):
+            msg = 'index has {} vectors, but embeddings have {}'.format(
+                meta['n_vectors'], len(embeddings))
+            raise ValueError(msg)
+        return cls(np.load(os.path.join(dirpath, 'centroids.npy')),
+                   np.load(os.path.join(dirpath, 'list_offsets.npy'), mmap_mode=mmap_mode),
+                   np.load(os.path.join(dirpath, 'list_rows.npy'), mmap_mode=mmap_mode),
+                   embeddings)